@@ -9,12 +9,18 @@ import logging
 import asyncio
 import discord
 from discord.ext import commands
-from prometheus_client import start_http_server, Counter, Histogram, Gauge
-import psutil
+from prometheus_client import Counter, Histogram, Gauge
 import time
 
+from exporter import MetricsExporter
+from label_policy import GuardedCounter, LabelGuard
+import log_pipeline
+from loop_monitor import LoopLagMonitor
+from system_sampler import SystemSampler
+
 # Prometheus metrics
-COMMAND_COUNTER = Counter('discord_commands_total', 'Total commands executed', ['command', 'user'])
+# Only the most active users get their own series; the rest count as "other"
+COMMAND_COUNTER = GuardedCounter('discord_commands_total', 'Total commands executed', ['command', 'user'], LabelGuard('user'))
 MESSAGE_COUNTER = Counter('discord_messages_total', 'Total messages received')
 RESPONSE_TIME = Histogram('discord_command_duration_seconds', 'Command response time')
 BOT_UPTIME = Gauge('discord_bot_uptime_seconds', 'Bot uptime in seconds')
@@ -25,6 +31,10 @@ class VICEBot(commands.Bot):
     def __init__(self, config_path='config.yml'):
         self.config = self.load_config(config_path)
         self.start_time = time.time()
+        COMMAND_COUNTER.resize(self.config['monitoring'].get('user_label_top_k', 25))
+        self.system_sampler = SystemSampler(
+            self.config['monitoring'].get('system_sample_interval', 5)
+        )
         
         intents = discord.Intents.default()
         intents.message_content = True
@@ -34,9 +44,11 @@ class VICEBot(commands.Bot):
             intents=intents,
             help_command=None
         )
-        
-        # Start Prometheus metrics server
-        start_http_server(self.config['monitoring']['metrics_port'])
+        self.loop_monitor = LoopLagMonitor()
+        self.exporter = MetricsExporter(
+            health_check=self.health_check,
+            ready_check=self.ready_check
+        )
         
         # Setup logging
         self.setup_logging()
@@ -67,23 +79,37 @@ class VICEBot(commands.Bot):
     
     def setup_logging(self):
         """Setup logging configuration"""
-        log_level = getattr(logging, self.config['logging']['level'].upper())
-        logging.basicConfig(
-            level=log_level,
-            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler(self.config['logging']['file']),
-                logging.StreamHandler()
-            ]
-        )
+        # Records are written by a listener thread so a slow disk never
+        # blocks the event loop; the file rotates at logging.max_size
+        log_pipeline.setup_logging(self.config['logging'])
         self.logger = logging.getLogger(__name__)
     
     async def setup_hook(self):
         """Setup bot when starting"""
         await self.add_cog(MonitoringCog(self))
         await self.add_cog(SystemCog(self))
+        self.sampler_task = self.loop.create_task(self.system_sampler.run())
+        self.loop_monitor_task = self.loop.create_task(self.loop_monitor.run())
+        
+        # Serve /metrics, /healthz and /readyz from the bot's own event loop
+        await self.exporter.start('0.0.0.0', self.config['monitoring']['metrics_port'])
         self.logger.info("Bot setup completed")
     
+    def health_check(self):
+        """Liveness: the event loop is responsive"""
+        lag = self.loop_monitor.max_lag
+        return lag <= self.config['monitoring'].get('max_loop_lag', 1), {'loop_lag_seconds': round(lag, 4)}
+    
+    def ready_check(self):
+        """Readiness: connected to the gateway and the event loop is responsive"""
+        healthy, details = self.health_check()
+        connected = self.is_ready() and not self.is_closed()
+        return healthy and connected, {**details, 'gateway_connected': connected}
+    
+    async def close(self):
+        await self.exporter.stop()
+        await super().close()
+    
     async def on_ready(self):
         """Called when bot is ready"""
         self.logger.info(f'Logged in as {self.user.name} ({self.user.id})')
@@ -110,9 +136,10 @@ class VICEBot(commands.Bot):
                 # Update uptime
                 BOT_UPTIME.set(time.time() - self.start_time)
                 
-                # Update system metrics
-                SYSTEM_CPU.set(psutil.cpu_percent())
-                SYSTEM_MEMORY.set(psutil.virtual_memory().percent)
+                # Update system metrics from the latest sample
+                system = self.system_sampler.snapshot
+                SYSTEM_CPU.set(system.cpu_percent)
+                SYSTEM_MEMORY.set(system.memory_percent)
                 
                 await asyncio.sleep(self.config['monitoring']['health_check_interval'])
             except Exception as e:
@@ -141,19 +168,18 @@ class MonitoringCog(commands.Cog):
         )
         
         # System info
-        cpu_percent = psutil.cpu_percent()
-        memory = psutil.virtual_memory()
+        system = await self.bot.system_sampler.get()
         
         embed.add_field(
             name="System Status",
-            value=f"CPU: {cpu_percent}%\nMemory: {memory.percent}%",
+            value=f"CPU: {system.cpu_percent}%\nMemory: {system.memory_percent}%",
             inline=True
         )
         
         # Guild info
         embed.add_field(
             name="Guild Info",
-            value=f"Guilds: {len(self.bot.guilds)}\nUsers: {len(self.bot.users)}",
+            value=f"Guilds: {len(self.bot.guilds)}\nUsers: {sum(guild.member_count or 0 for guild in self.bot.guilds)}",
             inline=True
         )
         
@@ -198,28 +224,27 @@ class SystemCog(commands.Cog):
             color=discord.Color.blue()
         )
         
+        system = await self.bot.system_sampler.get()
+        
         # CPU info
-        cpu_count = psutil.cpu_count()
-        cpu_percent = psutil.cpu_percent(interval=1)
+        per_core = ' '.join(f"{p:.0f}" for p in system.per_cpu_percent)
         embed.add_field(
             name="CPU",
-            value=f"Cores: {cpu_count}\nUsage: {cpu_percent}%",
+            value=f"Cores: {system.cpu_count}\nUsage: {system.cpu_percent}%\nPer core: {per_core}",
             inline=True
         )
         
         # Memory info
-        memory = psutil.virtual_memory()
         embed.add_field(
             name="Memory",
-            value=f"Total: {memory.total // (1024**3)}GB\nUsed: {memory.percent}%",
+            value=f"Total: {system.memory_total // (1024**3)}GB\nUsed: {system.memory_percent}%",
             inline=True
         )
         
         # Disk info
-        disk = psutil.disk_usage('/')
         embed.add_field(
             name="Disk",
-            value=f"Total: {disk.total // (1024**3)}GB\nUsed: {disk.percent}%",
+            value=f"Total: {system.disk_total // (1024**3)}GB\nUsed: {system.disk_percent}%",
             inline=True
         )
         
@@ -234,11 +259,14 @@ def main():
     bot = VICEBot()
     
     try:
-        bot.run(bot.config['bot']['token'])
+        # log_handler=None keeps discord.py from adding its own blocking handler
+        bot.run(bot.config['bot']['token'], log_handler=None)
     except KeyboardInterrupt:
         bot.logger.info("Bot stopped by user")
     except Exception as e:
         bot.logger.error(f"Bot error: {e}")
+    finally:
+        log_pipeline.stop_logging()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,99 @@
+"""
+Exporter
+aiohttp-based Prometheus exporter running on the bot's own event loop.
+Serves /metrics (gzip, with a short-lived shared rendering) plus
+/healthz and /readyz probes.
+"""
+
+import asyncio
+import gzip
+import logging
+import time
+
+from aiohttp import web
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, generate_latest
+
+logger = logging.getLogger(__name__)
+
+
+class MetricsExporter:
+    """Serves a registry and health probes from an aiohttp application"""
+
+    def __init__(self, registry=REGISTRY, render_ttl=1.0, metrics_path='/metrics',
+                 health_check=None, ready_check=None):
+        # health_check/ready_check() -> (ok, details dict)
+        self.registry = registry
+        self.render_ttl = render_ttl
+        self.metrics_path = metrics_path
+        self.health_check = health_check
+        self.ready_check = ready_check
+        self.renders = 0
+
+        self._rendered = None
+        self._rendered_at = 0.0
+        self._rendering = None
+        self._runner = None
+
+    def _render(self):
+        body = generate_latest(self.registry)
+        return body, gzip.compress(body, compresslevel=5)
+
+    async def rendered(self):
+        """Return (plain, gzipped) exposition, shared by scrapes within render_ttl"""
+        if self._rendered is not None and time.monotonic() - self._rendered_at < self.render_ttl:
+            return self._rendered
+        if self._rendering is None:
+            loop = asyncio.get_running_loop()
+            self._rendering = loop.run_in_executor(None, self._render)
+        rendering = self._rendering
+        try:
+            result = await asyncio.shield(rendering)
+        finally:
+            if self._rendering is rendering and rendering.done():
+                self._rendering = None
+        if self._rendered is not result:
+            self._rendered = result
+            self._rendered_at = time.monotonic()
+            self.renders += 1
+        return result
+
+    async def handle_metrics(self, request):
+        plain, compressed = await self.rendered()
+        headers = {'Content-Type': CONTENT_TYPE_LATEST, 'Vary': 'Accept-Encoding'}
+        if 'gzip' in request.headers.get('Accept-Encoding', ''):
+            headers['Content-Encoding'] = 'gzip'
+            return web.Response(body=compressed, headers=headers)
+        return web.Response(body=plain, headers=headers)
+
+    async def _probe(self, check):
+        if check is None:
+            return web.json_response({'status': 'ok'})
+        ok, details = check()
+        return web.json_response(
+            {'status': 'ok' if ok else 'unavailable', **details},
+            status=200 if ok else 503
+        )
+
+    async def handle_healthz(self, request):
+        return await self._probe(self.health_check)
+
+    async def handle_readyz(self, request):
+        return await self._probe(self.ready_check)
+
+    def add_routes(self, app):
+        app.router.add_get(self.metrics_path, self.handle_metrics)
+        app.router.add_get('/healthz', self.handle_healthz)
+        app.router.add_get('/readyz', self.handle_readyz)
+
+    async def start(self, host, port):
+        app = web.Application()
+        self.add_routes(app)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        logger.info(f"Metrics exporter listening on port {port}")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
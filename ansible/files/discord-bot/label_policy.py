@@ -0,0 +1,170 @@
+"""
+Label Policy
+Caps the number of distinct values a metric label can take. A
+Space-Saving sketch tracks approximately how often each value is seen;
+only the current top-K values get their own series and everything else
+is folded into "other". When a value falls out of the top-K, its series
+is dropped and only its later increments go to "other"; what it
+counted before stays in the TSDB under its own label, so increase() and
+rate() summed over the label don't double count.
+"""
+
+import logging
+
+from prometheus_client import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+OTHER = 'other'
+
+LABEL_OVERFLOW = Counter('discord_label_overflow_total', 'Label values folded into "other" by the cardinality guard', ['metric', 'label'])
+LABEL_EVICTIONS = Counter('discord_label_evictions_total', 'Label values demoted from their own series to "other"', ['metric', 'label'])
+LABEL_VALUES = Gauge('discord_label_values', 'Distinct label values currently exported with their own series', ['metric', 'label'])
+
+
+class SpaceSaving:
+    """
+    Approximate heavy-hitter counts in bounded memory: at most
+    ``capacity`` values are tracked and a new value replaces the least
+    frequent one, inheriting its count as overestimation error
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+
+    def __len__(self):
+        return len(self.counts)
+
+    def add(self, value):
+        """Count one occurrence; returns the guaranteed (lower bound) count"""
+        counts = self.counts
+        if value in counts:
+            counts[value] += 1
+        elif len(counts) < self.capacity:
+            counts[value] = 1
+            self.errors[value] = 0
+        else:
+            smallest = min(counts, key=counts.get)
+            floor = counts.pop(smallest)
+            del self.errors[smallest]
+            counts[value] = floor + 1
+            self.errors[value] = floor
+        return counts[value] - self.errors[value]
+
+    def count(self, value):
+        """Estimated (upper bound) count; 0 once a value is no longer tracked"""
+        return self.counts.get(value, 0)
+
+    def resize(self, capacity):
+        """Change capacity, keeping the most frequent values if it shrinks"""
+        self.capacity = capacity
+        if len(self.counts) > capacity:
+            kept = sorted(self.counts, key=self.counts.get, reverse=True)[:capacity]
+            self.counts = {value: self.counts[value] for value in kept}
+            self.errors = {value: self.errors[value] for value in kept}
+
+
+class LabelGuard:
+    """Decides which values of one label may have their own series"""
+
+    def __init__(self, label, top_k=25, capacity=None, promote_ratio=2.0):
+        self.label = label
+        self._top_k = top_k
+        self._capacity = capacity
+        self.promote_ratio = promote_ratio
+        self.sketch = SpaceSaving(capacity or top_k * 16)
+        self.admitted = set()
+
+    @property
+    def top_k(self):
+        # Read-only: the sketch is sized from it, so change it with resize()
+        return self._top_k
+
+    def resize(self, top_k):
+        """Change top_k and resize the sketch to match; returns the values demoted to fit"""
+        self._top_k = top_k
+        self.sketch.resize(self._capacity or top_k * 16)
+        demoted = []
+        while len(self.admitted) > top_k:
+            weakest = min(self.admitted, key=self.sketch.count)
+            self.admitted.discard(weakest)
+            demoted.append(weakest)
+        return demoted
+
+    def resolve(self, value):
+        """
+        Return (label value to export, value evicted to make room or None).
+        A newcomer only displaces the weakest admitted value once it has
+        been seen ``promote_ratio`` times as often, so values near the
+        cut-off don't keep swapping series.
+        """
+        guaranteed = self.sketch.add(value)
+        if value in self.admitted:
+            return value, None
+        if len(self.admitted) < self.top_k:
+            self.admitted.add(value)
+            return value, None
+
+        weakest = min(self.admitted, key=self.sketch.count)
+        if guaranteed >= max(self.sketch.count(weakest), 1) * self.promote_ratio:
+            self.admitted.discard(weakest)
+            self.admitted.add(value)
+            return value, weakest
+        return OTHER, None
+
+
+class GuardedCounter:
+    """
+    A Counter whose ``guard`` label is limited by a LabelGuard. Use it
+    exactly like a labelled Counter: ``COUNTER.labels(...).inc()``.
+    """
+
+    def __init__(self, name, documentation, labelnames, guard, linked=()):
+        # linked: labels describing the same entity as the guarded one
+        # (e.g. a display name); they are folded into "other" with it
+        self.name = name
+        self.labelnames = tuple(labelnames)
+        self.guard = guard
+        self.folded = (guard.label,) + tuple(linked)
+        self.counter = Counter(name, documentation, self.labelnames)
+        self._series = {}
+
+    def labels(self, **labels):
+        value = str(labels[self.guard.label])
+        resolved, evicted = self.guard.resolve(value)
+        if evicted is not None:
+            self._fold(evicted)
+        if resolved == OTHER:
+            LABEL_OVERFLOW.labels(metric=self.name, label=self.guard.label).inc()
+            for label in self.folded:
+                labels[label] = OTHER
+        key = tuple(str(labels[label]) for label in self.labelnames)
+        if resolved != OTHER:
+            self._series.setdefault(value, set()).add(key)
+        LABEL_VALUES.labels(metric=self.name, label=self.guard.label).set(len(self.guard.admitted))
+        return self.counter.labels(*key)
+
+    def resize(self, top_k):
+        """Change how many values keep their own series, dropping any demoted to fit"""
+        for value in self.guard.resize(top_k):
+            self._fold(value)
+        LABEL_VALUES.labels(metric=self.name, label=self.guard.label).set(len(self.guard.admitted))
+
+    def _fold(self, value):
+        """
+        Drop an evicted value's series; its later increments go to "other".
+        Its total is not carried over: the samples already scraped keep
+        it, and adding it to "other" would show up as a burst there.
+        """
+        keys = self._series.pop(value, set())
+        if not keys:
+            return
+        for key in keys:
+            try:
+                self.counter.remove(*key)
+            except KeyError:
+                pass
+        LABEL_EVICTIONS.labels(metric=self.name, label=self.guard.label).inc()
+        logger.debug(f"Folded {self.guard.label}={value} of {self.name} into '{OTHER}'")
@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+"""
+Event Path Benchmark
+Drives ViceMonitoringBot offline: synthetic guilds, channels and members
+are loaded into the client cache, messages built from gateway-shaped
+payloads are fed through on_message -> process_commands -> log
+collection, and every REST call is answered by a stub instead of
+Discord. Reports throughput, per-kind latency percentiles, allocations
+(tracemalloc) and RSS, and saves them as a JSON baseline.
+
+Usage:
+    python benchmarks/event_path.py --messages 20000 --output benchmarks/baseline.json
+    python benchmarks/event_path.py --compare benchmarks/baseline.json
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import sysconfig
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import psutil
+import yaml
+
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')))
+os.environ.setdefault('DISCORD_TOKEN', 'benchmark')
+
+import discord  # noqa: E402
+
+import bot as bot_module  # noqa: E402
+from config_loader import load_config  # noqa: E402
+from log_pipeline import stop_logging  # noqa: E402
+
+DEFAULT_MIX = 'chat=0.90,status=0.02,metrics=0.03,logs=0.05'
+CHANNEL_NAMES = ('general', 'admin', 'logs', 'random', 'off-topic')
+WORDS = (
+    'deploy', 'grafana', 'latency', 'node', 'exporter', 'alert', 'disk', 'restart',
+    'prometheus', 'backup', 'cpu', 'memory', 'network', 'shard', 'gateway', 'ok'
+)
+
+BOT_ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+STDLIB = os.path.normpath(sysconfig.get_paths()['stdlib'])
+
+_snowflakes = itertools.count(1 << 40)
+
+
+def snowflake():
+    return next(_snowflakes)
+
+
+def parse_mix(text):
+    """Parse "chat=0.9,status=0.1" into normalised (kind, weight) pairs"""
+    mix = []
+    for part in text.split(','):
+        kind, _, weight = part.partition('=')
+        mix.append((kind.strip(), float(weight or 1)))
+    total = sum(weight for _, weight in mix)
+    return [(kind, weight / total) for kind, weight in mix]
+
+
+def allocation_site(frame):
+    """file:line relative to the bot, site-packages or stdlib, so baselines compare across machines"""
+    filename = os.path.normpath(frame.filename)
+    if filename.startswith(BOT_ROOT + os.sep):
+        filename = os.path.relpath(filename, BOT_ROOT)
+    elif 'site-packages' + os.sep in filename:
+        filename = filename.split('site-packages' + os.sep, 1)[1]
+    elif filename.startswith(STDLIB + os.sep):
+        filename = os.path.relpath(filename, STDLIB)
+    return f"{filename}:{frame.lineno}"
+
+
+def percentiles(samples):
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    last = len(ordered) - 1
+
+    def at(q):
+        return ordered[min(last, int(q * last + 0.5))] * 1000
+
+    return {
+        'count': len(ordered),
+        'mean_ms': sum(ordered) / len(ordered) * 1000,
+        'p50_ms': at(0.50),
+        'p90_ms': at(0.90),
+        'p99_ms': at(0.99),
+        'max_ms': ordered[-1] * 1000
+    }
+
+
+class StubHTTP:
+    """Answers REST calls locally with minimal but valid payloads"""
+
+    def __init__(self, bot_user, latency=0.0):
+        self.bot_user = bot_user
+        self.latency = latency
+        self.calls = 0
+
+    async def request(self, route, **kwargs):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if route.method == 'POST' and route.path == '/channels/{channel_id}/messages':
+            payload = kwargs.get('json') or {}
+            return message_payload(route.channel_id, self.bot_user, payload.get('content') or '')
+        return {}
+
+
+def message_payload(channel_id, author, content, guild_id=None, member=False):
+    data = {
+        'id': snowflake(),
+        'channel_id': channel_id,
+        'type': 0,
+        'content': content,
+        'author': author,
+        'attachments': [],
+        'embeds': [],
+        'mentions': [],
+        'mention_roles': [],
+        'mention_everyone': False,
+        'pinned': False,
+        'tts': False,
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'edited_timestamp': None
+    }
+    if guild_id is not None:
+        data['guild_id'] = guild_id
+    if member:
+        data['member'] = {'roles': [], 'joined_at': data['timestamp'], 'deaf': False, 'mute': False}
+    return data
+
+
+def user_payload(user_id, name, bot=False):
+    return {'id': user_id, 'username': name, 'discriminator': '0', 'global_name': None, 'avatar': None, 'bot': bot}
+
+
+class World:
+    """Synthetic guilds, channels and users loaded into the bot's cache"""
+
+    def __init__(self, bot, guilds, channels_per_guild, users_per_guild, seed):
+        self.bot = bot
+        self.random = random.Random(seed)
+        self.channels = []
+        self.users = {}
+        state = bot._connection
+        for g in range(guilds):
+            guild_id = snowflake()
+            channels = [
+                {'id': snowflake(), 'type': 0, 'name': CHANNEL_NAMES[c % len(CHANNEL_NAMES)] + ('' if c < len(CHANNEL_NAMES) else f'-{c}'), 'position': c, 'guild_id': guild_id}
+                for c in range(channels_per_guild)
+            ]
+            guild = state._add_guild_from_data({
+                'id': guild_id,
+                'name': f'bench-guild-{g}',
+                'member_count': users_per_guild,
+                'channels': channels,
+                'roles': [{'id': guild_id, 'name': '@everyone', 'permissions': '0', 'position': 0, 'color': 0, 'hoist': False, 'managed': False, 'mentionable': False}],
+                'members': [],
+                'emojis': [],
+                'stickers': [],
+                'features': []
+            })
+            self.users[guild_id] = [user_payload(snowflake(), f'user-{g}-{u}') for u in range(users_per_guild)]
+            self.channels.extend((guild_id, guild.get_channel(channel['id'])) for channel in channels)
+            bot.guild_stats.add_guild(guild)
+
+    def message(self, content):
+        guild_id, channel = self.random.choice(self.channels)
+        author = self.random.choice(self.users[guild_id])
+        data = message_payload(channel.id, author, content, guild_id=guild_id, member=True)
+        return discord.Message(state=self.bot._connection, channel=channel, data=data)
+
+    def content(self, kind, prefix):
+        if kind == 'chat':
+            return ' '.join(self.random.choice(WORDS) for _ in range(self.random.randint(3, 20)))
+        return f"{prefix}{kind}"
+
+
+def bench_config(args, directory):
+    """The repo config with every network-facing feature turned off"""
+    config = load_config(args.config)
+    config['prometheus']['enabled'] = False
+    config['prometheus']['url'] = None
+    config['alertmanager']['url'] = None
+    config['monitoring']['alerts']['enabled'] = False
+    config['monitoring']['alerts']['receiver']['enabled'] = False
+    config['config_reload']['enabled'] = False
+    config['monitoring']['probes']['enabled'] = False
+    config['logging']['level'] = 'WARNING'
+    config['logging']['file'] = os.path.join(directory, 'bot.log')
+    config['monitoring']['log_collection']['store']['enabled'] = args.store
+    config['monitoring']['log_collection']['store']['path'] = os.path.join(directory, 'messages')
+    if args.no_rate_limit:
+        config['security']['rate_limit']['enabled'] = False
+        config['security']['cooldowns'] = {}
+    path = os.path.join(directory, 'config.yml')
+    with open(path, 'w') as file:
+        yaml.safe_dump(config, file)
+    return path
+
+
+def build_messages(world, plan, prefix):
+    return [(kind, world.message(world.content(kind, prefix))) for kind in plan]
+
+
+async def replay(bot, messages, concurrency):
+    """Feed prepared messages through on_message; returns per-kind latencies"""
+    latencies = {}
+
+    async def one(kind, message):
+        start = time.perf_counter()
+        await bot.on_message(message)
+        latencies.setdefault(kind, []).append(time.perf_counter() - start)
+
+    for offset in range(0, len(messages), concurrency):
+        batch = messages[offset:offset + concurrency]
+        await asyncio.gather(*(one(kind, message) for kind, message in batch))
+    return latencies
+
+
+def make_plan(mix, count, burst_every, burst_size, rng):
+    kinds = [kind for kind, _ in mix]
+    weights = [weight for _, weight in mix]
+    commands = [kind for kind in kinds if kind != 'chat'] or kinds
+    plan = []
+    while len(plan) < count:
+        plan.append(rng.choices(kinds, weights)[0])
+        if burst_every and len(plan) % burst_every == 0:
+            plan.extend(rng.choice(commands) for _ in range(burst_size))
+    return plan[:count]
+
+
+async def run(args):
+    process = psutil.Process()
+    rss_start = process.memory_info().rss
+    with tempfile.TemporaryDirectory(prefix='vice-bench-') as directory:
+        bot = bot_module.ViceMonitoringBot(bench_config(args, directory))
+        bot_user = user_payload(snowflake(), 'vice-bench', bot=True)
+        bot._connection.user = discord.ClientUser(state=bot._connection, data=bot_user)
+        stub = StubHTTP(bot_user, latency=args.api_latency)
+        bot.http.request = stub.request
+
+        async with bot:
+            await bot.setup_hook()
+            world = World(bot, args.guilds, args.channels, args.users, args.seed)
+            prefix = bot.config['discord']['prefix']
+            mix = parse_mix(args.mix)
+            rng = random.Random(args.seed)
+
+            # Warm caches and the system sampler before measuring
+            warmup = make_plan(mix, min(500, args.messages), 0, 0, rng)
+            await replay(bot, build_messages(world, warmup, prefix), args.concurrency)
+
+            plan = make_plan(mix, args.messages, args.burst_every, args.burst_size, rng)
+            messages = build_messages(world, plan, prefix)
+            traced = build_messages(world, plan[:args.trace_messages], prefix)
+            calls_before = stub.calls
+            start = time.perf_counter()
+            latencies = await replay(bot, messages, args.concurrency)
+            elapsed = time.perf_counter() - start
+            rss_after = process.memory_info().rss
+
+            # Allocations are traced on a separate, shorter pass since
+            # tracemalloc slows everything it watches
+            tracemalloc.start(10)
+            before = tracemalloc.take_snapshot()
+            await replay(bot, traced, args.concurrency)
+            after = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            top = after.compare_to(before, 'lineno')[:args.top_allocations]
+
+            if bot.log_store:
+                await bot.log_store.flush()
+            await bot.close()
+
+    all_latencies = [value for values in latencies.values() for value in values]
+    return {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'environment': {
+            'python': platform.python_version(),
+            'discord.py': discord.__version__,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count()
+        },
+        'parameters': {
+            'messages': args.messages,
+            'mix': args.mix,
+            'guilds': args.guilds,
+            'channels_per_guild': args.channels,
+            'users_per_guild': args.users,
+            'concurrency': args.concurrency,
+            'burst_every': args.burst_every,
+            'burst_size': args.burst_size,
+            'api_latency': args.api_latency,
+            'store': args.store,
+            'rate_limit': not args.no_rate_limit,
+            'seed': args.seed
+        },
+        'throughput_msgs_per_s': len(plan) / elapsed,
+        'elapsed_s': elapsed,
+        'api_calls': stub.calls - calls_before,
+        'latency': {'all': percentiles(all_latencies), **{kind: percentiles(values) for kind, values in sorted(latencies.items())}},
+        'allocations': {
+            'messages': len(traced),
+            'net_bytes': sum(stat.size_diff for stat in after.compare_to(before, 'filename')),
+            'net_blocks': sum(stat.count_diff for stat in after.compare_to(before, 'filename')),
+            'peak_traced_bytes': peak,
+            'current_traced_bytes': current,
+            'top': [{'site': allocation_site(stat.traceback[0]), 'size_diff': stat.size_diff, 'count_diff': stat.count_diff} for stat in top]
+        },
+        'rss': {
+            'start_bytes': rss_start,
+            'after_replay_bytes': rss_after,
+            'growth_bytes': rss_after - rss_start
+        }
+    }
+
+
+def compare(result, baseline):
+    """Print relative changes against a saved baseline"""
+    rows = [('throughput msgs/s', baseline['throughput_msgs_per_s'], result['throughput_msgs_per_s'])]
+    for kind, stats in result['latency'].items():
+        old = baseline['latency'].get(kind)
+        if old and stats:
+            rows.append((f"{kind} p50 ms", old['p50_ms'], stats['p50_ms']))
+            rows.append((f"{kind} p99 ms", old['p99_ms'], stats['p99_ms']))
+    rows.append(('alloc net bytes', baseline['allocations']['net_bytes'], result['allocations']['net_bytes']))
+    rows.append(('rss growth bytes', baseline['rss']['growth_bytes'], result['rss']['growth_bytes']))
+    print(f"\n{'metric':<24}{'baseline':>16}{'current':>16}{'change':>10}")
+    for name, old, new in rows:
+        change = f"{(new - old) / old * 100:+.1f}%" if old else 'n/a'
+        print(f"{name:<24}{old:>16.3f}{new:>16.3f}{change:>10}")
+
+
+def report(result):
+    print(f"Throughput: {result['throughput_msgs_per_s']:.0f} msgs/s over {result['elapsed_s']:.2f}s ({result['api_calls']} stubbed API calls)")
+    print(f"\n{'kind':<10}{'count':>8}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for kind, stats in result['latency'].items():
+        if stats:
+            print(f"{kind:<10}{stats['count']:>8}{stats['p50_ms']:>10.3f}{stats['p90_ms']:>10.3f}{stats['p99_ms']:>10.3f}{stats['max_ms']:>10.3f}")
+    allocations = result['allocations']
+    print(f"\nAllocations over {allocations['messages']} messages: {allocations['net_bytes'] / 1024:.1f} KiB net, "
+          f"{allocations['net_blocks']} blocks, peak {allocations['peak_traced_bytes'] / 1024:.1f} KiB")
+    for entry in allocations['top']:
+        print(f"  {entry['size_diff'] / 1024:>8.1f} KiB  {entry['site']}")
+    rss = result['rss']
+    print(f"\nRSS: {rss['start_bytes'] / 1024 ** 2:.1f} MiB -> {rss['after_replay_bytes'] / 1024 ** 2:.1f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0], formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--config', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'config.yml'))
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'message kinds and weights (default {DEFAULT_MIX})')
+    parser.add_argument('--guilds', type=int, default=50)
+    parser.add_argument('--channels', type=int, default=5, help='channels per guild')
+    parser.add_argument('--users', type=int, default=200, help='users per guild')
+    parser.add_argument('--concurrency', type=int, default=1, help='messages handled concurrently')
+    parser.add_argument('--burst-every', type=int, default=1000, help='insert a command burst every N messages (0 disables)')
+    parser.add_argument('--burst-size', type=int, default=50)
+    parser.add_argument('--api-latency', type=float, default=0.0, help='seconds each stubbed REST call takes')
+    parser.add_argument('--store', action='store_true', help='also write collected messages to the SQLite store')
+    parser.add_argument('--no-rate-limit', action='store_true', help='disable rate limits and cooldowns')
+    parser.add_argument('--trace-messages', type=int, default=2000, help='messages replayed under tracemalloc')
+    parser.add_argument('--top-allocations', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--compare', help='baseline JSON to compare the results against')
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    try:
+        result = asyncio.run(run(args))
+    finally:
+        stop_logging()
+    report(result)
+    if args.compare:
+        with open(args.compare) as file:
+            compare(result, json.load(file))
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(result, file, indent=2)
+            file.write('\n')
+        print(f"\nSaved results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
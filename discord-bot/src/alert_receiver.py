@@ -0,0 +1,255 @@
+"""
+Alert Receiver
+Accepts Alertmanager webhook payloads, deduplicates alerts by
+fingerprint and keeps one Discord message per alert group up to date.
+Messages go out through a per-channel outbox that coalesces pending
+updates and stays inside Discord's per-channel rate limit.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+import discord
+from aiohttp import web
+from prometheus_client import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+ALERTS_RECEIVED = Counter('discord_alerts_received_total', 'Alerts received from Alertmanager', ['status'])
+ALERTS_DEDUPLICATED = Counter('discord_alerts_deduplicated_total', 'Received alerts that changed nothing')
+ALERT_MESSAGES = Counter('discord_alert_messages_total', 'Alert messages delivered to Discord', ['action'])
+ALERT_DELIVERY_ERRORS = Counter('discord_alert_delivery_errors_total', 'Failed alert deliveries', ['reason'])
+ALERT_GROUPS = Gauge('discord_alert_groups', 'Alert groups currently tracked', multiprocess_mode='livesum')
+
+# Alert statuses Alertmanager sends; anything else is counted as 'other' and ignored
+STATUSES = ('firing', 'resolved')
+
+SEVERITY_COLORS = {
+    'critical': discord.Color.red(),
+    'warning': discord.Color.orange()
+}
+
+
+def fingerprint_of(alert):
+    """Alertmanager's fingerprint, or a stable hash of the label set"""
+    if alert.get('fingerprint'):
+        return alert['fingerprint']
+    labels = json.dumps(alert.get('labels', {}), sort_keys=True)
+    return hashlib.sha1(labels.encode()).hexdigest()[:16]
+
+
+class AlertGroup:
+    """The alerts behind one Discord message"""
+    __slots__ = ('key', 'labels', 'alerts', 'message', 'resolved_at', 'updated_at')
+
+    def __init__(self, key, labels):
+        self.key = key
+        self.labels = labels
+        self.alerts = OrderedDict()
+        self.message = None
+        self.resolved_at = None
+        self.updated_at = time.monotonic()
+
+    @property
+    def firing(self):
+        return [alert for alert in self.alerts.values() if alert['status'] == 'firing']
+
+    def update(self, alert):
+        """Store an alert; return False if it changes nothing we display"""
+        fingerprint = fingerprint_of(alert)
+        state = (alert.get('status'), alert.get('annotations'), alert.get('startsAt'))
+        current = self.alerts.get(fingerprint)
+        if current is not None and (current['status'], current.get('annotations'), current.get('startsAt')) == state:
+            return False
+        self.alerts[fingerprint] = alert
+        self.resolved_at = None if self.firing else time.monotonic()
+        return True
+
+    def render(self):
+        firing = self.firing
+        name = self.labels.get('alertname') or next(iter(self.alerts.values()))['labels'].get('alertname', 'alert')
+        severity = self.labels.get('severity') or next(iter(self.alerts.values()))['labels'].get('severity', '')
+        if firing:
+            title = f"🔥 [FIRING:{len(firing)}] {name}"
+            color = SEVERITY_COLORS.get(severity, discord.Color.gold())
+        else:
+            title = f"✅ [RESOLVED] {name}"
+            color = discord.Color.green()
+
+        embed = discord.Embed(title=title[:256], color=color, timestamp=datetime.now())
+        ordered = sorted(self.alerts.values(), key=lambda alert: alert['status'] != 'firing')
+        for alert in ordered[:10]:
+            labels = alert.get('labels', {})
+            annotations = alert.get('annotations', {})
+            state = '🔴 firing' if alert['status'] == 'firing' else '🟢 resolved'
+            target = labels.get('instance') or labels.get('job') or labels.get('alertname', '')
+            summary = annotations.get('summary') or annotations.get('description') or ''
+            embed.add_field(
+                name=f"{target} [{labels.get('severity', 'none')}]"[:256],
+                value=f"{state} since {alert.get('startsAt', '')[:19]}\n{summary}"[:1024],
+                inline=False
+            )
+        if len(ordered) > 10:
+            embed.set_footer(text=f"and {len(ordered) - 10} more")
+        return embed
+
+
+class AlertOutbox:
+    """Rate-limited, coalescing delivery queue for one Discord channel"""
+
+    def __init__(self, resolve_target, burst=5, per=5.0):
+        # resolve_target() -> (channel or webhook, role mention or None)
+        self.resolve_target = resolve_target
+        self.mention = None
+        self.burst = burst
+        self.per = per
+        self._target = None
+        self._pending = OrderedDict()
+        self._wakeup = asyncio.Event()
+        self._sent = []
+        self._task = None
+
+    def submit(self, group):
+        """Queue a group for delivery; repeated submits collapse into one update"""
+        self._pending[group.key] = group
+        self._wakeup.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _throttle(self):
+        """Keep to `burst` messages per `per` seconds for this channel"""
+        now = time.monotonic()
+        self._sent = [sent for sent in self._sent if now - sent < self.per]
+        if len(self._sent) >= self.burst:
+            await asyncio.sleep(self.per - (now - self._sent[0]))
+        self._sent.append(time.monotonic())
+
+    async def _deliver(self, group):
+        if self._target is None:
+            self._target, self.mention = await self.resolve_target()
+        embed = group.render()
+        await self._throttle()
+        if group.message is not None:
+            await group.message.edit(embed=embed)
+            ALERT_MESSAGES.labels(action='edit').inc()
+            return
+
+        content = self.mention if self.mention and group.firing else None
+        kwargs = {
+            'content': content,
+            'embed': embed,
+            'allowed_mentions': discord.AllowedMentions(roles=True, everyone=False, users=False)
+        }
+        if isinstance(self._target, discord.Webhook):
+            kwargs['wait'] = True
+        group.message = await self._target.send(**kwargs)
+        ALERT_MESSAGES.labels(action='send').inc()
+
+    async def _run(self):
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=60)
+                except asyncio.TimeoutError:
+                    return
+                continue
+
+            key, group = self._pending.popitem(last=False)
+            try:
+                await self._deliver(group)
+            except discord.HTTPException as e:
+                if e.status == 429:
+                    retry_after = getattr(e, 'retry_after', None) or self.per
+                    ALERT_DELIVERY_ERRORS.labels(reason='rate_limited').inc()
+                    self._pending.setdefault(key, group)
+                    await asyncio.sleep(retry_after)
+                elif e.status == 404 and group.message is not None:
+                    # Message was deleted; post a fresh one
+                    group.message = None
+                    self._pending.setdefault(key, group)
+                else:
+                    ALERT_DELIVERY_ERRORS.labels(reason='http').inc()
+                    logger.error(f"Failed to deliver alert group {key}: {e}")
+            except Exception as e:
+                ALERT_DELIVERY_ERRORS.labels(reason='other').inc()
+                logger.error(f"Failed to deliver alert group {key}: {e}")
+                self._target = None
+                await asyncio.sleep(self.per)
+
+
+class AlertReceiver:
+    """Alertmanager webhook endpoint feeding per-channel outboxes"""
+
+    def __init__(self, resolve_outbox, token=None, resolved_retention=3600, group_ttl=14400):
+        self.resolve_outbox = resolve_outbox
+        self.token = token
+        self.resolved_retention = resolved_retention
+        self.group_ttl = group_ttl
+        self.groups = {}
+
+    def add_routes(self, app, path='/alerts'):
+        app.router.add_post(path, self.handle)
+
+    async def handle(self, request):
+        if self.token and request.headers.get('Authorization') != f"Bearer {self.token}":
+            return web.json_response({'error': 'unauthorized'}, status=401)
+        try:
+            payload = await request.json()
+        except ValueError:
+            return web.json_response({'error': 'invalid JSON'}, status=400)
+        if not isinstance(payload, dict) or not isinstance(payload.get('alerts'), list):
+            return web.json_response({'error': 'expected an Alertmanager webhook payload'}, status=400)
+
+        changed = self.ingest(payload)
+        return web.json_response({'status': 'ok', 'updated': changed})
+
+    def ingest(self, payload):
+        """Apply a webhook payload; returns how many alerts changed"""
+        self.expire()
+        alerts = []
+        for alert in payload['alerts']:
+            status = alert.get('status', 'firing') if isinstance(alert, dict) else None
+            if status not in STATUSES:
+                ALERTS_RECEIVED.labels(status='other').inc()
+                continue
+            alert['status'] = status
+            ALERTS_RECEIVED.labels(status=status).inc()
+            alerts.append(alert)
+        if not alerts:
+            # A group with no alerts never resolves, so don't create one
+            return 0
+
+        key = payload.get('groupKey') or json.dumps(payload.get('groupLabels', {}), sort_keys=True)
+        group = self.groups.get(key)
+        if group is None:
+            group = self.groups[key] = AlertGroup(key, payload.get('groupLabels') or payload.get('commonLabels') or {})
+        group.updated_at = time.monotonic()
+
+        changed = 0
+        for alert in alerts:
+            if group.update(alert):
+                changed += 1
+            else:
+                ALERTS_DEDUPLICATED.inc()
+
+        if changed:
+            self.resolve_outbox(group).submit(group)
+        ALERT_GROUPS.set(len(self.groups))
+        return changed
+
+    def expire(self):
+        """Forget groups resolved for a while, or not re-sent by Alertmanager within group_ttl"""
+        now = time.monotonic()
+        expired = [
+            key for key, group in self.groups.items()
+            if (group.resolved_at is not None and now - group.resolved_at > self.resolved_retention)
+            or now - group.updated_at > self.group_ttl
+        ]
+        for key in expired:
+            del self.groups[key]
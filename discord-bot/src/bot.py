@@ -4,20 +4,41 @@ Vice Infrastructure Discord Bot
 Monitors infrastructure and provides metrics via Discord
 """
 
+import time
+
+# Start of the 'import' startup phase
+IMPORT_STARTED = time.perf_counter()
+
 import asyncio
+import functools
 import logging
 import os
-import yaml
 import discord
 from discord.ext import commands
-from prometheus_client import start_http_server, Counter, Gauge, Histogram, Summary
+from prometheus_client import Counter, Gauge
 import psutil
-import time
 from datetime import datetime, timedelta
-import aiohttp
-import json
 
-# Configure logging
+import config_loader
+from cache_policy import build_client_options
+from config_loader import ConfigError, ConfigWatcher
+from exporter import MetricsExporter
+from guild_stats import GuildStats
+from instrumentation import ERRORS_TOTAL, Instrumentation
+from log_pipeline import set_level, setup_logging, stop_logging
+from loop_monitor import LoopLagMonitor
+from message_log import MessageLog
+from metrics_snapshot import MetricsSnapshot
+from rate_limiter import RateLimiter
+from system_sampler import SystemSampler
+
+# Optional features (log store, Loki, watch rules, probes, perf stats,
+# Prometheus/Alertmanager clients, the alert receiver) are imported where
+# they are built, so a disabled feature costs neither import time nor
+# its metric series
+
+# Configure logging until the config is loaded; ViceMonitoringBot then
+# switches to the queued pipeline from log_pipeline
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
@@ -26,80 +47,471 @@ logger = logging.getLogger(__name__)
 
 # Prometheus metrics
 MESSAGES_PROCESSED = Counter('discord_messages_processed_total', 'Total messages processed')
-COMMANDS_EXECUTED = Counter('discord_commands_executed_total', 'Total commands executed', ['command'])
-ERRORS_TOTAL = Counter('discord_errors_total', 'Total errors', ['type'])
-RESPONSE_TIME = Histogram('discord_response_time_seconds', 'Response time in seconds')
-GUILD_COUNT = Gauge('discord_guild_count', 'Number of guilds')
-USER_COUNT = Gauge('discord_user_count', 'Number of users')
-CHANNEL_COUNT = Gauge('discord_channel_count', 'Number of channels')
-BOT_UPTIME = Gauge('discord_bot_uptime_seconds', 'Bot uptime in seconds')
-MESSAGE_QUEUE_SIZE = Gauge('discord_message_queue_size', 'Message queue size')
-CONNECTION_STATUS = Gauge('discord_bot_connection_status', 'Bot connection status')
+# Gauges declare how shard processes combine under multiprocess mode
+GUILD_COUNT = Gauge('discord_guild_count', 'Number of guilds', multiprocess_mode='livesum')
+USER_COUNT = Gauge('discord_user_count', 'Number of users', multiprocess_mode='livesum')
+CHANNEL_COUNT = Gauge('discord_channel_count', 'Number of channels', multiprocess_mode='livesum')
+BOT_UPTIME = Gauge('discord_bot_uptime_seconds', 'Bot uptime in seconds', multiprocess_mode='livemin')
+MESSAGE_QUEUE_SIZE = Gauge('discord_message_queue_size', 'Collected messages waiting to be written to the log store', multiprocess_mode='livesum')
+CONNECTION_STATUS = Gauge('discord_bot_connection_status', 'Bot connection status', multiprocess_mode='livemin')
+SHARD_LATENCY = Gauge('discord_shard_latency_seconds', 'Gateway heartbeat latency per shard', ['shard'], multiprocess_mode='livesum')
+SHARD_STATUS = Gauge('discord_shard_connection_status', 'Gateway connection status per shard', ['shard'], multiprocess_mode='livesum')
+GUILD_MEMBERS = Gauge('discord_guild_members', 'Members per guild', ['guild_id', 'guild_name'], multiprocess_mode='livesum')
+GUILD_CHANNELS = Gauge('discord_guild_channels', 'Channels per guild', ['guild_id', 'guild_name'], multiprocess_mode='livesum')
+GUILD_MESSAGES = Counter('discord_guild_messages_total', 'Messages processed per guild', ['guild_id', 'guild_name'])
+CACHE_MODE = Gauge('discord_bot_cache_mode', 'Configured intents/cache mode', ['mode', 'members_intent', 'max_messages'], multiprocess_mode='livemax')
+STARTUP_SECONDS = Gauge('discord_bot_startup_seconds', 'Seconds from process start to the first ready event', multiprocess_mode='max')
+STARTUP_PHASE = Gauge('discord_bot_startup_phase_seconds', 'Seconds spent in each phase of startup', ['phase'], multiprocess_mode='max')
+READY_RSS_BYTES = Gauge('discord_bot_ready_rss_bytes', 'Resident memory when the bot first became ready', multiprocess_mode='livesum')
+RATE_LIMITED = Counter('discord_rate_limited_total', 'Commands rejected by rate limits', ['scope', 'command'])
+RATE_LIMITER_KEYS = Gauge('discord_rate_limiter_keys', 'Users and commands tracked by the rate limiter', multiprocess_mode='livesum')
+
+# commands.extensions key -> discord.py extension holding that cog
+EXTENSIONS = {
+    'monitoring': 'cogs.monitoring',
+    'admin': 'cogs.admin',
+    'logs': 'cogs.logs'
+}
+
+STARTUP_PHASE.labels(phase='import').set(time.perf_counter() - IMPORT_STARTED)
 
-class ViceMonitoringBot(commands.Bot):
-    def __init__(self, config_path='config.yml'):
+class RateLimited(commands.CheckFailure):
+    """Raised when a command is rejected by the rate limiter"""
+    def __init__(self, scope, retry_after):
+        self.scope = scope
+        self.retry_after = retry_after
+        super().__init__(f"Rate limited ({scope}), retry in {retry_after:.0f}s")
+
+class ViceMonitoringBot(commands.AutoShardedBot):
+    def __init__(self, config_path='config.yml', shard_ids=None, shard_count=None):
+        self.config_path = config_path
+        started = time.perf_counter()
         self.config = self.load_config(config_path)
+        STARTUP_PHASE.labels(phase='config').set(time.perf_counter() - started)
+        self.setup_started = False
+        self.setup_done = None
+        # Log records go through a queue so disk writes never block the event loop
+        setup_logging(
+            self.config['logging'],
+            file_suffix=f"shards-{shard_ids[0]}-{shard_ids[-1]}" if shard_ids else None
+        )
         self.start_time = time.time()
-        self.message_queue = asyncio.Queue()
+        self.log_channels = frozenset(self.config['monitoring']['log_collection']['channels'])
+        log_config = self.config['monitoring']['log_collection']
+        self.message_log = MessageLog(log_config.get('max_messages', 1000))
+        self.log_store = None
+        store_config = log_config.get('store', {})
+        if log_config['enabled'] and store_config.get('enabled'):
+            from log_store import LogStore
+            
+            self.log_store = LogStore(
+                store_config.get('path', 'data/messages'),
+                retention_days=log_config.get('retention_days', 7),
+                batch_size=store_config.get('batch_size', 500),
+                flush_interval=store_config.get('flush_interval', 2),
+                max_pending=store_config.get('max_pending', 50000)
+            )
+        self.log_shipper = None
+        loki_config = log_config['loki']
+        if log_config['enabled'] and loki_config['enabled'] and loki_config['url']:
+            from log_shipper import LokiShipper
+            
+            self.log_shipper = LokiShipper(
+                loki_config['url'],
+                tenant_id=loki_config['tenant_id'],
+                batch_size=loki_config['batch_size'],
+                batch_wait=loki_config['batch_wait'],
+                max_pending=loki_config['max_pending'],
+                timeout=loki_config['timeout'],
+                max_retries=loki_config['max_retries'],
+                spool_path=loki_config['spool_path'],
+                spool_max_bytes=loki_config['spool_max_size']
+            )
+        self.watch_rules = None
+        try:
+            self.update_watch_rules(self.config['monitoring']['watch'])
+        except ValueError as e:
+            raise ConfigError(f"Invalid watch rules: {e}")
+        self.prober = None
+        if self.config['monitoring']['probes']['enabled']:
+            from prober import Prober
+            
+            self.prober = Prober(self.config['monitoring']['probes'])
+        self.perf = None
+        perf_config = self.config['monitoring']['perf']
+        if perf_config['enabled']:
+            from perf_stats import PerfTracker
+            
+            self.perf = PerfTracker(
+                window=perf_config['window'],
+                slots=perf_config['slots'],
+                relative_accuracy=perf_config['relative_accuracy'],
+                max_bins=perf_config['max_bins'],
+                error_counter=ERRORS_TOTAL
+            )
+        # (name, listener) -> its timed wrapper, for remove_listener()
+        self._timed_listeners = {}
         self.connection_status = 0
+        self.ready_once = False
+        self.guild_stats = GuildStats()
+        self.rate_limiter = RateLimiter(self.config['security'])
+        self.metrics_snapshot = MetricsSnapshot(
+            ttl=self.config['prometheus'].get('snapshot_ttl', 5)
+        )
+        self.prometheus = None
+        self.alertmanager = None
+        prometheus_config = self.config['prometheus']
+        alertmanager_config = self.config.get('alertmanager', {})
+        if prometheus_config.get('url'):
+            from query_client import PrometheusClient
+            
+            self.prometheus = PrometheusClient(
+                prometheus_config['url'],
+                cache_ttl=prometheus_config.get('query_cache_ttl', 10),
+                timeout=prometheus_config.get('query_timeout', 10)
+            )
+        self._graph_renderer = None
+        if alertmanager_config.get('url'):
+            from query_client import AlertmanagerClient
+            
+            self.alertmanager = AlertmanagerClient(
+                alertmanager_config['url'],
+                cache_ttl=prometheus_config.get('query_cache_ttl', 10),
+                timeout=prometheus_config.get('query_timeout', 10)
+            )
+        self.exporter = None
+        self.loop_monitor = LoopLagMonitor(
+            lag_threshold=self.config['monitoring']['loop_lag_threshold']
+        )
+        self.instrumentation = Instrumentation(self)
+        self.alert_outboxes = {}
+        self.alert_receiver = None
+        self.alert_runner = None
+        self.system_sampler = SystemSampler(
+            self.config['monitoring'].get('system_sample_interval', 5)
+        )
+        
+        # Initialize bot with intents and cache policy from config
+        cache_mode, client_options = build_client_options(self.config['discord'].get('cache'))
+        CACHE_MODE.labels(
+            mode=cache_mode,
+            members_intent=str(client_options['intents'].members).lower(),
+            max_messages=str(client_options['max_messages'])
+        ).set(1)
+        logger.info(f"Using '{cache_mode}' cache mode")
         
-        # Initialize bot with intents
-        intents = discord.Intents.default()
-        intents.message_content = True
-        intents.guilds = True
-        intents.members = True
+        # Without sharding enabled, run a single shard as before; with it
+        # and no explicit count, let Discord recommend one
+        sharding = self.config['discord'].get('sharding') or {}
+        if shard_count is None:
+            shard_count = sharding.get('shard_count') if sharding.get('enabled') else 1
         
         super().__init__(
             command_prefix=self.config['discord']['prefix'],
-            intents=intents,
-            help_command=None
+            help_command=None,
+            shard_ids=shard_ids,
+            shard_count=shard_count,
+            **client_options
         )
-        
-        # Start Prometheus metrics server
-        if self.config['prometheus']['enabled']:
-            start_http_server(
-                self.config['prometheus']['port'],
-                addr='0.0.0.0'
+        if self.perf:
+            self._time_event_handlers()
+    
+    @property
+    def graph_renderer(self):
+        """Created on first use, so NumPy and the worker pool only load once !graph runs"""
+        if self._graph_renderer is None and self.prometheus:
+            from graph_renderer import GraphRenderer
+            
+            graph_config = self.config.get('graphs', {})
+            self._graph_renderer = GraphRenderer(
+                self.prometheus,
+                max_points=graph_config.get('max_points', 300),
+                cache_size=graph_config.get('cache_size', 64),
+                workers=graph_config.get('workers', 2)
             )
-            logger.info(f"Prometheus metrics server started on port {self.config['prometheus']['port']}")
+        return self._graph_renderer
+    
+    def update_watch_rules(self, watch_config):
+        """Compile watch rules, creating the matcher the first time watching is enabled"""
+        if self.watch_rules is None:
+            if not watch_config['enabled']:
+                return
+            from watch_rules import WatchRules
+            
+            watch_rules = WatchRules()
+            watch_rules.compile(watch_config)
+            self.watch_rules = watch_rules
+        else:
+            self.watch_rules.compile(watch_config)
     
     def load_config(self, config_path):
-        """Load configuration from YAML file"""
+        """Load, interpolate and validate configuration from YAML file"""
+        return config_loader.load_config(config_path)
+    
+    async def apply_config(self, config):
+        """Apply a reloaded config without dropping the gateway connection"""
+        restart_only = (
+            ('discord', 'token'),
+            ('discord', 'sharding'),
+            ('discord', 'cache'),
+            ('prometheus', 'enabled'),
+            ('prometheus', 'port')
+        )
+        for section, key in restart_only:
+            if self.config[section].get(key) != config[section].get(key):
+                logger.warning(f"{section}.{key} changed; restart the bot to apply it")
+        
+        self.config = config
+        self.command_prefix = config['discord']['prefix']
+        set_level(config['logging']['level'])
+        self.rate_limiter.update(config['security'])
+        self.system_sampler.interval = config['monitoring']['system_sample_interval']
+        self.metrics_snapshot.ttl = config['prometheus']['snapshot_ttl']
+        
+        log_config = config['monitoring']['log_collection']
+        self.log_channels = frozenset(log_config['channels'])
+        if self.log_store:
+            self.log_store.retention_days = log_config['retention_days']
+            self.log_store.batch_size = log_config['store']['batch_size']
+            self.log_store.flush_interval = log_config['store']['flush_interval']
+            self.log_store.max_pending = log_config['store']['max_pending']
+        if self.log_shipper:
+            self.log_shipper.batch_size = log_config['loki']['batch_size']
+            self.log_shipper.batch_wait = log_config['loki']['batch_wait']
+            self.log_shipper.max_pending = log_config['loki']['max_pending']
         try:
-            with open(config_path, 'r') as file:
-                config = yaml.safe_load(file)
-            
-            # Replace environment variables
-            for key, value in os.environ.items():
-                if isinstance(value, str):
-                    config_str = yaml.dump(config)
-                    config_str = config_str.replace(f'${{{key}}}', value)
-                    config = yaml.safe_load(config_str)
-            
-            return config
-        except Exception as e:
-            logger.error(f"Failed to load config: {e}")
-            return {}
+            self.update_watch_rules(config['monitoring']['watch'])
+        except ValueError as e:
+            logger.error(f"Keeping previous watch rules: {e}")
+        if self.prober:
+            self.prober.update(config['monitoring']['probes'])
+        if self.perf:
+            perf_config = config['monitoring']['perf']
+            current = (self.perf.window, self.perf.slots, self.perf.relative_accuracy, self.perf.max_bins)
+            if current != tuple(perf_config[key] for key in ('window', 'slots', 'relative_accuracy', 'max_bins')):
+                logger.warning("monitoring.perf sketch settings changed; restart the bot to apply them")
+        
+        if self._graph_renderer:
+            self._graph_renderer.max_points = config['graphs']['max_points']
+            self._graph_renderer.cache_size = config['graphs']['cache_size']
+        
+        await self.sync_extensions()
+        logger.info(f"Reloaded configuration from {self.config_path}")
     
     async def setup_hook(self):
         """Setup bot hooks and commands"""
-        await self.add_cog(MonitoringCommands(self))
-        await self.add_cog(AdminCommands(self))
-        await self.add_cog(LogCollection(self))
+        # login() runs this only after the client is ready to connect
+        self.setup_started = True
+        started = time.perf_counter()
+        await self.sync_extensions()
+        STARTUP_PHASE.labels(phase='cogs').set(time.perf_counter() - started)
+        
+        # Enforce security.rate_limit and security.cooldowns on every command
+        self.add_check(self.check_rate_limit)
+        
+        # Time every command and Discord API call
+        self.instrumentation.install()
+        
+        # Start the metrics exporter on this loop; shard processes started
+        # by the launcher write to PROMETHEUS_MULTIPROC_DIR and it serves them
+        prometheus_config = self.config['prometheus']
+        if prometheus_config['enabled'] and 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+            self.exporter = MetricsExporter(
+                render_ttl=prometheus_config['render_cache_ttl'],
+                metrics_path=prometheus_config['metrics_path'],
+                health_check=self.health_check,
+                ready_check=self.ready_check
+            )
+            await self.exporter.start('0.0.0.0', prometheus_config['port'])
         
         # Start background tasks
         self.bg_task = self.loop.create_task(self.background_tasks())
+        self.loop_monitor_task = self.loop.create_task(self.loop_monitor.run())
+        self.rate_limiter_task = self.loop.create_task(self.rate_limiter.run())
+        self.sampler_task = self.loop.create_task(self.system_sampler.run())
+        if self.log_store:
+            self.log_store_task = self.loop.create_task(self.log_store.run())
+        if self.log_shipper:
+            self.log_shipper_task = self.loop.create_task(self.log_shipper.run())
+        await self.start_alert_receiver()
+        # Probe from the first shard group only, like the alert receiver
+        if self.prober and (self.shard_ids is None or 0 in self.shard_ids):
+            self.prober_task = self.loop.create_task(self.prober.run())
+        if self.perf and (self.shard_ids is None or 0 in self.shard_ids):
+            self.perf_digest_task = self.loop.create_task(self.perf_digest_loop())
+        if self.config['config_reload']['enabled']:
+            self.config_watcher = ConfigWatcher(
+                self.config_path,
+                self.apply_config,
+                interval=self.config['config_reload']['interval']
+            )
+            self.config_watcher_task = self.loop.create_task(self.config_watcher.run())
+        self.setup_done = time.perf_counter()
+    
+    async def sync_extensions(self):
+        """Load or unload the command cogs to match commands.extensions and apply per-command switches"""
+        wanted = self.config['commands']['extensions']
+        for name, extension in EXTENSIONS.items():
+            loaded = extension in self.extensions
+            try:
+                if wanted[name] and not loaded:
+                    await self.load_extension(extension)
+                    logger.info(f"Loaded {extension}")
+                elif not wanted[name] and loaded:
+                    await self.unload_extension(extension)
+                    logger.info(f"Unloaded {extension}")
+            except commands.ExtensionError as e:
+                logger.error(f"Failed to {'load' if wanted[name] else 'unload'} {extension}: {e}")
+                ERRORS_TOTAL.labels(type='extension').inc()
+        
+        disabled = {
+            str(entry.get('name'))
+            for group in ('monitoring', 'admin')
+            for entry in self.config['commands'][group]
+            if not entry.get('enabled', True)
+        }
+        for command in self.commands:
+            command.enabled = command.name not in disabled
+    
+    def health_check(self):
+        """Liveness: the event loop is responsive"""
+        max_lag = self.config['prometheus']['max_loop_lag']
+        lag = self.loop_monitor.max_lag
+        return lag <= max_lag, {'loop_lag_seconds': round(lag, 4)}
+    
+    def ready_check(self):
+        """Readiness: connected to the gateway and the event loop is responsive"""
+        healthy, details = self.health_check()
+        connected = self.is_ready() and not self.is_closed() and bool(self.connection_status)
+        shards = {str(shard_id): not shard.is_closed() for shard_id, shard in self.shards.items()}
+        return healthy and connected, {**details, 'gateway_connected': connected, 'shards': shards}
+    
+    async def start_alert_receiver(self):
+        """Serve the Alertmanager webhook endpoint (from the first shard group only)"""
+        alerts_config = self.config['monitoring']['alerts']
+        receiver_config = alerts_config['receiver']
+        if not (alerts_config['enabled'] and receiver_config['enabled']):
+            return
+        if self.shard_ids is not None and 0 not in self.shard_ids:
+            return
+        # An enabled receiver that can't start is a config error, not a
+        # warning: Alertmanager would keep retrying into nothing
+        token = receiver_config['token']
+        if not token and receiver_config['token_file']:
+            try:
+                with open(receiver_config['token_file']) as f:
+                    token = f.read().strip()
+            except OSError as e:
+                raise ConfigError(f"monitoring.alerts.receiver.token_file: {e}") from e
+        if not token and receiver_config['host'] not in ('127.0.0.1', '::1', 'localhost'):
+            raise ConfigError(
+                f"monitoring.alerts.receiver: binding to {receiver_config['host']} requires a token or token_file"
+            )
+        from aiohttp import web
+        from alert_receiver import AlertReceiver
+        
+        self.alert_receiver = AlertReceiver(
+            self.alert_outbox,
+            token=token,
+            resolved_retention=alerts_config['resolved_retention'],
+            group_ttl=alerts_config['group_ttl']
+        )
+        app = web.Application()
+        self.alert_receiver.add_routes(app, receiver_config['path'])
+        self.alert_runner = web.AppRunner(app, access_log=None)
+        await self.alert_runner.setup()
+        try:
+            await web.TCPSite(self.alert_runner, receiver_config['host'], receiver_config['port']).start()
+        except OSError as e:
+            raise ConfigError(
+                f"monitoring.alerts.receiver: can't listen on {receiver_config['host']}:{receiver_config['port']}: {e}"
+            ) from e
+        logger.info(f"Alert receiver listening on port {receiver_config['port']}{receiver_config['path']}")
+    
+    def alert_outbox(self, group):
+        """Return the outbox for the channel an alert group routes to"""
+        alerts_config = self.config['monitoring']['alerts']
+        first = next(iter(group.alerts.values()), {})
+        category = group.labels.get('category') or first.get('labels', {}).get('category')
+        channel_id = (
+            alerts_config['category_channels'].get(category)
+            or alerts_config['channel_id']
+            or self.config['discord']['channel_id']
+        )
+        key = channel_id or 'webhook'
+        outbox = self.alert_outboxes.get(key)
+        if outbox is None:
+            from alert_receiver import AlertOutbox
+            
+            outbox = self.alert_outboxes[key] = AlertOutbox(
+                functools.partial(self.resolve_alert_target, channel_id)
+            )
+        return outbox
+    
+    async def resolve_alert_target(self, channel_id):
+        """Find where alerts for a channel go, and the role to mention"""
+        alerts_config = self.config['monitoring']['alerts']
+        role_name = alerts_config['mention_role']
+        
+        if not channel_id:
+            if not alerts_config['webhook_url']:
+                raise RuntimeError("No alert channel_id or webhook_url configured")
+            return discord.Webhook.from_url(alerts_config['webhook_url'], client=self), None
+        
+        channel = self.get_channel(channel_id) or await self.fetch_channel(channel_id)
+        mention = None
+        if role_name and getattr(channel, 'guild', None):
+            role = discord.utils.find(lambda r: r.name.lower() == role_name.lower(), channel.guild.roles)
+            if role:
+                mention = role.mention
+        return channel, mention
+    
+    async def close(self):
+        """Flush persisted logs and release API sessions before disconnecting"""
+        if self.alert_runner:
+            await self.alert_runner.cleanup()
+        if self.exporter:
+            await self.exporter.stop()
+        self.instrumentation.uninstall()
+        if self.log_store:
+            try:
+                await self.log_store.close()
+            except Exception as e:
+                logger.error(f"Failed to close log store: {e}")
+        if self.log_shipper:
+            try:
+                await self.log_shipper.close()
+            except Exception as e:
+                logger.error(f"Failed to close log shipper: {e}")
+        if self.prober:
+            await self.prober.close()
+        for client in (self.prometheus, self.alertmanager):
+            if client:
+                await client.close()
+        if self._graph_renderer:
+            self._graph_renderer.close()
+        if not self.setup_started:
+            # Never logged in (e.g. the token was rejected): only the HTTP
+            # session is open, and the client's own close() expects more
+            await self.http.close()
+            return
+        await super().close()
     
     async def on_ready(self):
         """Called when bot is ready"""
         logger.info(f'{self.user} has connected to Discord!')
+        if not self.ready_once:
+            self.ready_once = True
+            process = psutil.Process()
+            STARTUP_SECONDS.set(time.time() - process.create_time())
+            if self.setup_done is not None:
+                STARTUP_PHASE.labels(phase='gateway').set(time.perf_counter() - self.setup_done)
+            READY_RSS_BYTES.set(process.memory_info().rss)
         self.connection_status = 1
         CONNECTION_STATUS.set(1)
         
         # Update metrics
-        GUILD_COUNT.set(len(self.guilds))
-        USER_COUNT.set(sum(len(guild.members) for guild in self.guilds))
-        CHANNEL_COUNT.set(sum(len(guild.channels) for guild in self.guilds))
+        self.reconcile_guild_stats()
         
         # Set bot status
         await self.change_presence(
@@ -109,29 +521,209 @@ class ViceMonitoringBot(commands.Bot):
             )
         )
     
+    async def on_shard_ready(self, shard_id):
+        SHARD_STATUS.labels(shard=str(shard_id)).set(1)
+    
+    async def on_shard_resumed(self, shard_id):
+        SHARD_STATUS.labels(shard=str(shard_id)).set(1)
+    
+    async def on_shard_disconnect(self, shard_id):
+        SHARD_STATUS.labels(shard=str(shard_id)).set(0)
+        CONNECTION_STATUS.set(0)
+    
+    def update_shard_metrics(self):
+        """Export per-shard latency and overall connection status"""
+        connected = not self.is_closed() and bool(self.shards)
+        for shard_id, shard in self.shards.items():
+            SHARD_LATENCY.labels(shard=str(shard_id)).set(shard.latency)
+            if shard.is_closed():
+                connected = False
+        self.connection_status = int(connected)
+        CONNECTION_STATUS.set(self.connection_status)
+    
+    def publish_guild_counts(self, counts):
+        """Export one guild's counts and the running totals"""
+        if counts is not None:
+            GUILD_MEMBERS.labels(guild_id=str(counts.guild_id), guild_name=counts.name).set(counts.members)
+            GUILD_CHANNELS.labels(guild_id=str(counts.guild_id), guild_name=counts.name).set(counts.channels)
+        GUILD_COUNT.set(len(self.guild_stats))
+        USER_COUNT.set(self.guild_stats.members)
+        CHANNEL_COUNT.set(self.guild_stats.channels)
+    
+    def forget_guild_counts(self, guild_id, name):
+        """Drop the per-guild series for a guild we left or that was renamed"""
+        for metric in (GUILD_MEMBERS, GUILD_CHANNELS, GUILD_MESSAGES):
+            try:
+                metric.remove(str(guild_id), name)
+            except KeyError:
+                pass
+    
+    def reconcile_guild_stats(self):
+        """Rebuild guild counts from the cache to correct drift"""
+        names = {guild_id: counts.name for guild_id, counts in self.guild_stats.guilds.items()}
+        for counts in self.guild_stats.reconcile(self.guilds):
+            self.forget_guild_counts(counts.guild_id, counts.name)
+        for counts in self.guild_stats.guilds.values():
+            old_name = names.get(counts.guild_id)
+            if old_name is not None and old_name != counts.name:
+                self.forget_guild_counts(counts.guild_id, old_name)
+            self.publish_guild_counts(counts)
+        self.publish_guild_counts(None)
+    
+    async def on_guild_join(self, guild):
+        self.publish_guild_counts(self.guild_stats.add_guild(guild))
+    
+    async def on_guild_remove(self, guild):
+        counts = self.guild_stats.remove_guild(guild)
+        if counts is not None:
+            self.forget_guild_counts(counts.guild_id, counts.name)
+        self.publish_guild_counts(None)
+    
+    async def on_guild_update(self, before, after):
+        if before.name != after.name:
+            self.forget_guild_counts(before.id, before.name)
+            self.publish_guild_counts(self.guild_stats.rename_guild(after))
+    
+    async def on_member_join(self, member):
+        self.publish_guild_counts(self.guild_stats.member_joined(member.guild))
+    
+    async def on_member_remove(self, member):
+        self.publish_guild_counts(self.guild_stats.member_left(member.guild))
+    
+    async def on_guild_channel_create(self, channel):
+        self.publish_guild_counts(self.guild_stats.channel_created(channel.guild))
+    
+    async def on_guild_channel_delete(self, channel):
+        self.publish_guild_counts(self.guild_stats.channel_deleted(channel.guild))
+    
     async def on_message(self, message):
         """Handle incoming messages"""
         if message.author == self.user:
             return
         
         MESSAGES_PROCESSED.inc()
+        if message.guild is not None:
+            GUILD_MESSAGES.labels(guild_id=str(message.guild.id), guild_name=message.guild.name).inc()
+            if self.perf:
+                self.perf.record_message(message.guild.id, message.guild.name)
+        elif self.perf:
+            self.perf.record_message(None, None)
         
         # Process commands
         await self.process_commands(message)
         
-        # Add to message queue for log collection
-        if self.config['monitoring']['log_collection']['enabled']:
-            await self.message_queue.put({
-                'timestamp': datetime.now().isoformat(),
-                'author': str(message.author),
-                'content': message.content,
-                'channel': str(message.channel),
-                'guild': str(message.guild)
-            })
+        # Add to message log for log collection
+        if self.config['monitoring']['log_collection']['enabled'] and (
+            not self.log_channels or str(message.channel) in self.log_channels
+        ):
+            record = self.message_log.append(
+                message.guild,
+                message.channel,
+                message.author,
+                message.content
+            )
+            if self.log_store:
+                self.log_store.append(record)
+            if self.log_shipper:
+                self.log_shipper.append(record)
+            if self.watch_rules and self.config['monitoring']['watch']['enabled'] and not message.author.bot:
+                self.check_watch_rules(message)
+    
+    def check_watch_rules(self, message):
+        """Match a collected message against the watch rules and queue throttled notices"""
+        hits = self.watch_rules.match(message.content, channel=str(message.channel))
+        if not hits:
+            return
+        from watch_rules import WatchNotice
+        
+        outbox = None
+        for rule, matched in hits.items():
+            if not self.watch_rules.should_notify(rule, message.channel.id):
+                continue
+            suppressed = rule.suppressed.pop(message.channel.id, 0)
+            if outbox is None:
+                outbox = self.watch_outbox()
+            outbox.submit(WatchNotice(rule, matched, message, suppressed=suppressed))
+    
+    def watch_outbox(self):
+        """Watch notices share the rate-limited outbox of the channel they go to"""
+        channel_id = (
+            self.config['monitoring']['watch']['channel_id']
+            or self.config['monitoring']['alerts']['channel_id']
+            or self.config['discord']['channel_id']
+        )
+        key = channel_id or 'webhook'
+        outbox = self.alert_outboxes.get(key)
+        if outbox is None:
+            from alert_receiver import AlertOutbox
+            
+            outbox = self.alert_outboxes[key] = AlertOutbox(
+                functools.partial(self.resolve_alert_target, channel_id)
+            )
+        return outbox
+    
+    def _timed(self, handler, event_name):
+        """Wrap an event handler so each run is recorded in the perf tracker"""
+        perf = self.perf
+        
+        @functools.wraps(handler)
+        async def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await handler(*args, **kwargs)
+            finally:
+                perf.observe_event(event_name, time.perf_counter() - start)
+        return timed
+    
+    def _time_event_handlers(self):
+        # dispatch() looks handlers up by name on the instance, so wrapping
+        # them here times every on_* method without touching each one
+        for name in dir(type(self)):
+            if name.startswith('on_') and name != 'on_error':
+                handler = getattr(self, name)
+                if asyncio.iscoroutinefunction(handler):
+                    setattr(self, name, self._timed(handler, name))
+    
+    def add_listener(self, func, /, name=discord.utils.MISSING):
+        # Cogs register their listeners through here
+        if self.perf is not None:
+            name = func.__name__ if name is discord.utils.MISSING else name
+            timed = self._timed_listeners[(name, func)] = self._timed(func, name)
+            func = timed
+        super().add_listener(func, name)
+    
+    def remove_listener(self, func, /, name=discord.utils.MISSING):
+        name = func.__name__ if name is discord.utils.MISSING else name
+        super().remove_listener(self._timed_listeners.pop((name, func), func), name)
+    
+    async def on_error(self, event_method, *args, **kwargs):
+        """Count unhandled exceptions in event handlers, then log them as usual"""
+        ERRORS_TOTAL.labels(type=event_method).inc()
+        await super().on_error(event_method, *args, **kwargs)
+    
+    async def check_rate_limit(self, ctx):
+        """Global check applying per-user rate limits and per-command cooldowns"""
+        command = ctx.command.qualified_name
+        rejection = self.rate_limiter.check(ctx.author.id, command)
+        if rejection is None:
+            return True
+        scope, retry_after = rejection
+        RATE_LIMITED.labels(scope=scope, command=command).inc()
+        raise RateLimited(scope, retry_after)
     
     async def on_command_error(self, ctx, error):
         """Handle command errors"""
-        if isinstance(error, commands.CommandNotFound):
+        if isinstance(error, (commands.CommandNotFound, commands.DisabledCommand)):
+            return
+        
+        if isinstance(error, commands.CheckFailure):
+            self.instrumentation.rejected(ctx, 'rate_limited' if isinstance(error, RateLimited) else 'check_failed')
+        
+        if isinstance(error, RateLimited):
+            await ctx.send(
+                f"⏳ Slow down, {ctx.author.mention}: try again in {error.retry_after:.0f}s",
+                delete_after=10
+            )
             return
         
         ERRORS_TOTAL.labels(type='command').inc()
@@ -146,6 +738,7 @@ class ViceMonitoringBot(commands.Bot):
     
     async def background_tasks(self):
         """Background tasks for metrics collection"""
+        last_reconcile = time.monotonic()
         while True:
             try:
                 # Update uptime
@@ -153,12 +746,17 @@ class ViceMonitoringBot(commands.Bot):
                 BOT_UPTIME.set(uptime)
                 
                 # Update queue size
-                MESSAGE_QUEUE_SIZE.set(self.message_queue.qsize())
+                MESSAGE_QUEUE_SIZE.set(self.log_store.pending if self.log_store else 0)
+                RATE_LIMITER_KEYS.set(len(self.rate_limiter))
+                if self.is_ready():
+                    self.update_shard_metrics()
                 
-                # Update guild/user/channel counts
-                GUILD_COUNT.set(len(self.guilds))
-                USER_COUNT.set(sum(len(guild.members) for guild in self.guilds))
-                CHANNEL_COUNT.set(sum(len(guild.channels) for guild in self.guilds))
+                # Guild/user/channel counts are kept current by gateway
+                # events; occasionally rebuild them to correct any drift
+                reconcile_interval = self.config['monitoring'].get('reconcile_interval', 600)
+                if time.monotonic() - last_reconcile >= reconcile_interval:
+                    self.reconcile_guild_stats()
+                    last_reconcile = time.monotonic()
                 
                 await asyncio.sleep(self.config['monitoring']['metrics_interval'])
                 
@@ -167,204 +765,105 @@ class ViceMonitoringBot(commands.Bot):
                 ERRORS_TOTAL.labels(type='background').inc()
                 await asyncio.sleep(60)
 
-class MonitoringCommands(commands.Cog):
-    def __init__(self, bot):
-        self.bot = bot
-    
-    @commands.command(name='status')
-    async def status(self, ctx):
-        """Show system status"""
-        start_time = time.time()
-        
-        try:
-            # Get system metrics
-            cpu_percent = psutil.cpu_percent(interval=1)
-            memory = psutil.virtual_memory()
-            disk = psutil.disk_usage('/')
-            
-            # Get bot metrics
-            uptime = time.time() - self.bot.start_time
-            guild_count = len(self.bot.guilds)
-            user_count = sum(len(guild.members) for guild in self.bot.guilds)
-            
-            embed = discord.Embed(
-                title="🖥️ Vice Infrastructure Status",
-                color=discord.Color.green(),
-                timestamp=datetime.now()
-            )
-            
-            embed.add_field(
-                name="System",
-                value=f"CPU: {cpu_percent}%\nMemory: {memory.percent}%\nDisk: {disk.percent}%",
-                inline=True
-            )
-            
-            embed.add_field(
-                name="Bot",
-                value=f"Uptime: {timedelta(seconds=int(uptime))}\nGuilds: {guild_count}\nUsers: {user_count}",
-                inline=True
-            )
-            
-            embed.add_field(
-                name="Connection",
-                value=f"Status: {'🟢 Online' if self.bot.connection_status else '🔴 Offline'}\nLatency: {round(self.bot.latency * 1000)}ms",
-                inline=True
-            )
-            
-            await ctx.send(embed=embed)
-            
-            # Record metrics
-            COMMANDS_EXECUTED.labels(command='status').inc()
-            response_time = time.time() - start_time
-            RESPONSE_TIME.observe(response_time)
-            
-        except Exception as e:
-            logger.error(f"Status command error: {e}")
-            ERRORS_TOTAL.labels(type='status_command').inc()
-            await ctx.send("❌ Error getting status")
-    
-    @commands.command(name='metrics')
-    async def metrics(self, ctx):
-        """Show current metrics"""
-        start_time = time.time()
-        
-        try:
-            # Get Prometheus metrics
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f"http://localhost:{self.bot.config['prometheus']['port']}/metrics") as response:
-                    if response.status == 200:
-                        metrics_text = await response.text()
-                        
-                        # Create a summary of key metrics
-                        embed = discord.Embed(
-                            title="📊 Current Metrics",
-                            description="Key monitoring metrics",
-                            color=discord.Color.blue(),
-                            timestamp=datetime.now()
-                        )
-                        
-                        # Parse some key metrics
-                        lines = metrics_text.split('\n')
-                        for line in lines:
-                            if 'discord_messages_processed_total' in line:
-                                messages = line.split()[-1]
-                                embed.add_field(name="Messages Processed", value=messages, inline=True)
-                            elif 'discord_commands_executed_total' in line:
-                                commands = line.split()[-1]
-                                embed.add_field(name="Commands Executed", value=commands, inline=True)
-                            elif 'discord_errors_total' in line:
-                                errors = line.split()[-1]
-                                embed.add_field(name="Total Errors", value=errors, inline=True)
-                        
-                        await ctx.send(embed=embed)
-                    else:
-                        await ctx.send("❌ Unable to fetch metrics")
-            
-            COMMANDS_EXECUTED.labels(command='metrics').inc()
-            response_time = time.time() - start_time
-            RESPONSE_TIME.observe(response_time)
-            
-        except Exception as e:
-            logger.error(f"Metrics command error: {e}")
-            ERRORS_TOTAL.labels(type='metrics_command').inc()
-            await ctx.send("❌ Error getting metrics")
-
-class AdminCommands(commands.Cog):
-    def __init__(self, bot):
-        self.bot = bot
-    
-    def is_admin(ctx):
-        """Check if user has admin role"""
-        if not ctx.guild:
-            return False
-        
-        admin_roles = ctx.bot.config['security']['admin_roles']
-        user_roles = [role.name for role in ctx.author.roles]
+    def perf_embed(self, title):
+        """Summarize the perf window: throughput, latency quantiles, errors and busiest guilds"""
+        from perf_stats import format_latency
         
-        return any(role in user_roles for role in admin_roles)
-    
-    @commands.command(name='restart')
-    @commands.check(is_admin)
-    async def restart(self, ctx):
-        """Restart monitoring services (Admin only)"""
+        perf_config = self.config['monitoring']['perf']
+        summary = self.perf.summary(top_guilds=perf_config['top_guilds'])
         embed = discord.Embed(
-            title="🔄 Restarting Services",
-            description="Restarting monitoring services...",
-            color=discord.Color.yellow()
+            title=title,
+            description=f"Last {timedelta(seconds=int(summary.seconds))}",
+            color=discord.Color.blue(),
+            timestamp=datetime.now()
         )
-        await ctx.send(embed=embed)
         
-        # Here you would implement actual service restart logic
-        # For now, just log the action
-        logger.info(f"Restart requested by {ctx.author}")
-        COMMANDS_EXECUTED.labels(command='restart').inc()
-    
-    @commands.command(name='backup')
-    @commands.check(is_admin)
-    async def backup(self, ctx):
-        """Create backup (Admin only)"""
-        embed = discord.Embed(
-            title="💾 Creating Backup",
-            description="Creating system backup...",
-            color=discord.Color.blue()
+        commands_run = summary.command_count
+        failures = sum(summary.failures.values())
+        embed.add_field(
+            name="Throughput",
+            value=(
+                f"Messages: {summary.messages} ({summary.rate(summary.messages) * 60:.1f}/min)\n"
+                f"Commands: {commands_run} ({summary.rate(commands_run) * 60:.2f}/min)\n"
+                f"Events: {sum(sketch.count for sketch in summary.events.values())}"
+            ),
+            inline=False
         )
-        await ctx.send(embed=embed)
         
-        # Here you would implement actual backup logic
-        logger.info(f"Backup requested by {ctx.author}")
-        COMMANDS_EXECUTED.labels(command='backup').inc()
-
-class LogCollection(commands.Cog):
-    def __init__(self, bot):
-        self.bot = bot
-    
-    @commands.command(name='logs')
-    async def logs(self, ctx, limit: int = 10):
-        """Show recent logs"""
-        if limit > 50:
-            limit = 50
-        
-        logs = []
-        for _ in range(min(limit, self.bot.message_queue.qsize())):
-            try:
-                log_entry = self.bot.message_queue.get_nowait()
-                logs.append(log_entry)
-            except asyncio.QueueEmpty:
-                break
-        
-        if not logs:
-            await ctx.send("No recent logs available")
-            return
+        def latency_lines(sketches, failures=None, limit=8):
+            lines = []
+            for name, sketch in sorted(sketches.items(), key=lambda item: -item[1].count)[:limit]:
+                line = (
+                    f"`{name}` ×{sketch.count}: "
+                    f"{format_latency(sketch.quantile(0.5))} / {format_latency(sketch.quantile(0.99))}"
+                )
+                if failures and failures.get(name):
+                    line += f" · {failures[name]} failed"
+                lines.append(line)
+            return "\n".join(lines) or "None"
         
-        embed = discord.Embed(
-            title="📝 Recent Logs",
-            description=f"Last {len(logs)} messages",
-            color=discord.Color.greyple(),
-            timestamp=datetime.now()
-        )
+        embed.add_field(name="Commands (p50 / p99)", value=latency_lines(summary.commands, summary.failures)[:1024], inline=False)
+        embed.add_field(name="Gateway events (p50 / p99)", value=latency_lines(summary.events, limit=6)[:1024], inline=False)
         
-        for log in logs[-5:]:  # Show last 5 logs
-            embed.add_field(
-                name=f"{log['timestamp'][:19]} - {log['author']}",
-                value=f"**{log['channel']}**: {log['content'][:100]}...",
-                inline=False
-            )
+        error_lines = [
+            f"`{error_type}`: {count:.0f}"
+            for error_type, count in sorted(summary.errors.items(), key=lambda item: -item[1])[:8]
+        ]
+        if commands_run:
+            error_lines.append(f"Command failure rate: {failures / commands_run * 100:.1f}%")
+        embed.add_field(name="Errors", value="\n".join(error_lines) or "None", inline=False)
         
-        await ctx.send(embed=embed)
-        COMMANDS_EXECUTED.labels(command='logs').inc()
+        guild_lines = [
+            f"{name}: {count} messages"
+            for (_, name), count in summary.guilds
+        ]
+        embed.add_field(name="Busiest guilds", value="\n".join(guild_lines)[:1024] or "None", inline=False)
+        if self.shard_ids is not None:
+            embed.set_footer(text=f"Shards {self.shard_ids[0]}-{self.shard_ids[-1]}")
+        return embed
+    
+    async def perf_digest_loop(self):
+        """Post the perf summary to discord.channel_id every digest_interval seconds"""
+        await self.wait_until_ready()
+        while not self.is_closed():
+            interval = self.config['monitoring']['perf']['digest_interval']
+            if not interval:
+                # Disabled; check again later in case a reload turns it on
+                await asyncio.sleep(300)
+                continue
+            await asyncio.sleep(interval)
+            channel_id = self.config['discord']['channel_id']
+            if not channel_id or not self.config['monitoring']['perf']['digest_interval']:
+                continue
+            try:
+                channel = self.get_channel(int(channel_id)) or await self.fetch_channel(int(channel_id))
+                await channel.send(embed=self.perf_embed("⚡ Performance digest"))
+            except Exception as e:
+                logger.error(f"Failed to post performance digest: {e}")
+                ERRORS_TOTAL.labels(type='perf_digest').inc()
 
-async def main():
+async def main(config_path='config.yml', shard_ids=None, shard_count=None):
     """Main function"""
-    bot = ViceMonitoringBot()
+    try:
+        bot = ViceMonitoringBot(config_path, shard_ids=shard_ids, shard_count=shard_count)
+    except ConfigError as e:
+        logger.error(str(e))
+        raise SystemExit(config_loader.EXIT_CONFIG_ERROR)
     
     try:
         await bot.start(bot.config['discord']['token'])
+    except ConfigError as e:
+        logger.error(str(e))
+        raise SystemExit(config_loader.EXIT_CONFIG_ERROR)
     except KeyboardInterrupt:
         logger.info("Bot shutdown requested")
     except Exception as e:
         logger.error(f"Bot error: {e}")
     finally:
-        await bot.close()
+        try:
+            await bot.close()
+        finally:
+            stop_logging()
 
 if __name__ == "__main__":
     asyncio.run(main()) 
\ No newline at end of file
@@ -0,0 +1,75 @@
+"""
+Cache Policy
+Builds gateway intents and client cache options from the
+`discord.cache` section of config.yml
+"""
+
+import discord
+
+from config_loader import ConfigError
+
+# Defaults for each cache mode; anything set in config overrides these
+MODES = {
+    # Cache every member of every guild (discord.py defaults)
+    'full': {
+        'intents': {'message_content': True, 'members': True, 'presences': False},
+        'member_cache': 'full',
+        'max_messages': 1000,
+        'chunk_guilds_at_startup': True
+    },
+    # No member list, no member or message cache; counts come from guild.member_count
+    'lean': {
+        'intents': {'message_content': True, 'members': False, 'presences': False},
+        'member_cache': 'none',
+        'max_messages': None,
+        'chunk_guilds_at_startup': False
+    }
+}
+
+
+def _member_cache_flags(policy, intents):
+    # "full" means everything the enabled intents allow
+    if policy == 'full':
+        return discord.MemberCacheFlags.from_intents(intents)
+    if policy == 'none':
+        return discord.MemberCacheFlags.none()
+    if policy == 'joined':
+        return discord.MemberCacheFlags(joined=True, voice=False)
+    if policy == 'voice':
+        return discord.MemberCacheFlags(joined=False, voice=True)
+    raise ConfigError(f"discord.cache.member_cache: unknown policy '{policy}' (use full, joined, voice or none)")
+
+
+def build_client_options(cache_config):
+    """
+    Return (mode, kwargs) where kwargs holds intents, member_cache_flags,
+    max_messages and chunk_guilds_at_startup for commands.Bot
+    """
+    cache_config = cache_config or {}
+    mode = cache_config.get('mode', 'full')
+    if mode not in MODES:
+        raise ConfigError(f"discord.cache.mode: unknown cache mode '{mode}' (use {', '.join(MODES)})")
+    defaults = MODES[mode]
+
+    intents = discord.Intents.default()
+    intents.guilds = True
+    for name, enabled in {**defaults['intents'], **(cache_config.get('intents') or {})}.items():
+        if name not in discord.Intents.VALID_FLAGS:
+            raise ConfigError(f"discord.cache.intents.{name}: unknown gateway intent")
+        setattr(intents, name, bool(enabled))
+
+    member_cache = cache_config.get('member_cache', defaults['member_cache'])
+    if member_cache == 'joined' and not intents.members:
+        # Joined-member caching needs the members intent; fall back to
+        # whatever the enabled intents allow
+        member_cache = 'full'
+
+    return mode, {
+        'intents': intents,
+        'member_cache_flags': _member_cache_flags(member_cache, intents),
+        'max_messages': cache_config.get('max_messages', defaults['max_messages']),
+        'chunk_guilds_at_startup': cache_config.get(
+            'chunk_guilds_at_startup',
+            defaults['chunk_guilds_at_startup'] and intents.members
+        )
+    }
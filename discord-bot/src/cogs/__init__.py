@@ -0,0 +1,4 @@
+"""
+Command cogs, each loaded as a discord.py extension when enabled under
+commands.extensions in the config
+"""
@@ -0,0 +1,59 @@
+"""
+Admin Commands
+Commands limited to members with one of security.admin_roles.
+"""
+
+import logging
+
+import discord
+from discord.ext import commands
+
+logger = logging.getLogger(__name__)
+
+
+class AdminCommands(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+    
+    def is_admin(ctx):
+        """Check if user has admin role"""
+        if not ctx.guild:
+            return False
+        
+        admin_roles = ctx.bot.config['security']['admin_roles']
+        user_roles = [role.name for role in ctx.author.roles]
+        
+        return any(role in user_roles for role in admin_roles)
+    
+    @commands.command(name='restart')
+    @commands.check(is_admin)
+    async def restart(self, ctx):
+        """Restart monitoring services (Admin only)"""
+        embed = discord.Embed(
+            title="🔄 Restarting Services",
+            description="Restarting monitoring services...",
+            color=discord.Color.yellow()
+        )
+        await ctx.send(embed=embed)
+        
+        # Here you would implement actual service restart logic
+        # For now, just log the action
+        logger.info(f"Restart requested by {ctx.author}")
+    
+    @commands.command(name='backup')
+    @commands.check(is_admin)
+    async def backup(self, ctx):
+        """Create backup (Admin only)"""
+        embed = discord.Embed(
+            title="💾 Creating Backup",
+            description="Creating system backup...",
+            color=discord.Color.blue()
+        )
+        await ctx.send(embed=embed)
+        
+        # Here you would implement actual backup logic
+        logger.info(f"Backup requested by {ctx.author}")
+
+
+async def setup(bot):
+    await bot.add_cog(AdminCommands(bot))
@@ -0,0 +1,108 @@
+"""
+Log Collection Commands
+Queries over collected messages and the watch rules matched against them.
+"""
+
+import typing
+from datetime import datetime
+
+import discord
+from discord.ext import commands
+
+from message_log import parse_time
+
+
+class LogFilters(commands.FlagConverter):
+    """Filters for the logs command, e.g. `channel: admin since: 02:00 until: 03:00`"""
+    channel: typing.Optional[str] = None
+    author: typing.Optional[str] = None
+    since: typing.Optional[str] = None
+    until: typing.Optional[str] = None
+
+class LogCollection(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+    
+    @commands.command(name='logs')
+    async def logs(self, ctx, limit: typing.Optional[int] = 10, *, filters: LogFilters):
+        """Show recent logs, optionally filtered by channel, author or time range"""
+        if limit > 50:
+            limit = 50
+        
+        try:
+            since = parse_time(filters.since)
+            until = parse_time(filters.until)
+        except ValueError as e:
+            await ctx.send(f"❌ {e}")
+            return
+        
+        channel = filters.channel.lstrip('#') if filters.channel else None
+        logs = self.bot.message_log.query(
+            channel=channel,
+            author=filters.author,
+            since=since,
+            until=until,
+            limit=limit
+        )
+        
+        # Reach back into the on-disk store for anything older than the buffer
+        oldest = self.bot.message_log.oldest_timestamp
+        if self.bot.log_store and len(logs) < limit and (oldest is None or since is None or since.timestamp() < oldest):
+            bounds = [t for t in (until.timestamp() if until else None, oldest and oldest - 1e-6) if t]
+            older_until = min(bounds) if bounds else None
+            older = await self.bot.log_store.query(
+                channel=channel,
+                author=filters.author,
+                since=since,
+                until=older_until,
+                limit=limit - len(logs)
+            )
+            logs = older + logs
+        
+        if not logs:
+            await ctx.send("No recent logs available")
+            return
+        
+        embed = discord.Embed(
+            title="📝 Recent Logs",
+            description=f"Last {len(logs)} messages",
+            color=discord.Color.greyple(),
+            timestamp=datetime.now()
+        )
+        
+        for log in logs[-5:]:  # Show last 5 logs
+            embed.add_field(
+                name=f"{log.time.isoformat()[:19]} - {log.author}",
+                value=f"**{log.channel}**: {log.content[:100]}...",
+                inline=False
+            )
+        
+        await ctx.send(embed=embed)
+    
+    @commands.command(name='watch')
+    async def watch(self, ctx):
+        """Show watch rules and how often each has matched"""
+        watch_rules = self.bot.watch_rules
+        if not self.bot.config['monitoring']['watch']['enabled'] or not len(watch_rules):
+            await ctx.send("No watch rules configured")
+            return
+        
+        embed = discord.Embed(
+            title="👀 Watch Rules",
+            description=f"{len(watch_rules)} rules",
+            color=discord.Color.gold(),
+            timestamp=datetime.now()
+        )
+        busiest = sorted(watch_rules.rules.values(), key=lambda rule: rule.hits, reverse=True)
+        for rule in busiest[:25]:
+            channels = ', '.join(f"#{channel}" for channel in sorted(rule.channels)) or 'all channels'
+            embed.add_field(
+                name=f"{rule.name} ({rule.severity})",
+                value=f"{rule.hits} hits · {channels}",
+                inline=True
+            )
+        await ctx.send(embed=embed)
+
+
+async def setup(bot):
+    await bot.add_cog(LogCollection(bot))
@@ -0,0 +1,290 @@
+"""
+Monitoring Commands
+Status, metrics, alerts, PromQL queries and graphs, probes and perf
+summaries.
+"""
+
+import io
+import logging
+import math
+import time
+from datetime import datetime, timedelta
+
+import discord
+from discord.ext import commands
+
+from instrumentation import ERRORS_TOTAL, mark_failed
+from message_log import parse_duration
+from query_client import QueryError, format_series
+
+logger = logging.getLogger(__name__)
+
+
+class MonitoringCommands(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+    
+    @commands.command(name='status')
+    async def status(self, ctx):
+        """Show system status"""
+        try:
+            # Get system metrics from the background sampler
+            system = await self.bot.system_sampler.get()
+            
+            # Get bot metrics
+            uptime = time.time() - self.bot.start_time
+            guild_count = len(self.bot.guild_stats)
+            user_count = self.bot.guild_stats.members
+            
+            embed = discord.Embed(
+                title="🖥️ Vice Infrastructure Status",
+                color=discord.Color.green(),
+                timestamp=datetime.now()
+            )
+            
+            embed.add_field(
+                name="System",
+                value=f"CPU: {system.cpu_percent}%\nMemory: {system.memory_percent}%\nDisk: {system.disk_percent}%",
+                inline=True
+            )
+            
+            embed.add_field(
+                name="Bot",
+                value=f"Uptime: {timedelta(seconds=int(uptime))}\nGuilds: {guild_count}\nUsers: {user_count}",
+                inline=True
+            )
+            
+            # latency is NaN until the first heartbeat is acknowledged
+            latency = f"{round(self.bot.latency * 1000)}ms" if math.isfinite(self.bot.latency) else "n/a"
+            embed.add_field(
+                name="Connection",
+                value=f"Status: {'🟢 Online' if self.bot.connection_status else '🔴 Offline'}\nLatency: {latency}",
+                inline=True
+            )
+            
+            await ctx.send(embed=embed)
+            
+        except Exception as e:
+            logger.error(f"Status command error: {e}")
+            ERRORS_TOTAL.labels(type='status_command').inc()
+            mark_failed(ctx)
+            await ctx.send("❌ Error getting status")
+    
+    @commands.command(name='metrics')
+    async def metrics(self, ctx):
+        """Show current metrics"""
+        try:
+            # Read key metrics straight from the registry
+            snapshot = self.bot.metrics_snapshot.get()
+            
+            embed = discord.Embed(
+                title="📊 Current Metrics",
+                description="Key monitoring metrics",
+                color=discord.Color.blue(),
+                timestamp=datetime.now()
+            )
+            
+            embed.add_field(
+                name="Messages Processed",
+                value=f"{snapshot.value('discord_messages_processed_total'):.0f}",
+                inline=True
+            )
+            embed.add_field(
+                name="Commands Executed",
+                value=f"{snapshot.value('discord_commands_executed_total'):.0f}",
+                inline=True
+            )
+            embed.add_field(
+                name="Total Errors",
+                value=f"{snapshot.value('discord_errors_total'):.0f}",
+                inline=True
+            )
+            
+            top_commands = snapshot.by_label('discord_commands_executed_total', 'command')[:5]
+            if top_commands:
+                embed.add_field(
+                    name="Top Commands",
+                    value='\n'.join(f"{name}: {count:.0f}" for name, count in top_commands),
+                    inline=False
+                )
+            
+            await ctx.send(embed=embed)
+            
+        except Exception as e:
+            logger.error(f"Metrics command error: {e}")
+            ERRORS_TOTAL.labels(type='metrics_command').inc()
+            mark_failed(ctx)
+            await ctx.send("❌ Error getting metrics")
+
+    @commands.command(name='alerts')
+    async def alerts(self, ctx):
+        """Show active alerts"""
+        source = self.bot.alertmanager or self.bot.prometheus
+        if source is None:
+            await ctx.send("❌ No Alertmanager or Prometheus URL configured")
+            return
+        
+        try:
+            alerts = await source.alerts()
+        except QueryError as e:
+            logger.error(f"Alerts command error: {e}")
+            ERRORS_TOTAL.labels(type='alerts_command').inc()
+            mark_failed(ctx)
+            await ctx.send(f"❌ Unable to fetch alerts: {e}")
+            return
+        
+        # Prometheus reports pending alerts too; only show what is firing
+        firing = [
+            alert for alert in alerts
+            if alert.get('state', alert.get('status', {}).get('state')) in ('firing', 'active')
+        ]
+        
+        embed = discord.Embed(
+            title="🚨 Active Alerts",
+            description=f"{len(firing)} alert(s) firing" if firing else "✅ No active alerts",
+            color=discord.Color.red() if firing else discord.Color.green(),
+            timestamp=datetime.now()
+        )
+        
+        severity_order = {'critical': 0, 'warning': 1}
+        firing.sort(key=lambda alert: severity_order.get(alert['labels'].get('severity'), 2))
+        for alert in firing[:10]:
+            labels = alert['labels']
+            annotations = alert.get('annotations', {})
+            target = labels.get('instance') or labels.get('job', '')
+            embed.add_field(
+                name=f"{labels.get('alertname', 'alert')} [{labels.get('severity', 'none')}]",
+                value=f"{annotations.get('summary', '')}\n{target}"[:1024] or '-',
+                inline=False
+            )
+        if len(firing) > 10:
+            embed.set_footer(text=f"and {len(firing) - 10} more")
+        
+        await ctx.send(embed=embed)
+    
+    @commands.command(name='query')
+    async def query(self, ctx, *, promql: str):
+        """Run a PromQL instant query"""
+        if self.bot.prometheus is None:
+            await ctx.send("❌ No Prometheus URL configured")
+            return
+        
+        promql = promql.strip('` ')
+        try:
+            data = await self.bot.prometheus.query(promql)
+        except QueryError as e:
+            ERRORS_TOTAL.labels(type='query_command').inc()
+            mark_failed(ctx)
+            await ctx.send(f"❌ Query failed: {e}")
+            return
+        
+        result_type = data.get('resultType')
+        result = data.get('result', [])
+        
+        embed = discord.Embed(
+            title="🔎 Query Result",
+            description=f"`{promql[:200]}`",
+            color=discord.Color.blue(),
+            timestamp=datetime.now()
+        )
+        
+        if result_type in ('scalar', 'string'):
+            embed.add_field(name=result_type.title(), value=str(result[1]), inline=False)
+        elif not result:
+            embed.add_field(name="Result", value="Empty result", inline=False)
+        else:
+            for series in result[:10]:
+                if result_type == 'matrix':
+                    value = series['values'][-1][1] if series['values'] else 'n/a'
+                else:
+                    value = series['value'][1]
+                embed.add_field(name=format_series(series['metric'])[:256], value=value, inline=False)
+            if len(result) > 10:
+                embed.set_footer(text=f"{len(result)} series, showing first 10")
+        
+        await ctx.send(embed=embed)
+
+    @commands.command(name='graph')
+    async def graph(self, ctx, *, args: str):
+        """Graph a PromQL expression, e.g. `!graph rate(discord_messages_processed_total[5m]) 6h`"""
+        if self.bot.graph_renderer is None:
+            await ctx.send("❌ No Prometheus URL configured")
+            return
+        
+        graph_config = self.bot.config.get('graphs', {})
+        promql, range_text = args.strip('` '), graph_config.get('default_range', '1h')
+        parts = promql.rsplit(None, 1)
+        if len(parts) == 2:
+            try:
+                parse_duration(parts[1])
+                promql, range_text = parts
+            except ValueError:
+                pass
+        
+        try:
+            range_seconds = int(parse_duration(range_text).total_seconds())
+            max_range = int(parse_duration(graph_config.get('max_range', '7d')).total_seconds())
+        except ValueError as e:
+            await ctx.send(f"❌ {e}")
+            return
+        range_seconds = min(range_seconds, max_range)
+        
+        try:
+            async with ctx.typing():
+                png = await self.bot.graph_renderer.render(promql, range_seconds)
+        except (QueryError, ValueError) as e:
+            ERRORS_TOTAL.labels(type='graph_command').inc()
+            mark_failed(ctx)
+            await ctx.send(f"❌ Graph failed: {e}")
+            return
+        
+        embed = discord.Embed(
+            title="📈 Graph",
+            description=f"`{promql[:200]}` over {range_text}",
+            color=discord.Color.blue(),
+            timestamp=datetime.now()
+        )
+        embed.set_image(url="attachment://graph.png")
+        await ctx.send(embed=embed, file=discord.File(io.BytesIO(png), filename="graph.png"))
+    
+    @commands.command(name='perf')
+    async def perf(self, ctx):
+        """Show command and event latency quantiles, throughput, errors and busiest guilds"""
+        if self.bot.perf is None:
+            await ctx.send("❌ Performance tracking is disabled")
+            return
+        await ctx.send(embed=self.bot.perf_embed("⚡ Performance"))
+    
+    @commands.command(name='probe')
+    async def probe(self, ctx, host: str):
+        """Probe a monitored host now, e.g. `!probe vice-bot-one` or `!probe 172.236.225.9:9090`"""
+        if self.bot.prober is None:
+            await ctx.send("❌ Probing is disabled")
+            return
+        
+        async with ctx.typing():
+            results = await self.bot.prober.probe_host(host)
+        if not results:
+            await ctx.send(f"❌ `{host[:100]}` is not a monitored target")
+            return
+        
+        failed = sum(1 for result in results if not result.success)
+        embed = discord.Embed(
+            title=f"📡 Probe: {host[:100]}",
+            description=f"{len(results) - failed}/{len(results)} checks succeeded",
+            color=discord.Color.red() if failed else discord.Color.green(),
+            timestamp=datetime.now()
+        )
+        results.sort(key=lambda result: (result.check.instance, result.check.module))
+        for result in results[:25]:
+            status = "✅" if result.success else "❌"
+            embed.add_field(
+                name=f"{status} {result.check.module} {result.check.instance}"[:256],
+                value=f"{result.duration * 1000:.1f}ms · {result.detail[:200]}",
+                inline=False
+            )
+        await ctx.send(embed=embed)
+
+
+async def setup(bot):
+    await bot.add_cog(MonitoringCommands(bot))
@@ -0,0 +1,380 @@
+"""
+Config Loader
+Loads config.yml in one pass: resolves ${VAR}, ${VAR:-default} and
+${VAR-default} references over the parsed tree, then validates and
+coerces values against a typed schema. ConfigWatcher reloads the file
+when it changes on disk.
+"""
+
+import asyncio
+import copy
+import logging
+import os
+import re
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+# ${VAR}, ${VAR:-default} (unset or empty) and ${VAR-default} (unset only)
+ENV_REF_RE = re.compile(r'\$\{([A-Za-z_][A-Za-z0-9_]*)(?:(:?-)([^}]*))?\}')
+
+SIZE_RE = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([KMG]?)B?\s*$', re.IGNORECASE)
+SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+# Exit status for a rejected config (EX_CONFIG in sysexits.h); the
+# launcher doesn't restart shard groups that exit with it
+EXIT_CONFIG_ERROR = 78
+
+
+class ConfigError(Exception):
+    """Raised when the config file can't be read or fails validation"""
+
+
+def interpolate(node, environ=None):
+    """Return a copy of ``node`` with environment references resolved"""
+    if environ is None:
+        environ = os.environ
+
+    def resolve(match):
+        name, operator, default = match.groups()
+        value = environ.get(name)
+        if operator == ':-' and not value:
+            return default
+        if operator == '-' and value is None:
+            return default
+        return value or ''
+
+    if isinstance(node, str):
+        return ENV_REF_RE.sub(resolve, node) if '${' in node else node
+    if isinstance(node, dict):
+        return {key: interpolate(value, environ) for key, value in node.items()}
+    if isinstance(node, list):
+        return [interpolate(value, environ) for value in node]
+    return node
+
+
+def parse_size(value):
+    """Parse "10MB", "512K" or a plain byte count into bytes"""
+    if isinstance(value, int):
+        return value
+    match = SIZE_RE.match(str(value))
+    if not match:
+        raise ValueError(f"invalid size '{value}'")
+    amount, unit = match.groups()
+    return int(float(amount) * SIZE_UNITS[unit.upper()])
+
+
+class Field:
+    """Schema entry: expected type, default and constraints for one key"""
+
+    def __init__(self, kind, default=None, required=False, minimum=None, choices=None):
+        self.kind = kind
+        self.default = default
+        self.required = required
+        self.minimum = minimum
+        self.choices = choices
+
+    def coerce(self, value):
+        kind = self.kind
+        if value is None or value == '':
+            return None
+        if kind is bool:
+            if isinstance(value, str):
+                lowered = value.strip().lower()
+                if lowered in ('true', 'yes', 'on', '1'):
+                    return True
+                if lowered in ('false', 'no', 'off', '0'):
+                    return False
+                raise ValueError(f"expected a boolean, got '{value}'")
+            return bool(value)
+        if kind is int:
+            if isinstance(value, bool):
+                raise ValueError("expected an integer")
+            return int(value)
+        if kind is float:
+            return float(value)
+        if kind is str or kind == 'path':
+            return str(value)
+        if kind == 'size':
+            return parse_size(value)
+        if kind == 'str_list':
+            if isinstance(value, str):
+                return [item.strip() for item in value.split(',') if item.strip()]
+            if not isinstance(value, list):
+                raise ValueError("expected a list")
+            return [str(item) for item in value]
+        if kind == 'int_map':
+            if not isinstance(value, dict):
+                raise ValueError("expected a mapping")
+            return {str(key): int(item) for key, item in value.items()}
+        if kind == 'str_map':
+            if not isinstance(value, dict):
+                raise ValueError("expected a mapping")
+            return {str(key): str(item) for key, item in value.items()}
+        if kind == 'mapping_list':
+            if not isinstance(value, list) or not all(isinstance(item, dict) for item in value):
+                raise ValueError("expected a list of mappings")
+            return value
+        raise TypeError(f"unknown field kind {kind!r}")
+
+    def fallback(self):
+        # A copy, so configs never share (and mutate) a list or dict default
+        return copy.copy(self.default)
+
+    def validate(self, value, path, errors):
+        if value is None or value == '':
+            if self.required:
+                errors.append(f"{path} is required")
+            return self.fallback()
+        try:
+            value = self.coerce(value)
+        except (TypeError, ValueError) as e:
+            errors.append(f"{path}: {e}")
+            return self.fallback()
+        if self.minimum is not None and value < self.minimum:
+            errors.append(f"{path} must be >= {self.minimum}")
+        if self.choices is not None and value not in self.choices:
+            errors.append(f"{path} must be one of {', '.join(map(str, self.choices))}")
+        return value
+
+
+SCHEMA = {
+    'discord': {
+        'token': Field(str, required=True),
+        'prefix': Field(str, default='!'),
+        'guild_id': Field(int),
+        'channel_id': Field(int),
+        'sharding': {
+            'enabled': Field(bool, default=False),
+            'shard_count': Field(int, minimum=1),
+            'processes': Field(int, default=1, minimum=1),
+            'metrics_dir': Field(str, default='/tmp/vice-bot-metrics')
+        },
+        'cache': {
+            'mode': Field(str, default='full', choices=('full', 'lean'))
+        }
+    },
+    'monitoring': {
+        'metrics_interval': Field(float, default=30, minimum=1),
+        'system_sample_interval': Field(float, default=5, minimum=0.5),
+        'reconcile_interval': Field(float, default=600, minimum=10),
+        'loop_lag_threshold': Field(float, default=0.1, minimum=0.001),
+        'log_collection': {
+            'enabled': Field(bool, default=True),
+            'channels': Field('str_list', default=[]),
+            'max_messages': Field(int, default=1000, minimum=1),
+            'retention_days': Field(float, default=7, minimum=0),
+            'store': {
+                'enabled': Field(bool, default=False),
+                'path': Field(str, default='data/messages'),
+                'batch_size': Field(int, default=500, minimum=1),
+                'flush_interval': Field(float, default=2, minimum=0.1),
+                'max_pending': Field(int, default=50000, minimum=1)
+            },
+            'loki': {
+                'enabled': Field(bool, default=False),
+                'url': Field(str),
+                'tenant_id': Field(str),
+                'batch_size': Field(int, default=500, minimum=1),
+                'batch_wait': Field(float, default=2, minimum=0.1),
+                'max_pending': Field(int, default=10000, minimum=1),
+                'timeout': Field(float, default=10, minimum=0.1),
+                'max_retries': Field(int, default=5, minimum=0),
+                'spool_path': Field(str, default='data/loki-spool'),
+                'spool_max_size': Field('size', default=100 * 1024 ** 2)
+            }
+        },
+        'watch': {
+            'enabled': Field(bool, default=False),
+            'channel_id': Field(int),
+            'throttle': Field(float, default=300, minimum=0),
+            'targets_file': Field('path'),
+            'rules': Field('mapping_list', default=[])
+        },
+        'perf': {
+            'enabled': Field(bool, default=True),
+            'window': Field(float, default=21600, minimum=60),
+            'slots': Field(int, default=24, minimum=2),
+            'relative_accuracy': Field(float, default=0.01, minimum=0.001),
+            'max_bins': Field(int, default=512, minimum=16),
+            'digest_interval': Field(float, default=21600, minimum=0),
+            'top_guilds': Field(int, default=5, minimum=1)
+        },
+        'probes': {
+            'enabled': Field(bool, default=False),
+            'targets_file': Field('path'),
+            'interval': Field(float, default=30, minimum=1),
+            'timeout': Field(float, default=5, minimum=0.1),
+            'jitter': Field(float, default=0.1, minimum=0),
+            'concurrency': Field(int, default=64, minimum=1),
+            'per_host': Field(int, default=4, minimum=1),
+            'http': {
+                'paths': Field('str_map', default={}),
+                'verify_tls': Field(bool, default=True)
+            },
+            'dns': {
+                'names': Field('str_list', default=[])
+            }
+        },
+        'alerts': {
+            'enabled': Field(bool, default=False),
+            'webhook_url': Field(str),
+            'mention_role': Field(str),
+            'channel_id': Field(int),
+            'category_channels': Field('int_map', default={}),
+            'resolved_retention': Field(float, default=3600, minimum=0),
+            'group_ttl': Field(float, default=14400, minimum=60),
+            'receiver': {
+                'enabled': Field(bool, default=False),
+                'host': Field(str, default='127.0.0.1'),
+                'port': Field(int, default=8081, minimum=1),
+                'path': Field(str, default='/alerts'),
+                'token': Field(str),
+                'token_file': Field(str)
+            }
+        }
+    },
+    'prometheus': {
+        'enabled': Field(bool, default=True),
+        'port': Field(int, default=8000, minimum=1),
+        'metrics_path': Field(str, default='/metrics'),
+        'snapshot_ttl': Field(float, default=5, minimum=0),
+        'render_cache_ttl': Field(float, default=1, minimum=0),
+        'max_loop_lag': Field(float, default=1, minimum=0.01),
+        'url': Field(str),
+        'query_timeout': Field(float, default=10, minimum=0.1),
+        'query_cache_ttl': Field(float, default=10, minimum=0)
+    },
+    'alertmanager': {
+        'url': Field(str)
+    },
+    'graphs': {
+        'default_range': Field(str, default='1h'),
+        'max_range': Field(str, default='7d'),
+        'max_points': Field(int, default=300, minimum=10),
+        'cache_size': Field(int, default=64, minimum=1),
+        'workers': Field(int, default=2, minimum=1)
+    },
+    'logging': {
+        'level': Field(str, default='INFO'),
+        'format': Field(str, default='%(asctime)s - %(name)s - %(levelname)s - %(message)s'),
+        'file': Field(str),
+        'max_size': Field('size', default=10 * 1024 ** 2),
+        'backup_count': Field(int, default=5, minimum=0),
+        'json': Field(bool, default=False),
+        'queue_size': Field(int, default=10000, minimum=1)
+    },
+    'commands': {
+        'extensions': {
+            'monitoring': Field(bool, default=True),
+            'admin': Field(bool, default=True),
+            'logs': Field(bool, default=True)
+        },
+        'monitoring': Field('mapping_list', default=[]),
+        'admin': Field('mapping_list', default=[])
+    },
+    'security': {
+        'admin_roles': Field('str_list', default=[]),
+        'rate_limit': {
+            'enabled': Field(bool, default=False),
+            'max_commands': Field(int, default=10, minimum=1),
+            'time_window': Field(float, default=60, minimum=1)
+        },
+        'cooldowns': Field('int_map', default={})
+    },
+    'config_reload': {
+        'enabled': Field(bool, default=True),
+        'interval': Field(float, default=5, minimum=0.5)
+    }
+}
+
+
+def validate(config, schema=SCHEMA, path='', errors=None):
+    """
+    Coerce ``config`` against ``schema`` in place, filling defaults.
+    Keys the schema doesn't mention are passed through untouched.
+    """
+    top_level = errors is None
+    if top_level:
+        errors = []
+    if config is None:
+        config = {}
+    if not isinstance(config, dict):
+        errors.append(f"{path or 'config'} must be a mapping")
+        config = {}
+
+    for key, rule in schema.items():
+        key_path = f"{path}.{key}" if path else key
+        if isinstance(rule, dict):
+            config[key] = validate(config.get(key), rule, key_path, errors)
+        else:
+            config[key] = rule.validate(config.get(key), key_path, errors)
+
+    if top_level and errors:
+        raise ConfigError("Invalid configuration:\n  " + "\n  ".join(errors))
+    return config
+
+
+def resolve_paths(config, base, schema=SCHEMA):
+    """Make relative 'path' fields relative to ``base`` instead of the working directory"""
+    for key, rule in schema.items():
+        value = config.get(key)
+        if isinstance(rule, dict):
+            if isinstance(value, dict):
+                resolve_paths(value, base, rule)
+        elif rule.kind == 'path' and value and not os.path.isabs(value):
+            config[key] = os.path.normpath(os.path.join(base, value))
+    return config
+
+
+def load_config(config_path, environ=None):
+    """Read, interpolate and validate a config file; 'path' fields are relative to its directory"""
+    try:
+        with open(config_path, 'r') as file:
+            raw = yaml.safe_load(file)
+    except (OSError, yaml.YAMLError) as e:
+        raise ConfigError(f"Failed to read {config_path}: {e}") from e
+    config = validate(interpolate(raw, environ))
+    return resolve_paths(config, os.path.dirname(os.path.abspath(config_path)))
+
+
+class ConfigWatcher:
+    """Polls the config file's mtime and reloads it when it changes"""
+
+    def __init__(self, config_path, on_change, interval=5):
+        self.config_path = config_path
+        self.on_change = on_change
+        self.interval = interval
+        self._stamp = self._stat()
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.config_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    async def check(self):
+        """Reload if the file changed; returns the new config or None"""
+        stamp = self._stat()
+        if stamp is None or stamp == self._stamp:
+            return None
+        self._stamp = stamp
+        try:
+            config = load_config(self.config_path)
+        except ConfigError as e:
+            logger.error(f"Keeping current config, reload failed: {e}")
+            return None
+        result = self.on_change(config)
+        if asyncio.iscoroutine(result):
+            await result
+        return config
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.check()
+            except Exception as e:
+                logger.error(f"Config watcher error: {e}")
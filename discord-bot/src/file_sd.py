@@ -0,0 +1,59 @@
+"""
+File SD
+Reads Prometheus file_sd targets files (e.g. targets/vice-network.yml)
+into host:port targets with their group labels. Shared by the prober
+and watch rules, and deliberately free of metrics.
+"""
+
+import logging
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+
+class Target:
+    """One host:port from the targets file with its group labels"""
+    __slots__ = ('host', 'port', 'labels')
+
+    def __init__(self, host, port, labels):
+        self.host = host
+        self.port = port
+        self.labels = labels
+
+    @property
+    def instance(self):
+        return f"{self.host}:{self.port}"
+
+    @property
+    def names(self):
+        """Ways to refer to this target in !probe"""
+        names = {self.host, self.instance}
+        if self.labels.get('hostname'):
+            names.add(self.labels['hostname'].lower())
+        return names
+
+
+def load_targets(path):
+    """
+    Read a file_sd targets file. A host:port listed in several groups is
+    probed once, keeping the first group's job and any hostname label.
+    """
+    with open(path, 'r') as file:
+        groups = yaml.safe_load(file) or []
+    targets = {}
+    for group in groups:
+        labels = {key: str(value) for key, value in (group.get('labels') or {}).items()}
+        for address in group.get('targets') or ():
+            host, _, port = str(address).rpartition(':')
+            if not host or not port.isdigit():
+                logger.warning(f"Skipping target without a port: {address}")
+                continue
+            key = (host, int(port))
+            if key in targets:
+                existing = targets[key].labels
+                if 'hostname' not in existing and 'hostname' in labels:
+                    existing['hostname'] = labels['hostname']
+                continue
+            targets[key] = Target(host, int(port), dict(labels))
+    return list(targets.values())
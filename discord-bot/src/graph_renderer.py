@@ -0,0 +1,155 @@
+"""
+Graph Renderer
+Fetches query_range series, downsamples them with NumPy and renders PNG
+charts in a worker pool. Rendered images are kept in an LRU cache keyed
+by (query, range, step-aligned end time).
+"""
+
+import asyncio
+import io
+import logging
+import math
+import multiprocessing
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+from query_client import format_series
+
+logger = logging.getLogger(__name__)
+
+# Prometheus refuses range queries returning more than 11,000 points per series
+MAX_QUERY_POINTS = 11000
+
+
+def downsample_minmax(timestamps, values, max_points):
+    """
+    Reduce a series to at most ``max_points`` samples by keeping the
+    minimum and maximum of each bucket, so spikes survive downsampling
+    """
+    n = len(values)
+    if n <= max_points:
+        return timestamps, values
+
+    size = math.ceil(n / (max_points // 2))
+    buckets = math.ceil(n / size)
+    pad = buckets * size - n
+
+    # NaN gaps must never win a bucket
+    nan = np.isnan(values)
+    lows = np.pad(np.where(nan, np.inf, values), (0, pad), constant_values=np.inf).reshape(buckets, size)
+    highs = np.pad(np.where(nan, -np.inf, values), (0, pad), constant_values=-np.inf).reshape(buckets, size)
+
+    offsets = np.arange(buckets) * size
+    picks = np.concatenate((offsets + lows.argmin(axis=1), offsets + highs.argmax(axis=1)))
+    picks = np.unique(np.minimum(picks, n - 1))
+    return timestamps[picks], values[picks]
+
+
+def render_png(title, series, width=8.0, height=3.5, dpi=100):
+    """Render [(label, timestamps, values), ...] to PNG bytes"""
+    # Imported here so worker processes pay for matplotlib, not the bot
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.dates import AutoDateLocator, ConciseDateFormatter
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=(width, height), dpi=dpi)
+    FigureCanvasAgg(figure)
+    axes = figure.add_subplot(1, 1, 1)
+
+    for label, timestamps, values in series:
+        dates = timestamps.astype('datetime64[s]')
+        axes.plot(dates, values, linewidth=1.2, label=label)
+
+    locator = AutoDateLocator()
+    axes.xaxis.set_major_locator(locator)
+    axes.xaxis.set_major_formatter(ConciseDateFormatter(locator))
+    axes.set_title(title, fontsize=10)
+    axes.grid(True, alpha=0.3)
+    if 1 < len(series) <= 8:
+        axes.legend(fontsize=7, loc='upper left')
+    figure.tight_layout()
+
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format='png')
+    return buffer.getvalue()
+
+
+class GraphRenderer:
+    """Renders and caches PNG charts for PromQL range queries"""
+
+    def __init__(self, prometheus, max_points=300, max_series=10, cache_size=64,
+                 workers=2, use_processes=True, min_step=15):
+        self.prometheus = prometheus
+        self.max_points = max_points
+        self.max_series = max_series
+        self.cache_size = cache_size
+        self.min_step = min_step
+        self.renders = 0
+
+        if use_processes:
+            # Spawn, not fork: the bot already runs threads (log listener,
+            # log store, resolver) whose held locks a forked child would inherit
+            self._executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='graph')
+        # key -> Task; a pending task doubles as the coalescing point for duplicate requests
+        self._cache = OrderedDict()
+
+    def step_for(self, range_seconds):
+        """Query resolution for a range, kept under Prometheus' point limit"""
+        return max(self.min_step, math.ceil(range_seconds / MAX_QUERY_POINTS))
+
+    async def render(self, query, range_seconds, end=None):
+        """Return PNG bytes for ``query`` over the last ``range_seconds``"""
+        step = self.step_for(range_seconds)
+        if end is None:
+            end = time.time()
+        end = int(end // step) * step
+        key = (query, range_seconds, end)
+
+        task = self._cache.get(key)
+        if task is not None:
+            self._cache.move_to_end(key)
+        else:
+            task = asyncio.ensure_future(self._render(query, range_seconds, end, step))
+            self._cache[key] = task
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+        try:
+            return await asyncio.shield(task)
+        except Exception:
+            # Don't cache failures
+            if self._cache.get(key) is task:
+                del self._cache[key]
+            raise
+
+    async def _render(self, query, range_seconds, end, step):
+        data = await self.prometheus.query_range(query, end - range_seconds, end, step)
+        result = data.get('result', [])
+        if not result:
+            raise ValueError("Query returned no data")
+
+        series = []
+        for item in result[:self.max_series]:
+            samples = np.asarray(item['values'], dtype=np.float64)
+            timestamps, values = downsample_minmax(samples[:, 0], samples[:, 1], self.max_points)
+            series.append((format_series(item['metric']), timestamps, values))
+
+        start = datetime.fromtimestamp(end - range_seconds).strftime('%Y-%m-%d %H:%M')
+        finish = datetime.fromtimestamp(end).strftime('%Y-%m-%d %H:%M')
+        title = f"{query}\n{start} → {finish}"
+        loop = asyncio.get_running_loop()
+        png = await loop.run_in_executor(self._executor, render_png, title, series)
+        self.renders += 1
+        return png
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,97 @@
+"""
+Guild Stats
+Guild, member and channel counts maintained incrementally from gateway
+events, with a periodic reconciliation against the client cache
+"""
+
+
+class GuildCounts:
+    """Member and channel counts for one guild"""
+    __slots__ = ('guild_id', 'name', 'members', 'channels')
+
+    def __init__(self, guild_id, name, members=0, channels=0):
+        self.guild_id = guild_id
+        self.name = name
+        self.members = members
+        self.channels = channels
+
+
+class GuildStats:
+    """Running totals across all guilds the bot is in"""
+
+    def __init__(self):
+        self.guilds = {}
+        self.members = 0
+        self.channels = 0
+
+    def __len__(self):
+        return len(self.guilds)
+
+    def add_guild(self, guild):
+        """Start tracking a guild, replacing any previous counts for it"""
+        self.remove_guild(guild)
+        counts = GuildCounts(
+            guild.id,
+            guild.name,
+            members=guild.member_count or 0,
+            channels=len(guild.channels)
+        )
+        self.guilds[guild.id] = counts
+        self.members += counts.members
+        self.channels += counts.channels
+        return counts
+
+    def remove_guild(self, guild):
+        if guild.id not in self.guilds:
+            return None
+        return self._drop(guild.id)
+
+    def rename_guild(self, guild):
+        counts = self.guilds.get(guild.id)
+        if counts is not None:
+            counts.name = guild.name
+        return counts
+
+    def _adjust(self, guild, members=0, channels=0):
+        counts = self.guilds.get(guild.id)
+        if counts is None:
+            return self.add_guild(guild)
+        counts.members += members
+        counts.channels += channels
+        self.members += members
+        self.channels += channels
+        return counts
+
+    def member_joined(self, guild):
+        return self._adjust(guild, members=1)
+
+    def member_left(self, guild):
+        return self._adjust(guild, members=-1)
+
+    def channel_created(self, guild):
+        return self._adjust(guild, channels=1)
+
+    def channel_deleted(self, guild):
+        return self._adjust(guild, channels=-1)
+
+    def reconcile(self, guilds):
+        """
+        Rebuild counts from the client cache to correct any drift from
+        missed events; returns the counts of guilds that were dropped
+        """
+        seen = set()
+        for guild in guilds:
+            seen.add(guild.id)
+            self.add_guild(guild)
+        dropped = [guild_id for guild_id in self.guilds if guild_id not in seen]
+        return [self._drop(guild_id) for guild_id in dropped]
+
+    def _drop(self, guild_id):
+        counts = self.guilds.pop(guild_id)
+        self.members -= counts.members
+        self.channels -= counts.channels
+        return counts
+
+    def busiest(self, count=5):
+        """Guilds with the most members"""
+        return sorted(self.guilds.values(), key=lambda c: c.members, reverse=True)[:count]
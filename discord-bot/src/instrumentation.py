@@ -0,0 +1,123 @@
+"""
+Instrumentation
+Per-command latency and outcome via the bot's before/after_invoke hooks,
+plus timing of every Discord REST call the bot makes. API time is also
+attributed to the command that caused it. Also home to the error counter
+shared by the bot and its cogs.
+"""
+
+import contextvars
+import logging
+import time
+
+import discord
+from prometheus_client import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+COMMAND_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+API_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+ERRORS_TOTAL = Counter('discord_errors_total', 'Total errors', ['type'])
+COMMANDS_EXECUTED = Counter('discord_commands_executed_total', 'Total commands executed', ['command', 'outcome'])
+COMMANDS_REJECTED = Counter('discord_commands_rejected_total', 'Commands stopped by a check before running', ['command', 'reason'])
+RESPONSE_TIME = Histogram('discord_response_time_seconds', 'Command response time in seconds', ['command'], buckets=COMMAND_BUCKETS)
+COMMAND_API_TIME = Histogram('discord_command_api_seconds', 'Time a command spent waiting on the Discord API', ['command'], buckets=API_BUCKETS)
+API_REQUEST_TIME = Histogram('discord_api_request_duration_seconds', 'Discord REST API request latency', ['method', 'route'], buckets=API_BUCKETS)
+API_ERRORS = Counter('discord_api_errors_total', 'Discord REST API requests that raised', ['status'])
+API_RATE_LIMITS = Counter('discord_api_rate_limit_hits_total', 'Discord REST API 429 responses', ['scope'])
+
+# API seconds accumulated by the command running in the current task
+_api_time = contextvars.ContextVar('discord_api_time', default=None)
+
+
+def mark_failed(ctx):
+    """Count a command that handled its own error as a failure"""
+    ctx.command_failed = True
+
+
+class _APITimer:
+    __slots__ = ('seconds',)
+
+    def __init__(self):
+        self.seconds = 0.0
+
+
+class RateLimitCounter(logging.Handler):
+    """
+    Counts 429s reported by discord.http; the library retries them
+    internally, so its log records are the only place they surface
+    """
+
+    def __init__(self):
+        super().__init__(logging.WARNING)
+
+    def emit(self, record):
+        message = str(record.msg)
+        if message.startswith('We are being rate limited'):
+            API_RATE_LIMITS.labels(scope='route').inc()
+        elif message.startswith('Global rate limit'):
+            API_RATE_LIMITS.labels(scope='global').inc()
+
+
+class Instrumentation:
+    """Installs command hooks and the REST timing wrapper on a bot"""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.rate_limit_counter = RateLimitCounter()
+
+    def install(self):
+        self.bot.before_invoke(self.before_invoke)
+        self.bot.after_invoke(self.after_invoke)
+        self.instrument_http(self.bot.http)
+        logging.getLogger('discord.http').addHandler(self.rate_limit_counter)
+
+    def uninstall(self):
+        logging.getLogger('discord.http').removeHandler(self.rate_limit_counter)
+
+    @staticmethod
+    def instrument_http(http):
+        """Wrap HTTPClient.request so every REST call is timed per route template"""
+        request = http.request
+
+        async def timed_request(route, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await request(route, **kwargs)
+            except discord.HTTPException as e:
+                API_ERRORS.labels(status=str(e.status)).inc()
+                raise
+            finally:
+                elapsed = time.perf_counter() - start
+                API_REQUEST_TIME.labels(method=route.method, route=route.path).observe(elapsed)
+                timer = _api_time.get()
+                if timer is not None:
+                    timer.seconds += elapsed
+
+        http.request = timed_request
+
+    async def before_invoke(self, ctx):
+        ctx.invoked_at = time.perf_counter()
+        ctx.api_timer = _APITimer()
+        _api_time.set(ctx.api_timer)
+
+    async def after_invoke(self, ctx):
+        # discord.py runs after_invoke hooks even when the command raised
+        started = getattr(ctx, 'invoked_at', None)
+        if started is None:
+            return
+        command = ctx.command.qualified_name
+        outcome = 'failure' if ctx.command_failed else 'success'
+        elapsed = time.perf_counter() - started
+        RESPONSE_TIME.labels(command=command).observe(elapsed)
+        if self.bot.perf is not None:
+            self.bot.perf.observe_command(command, elapsed, failed=ctx.command_failed)
+        COMMAND_API_TIME.labels(command=command).observe(ctx.api_timer.seconds)
+        COMMANDS_EXECUTED.labels(command=command, outcome=outcome).inc()
+        _api_time.set(None)
+
+    def rejected(self, ctx, reason):
+        """Record a command that a check stopped before it ran"""
+        if ctx.command is not None:
+            COMMANDS_REJECTED.labels(command=ctx.command.qualified_name, reason=reason).inc()
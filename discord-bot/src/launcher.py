@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Vice Infrastructure Discord Bot Launcher
+Runs the bot as one process, or as several shard-group processes whose
+metrics are merged through prometheus_client multiprocess mode and
+served from a single exporter
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import shutil
+import signal
+import sys
+import time
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('launcher')
+
+GATEWAY_BOT_URL = 'https://discord.com/api/v10/gateway/bot'
+
+
+async def recommended_shard_count(token):
+    """Ask Discord how many shards this bot should run"""
+    import aiohttp
+
+    headers = {'Authorization': f'Bot {token}'}
+    async with aiohttp.ClientSession() as session:
+        async with session.get(GATEWAY_BOT_URL, headers=headers) as response:
+            response.raise_for_status()
+            return (await response.json())['shards']
+
+
+def shard_groups(shard_count, processes):
+    """Split shard ids 0..shard_count-1 into ``processes`` contiguous groups"""
+    processes = max(1, min(processes, shard_count))
+    size, extra = divmod(shard_count, processes)
+    groups = []
+    start = 0
+    for index in range(processes):
+        end = start + size + (1 if index < extra else 0)
+        groups.append(list(range(start, end)))
+        start = end
+    return groups
+
+
+def run_shard_group(config_path, shard_ids, shard_count):
+    """Entry point of a child process"""
+    import bot
+
+    asyncio.run(bot.main(config_path, shard_ids=shard_ids, shard_count=shard_count))
+
+
+async def serve_multiprocess_metrics(prometheus_config, processes):
+    """Expose the merged metrics of every shard process on one port"""
+    from prometheus_client import CollectorRegistry
+    from prometheus_client import multiprocess
+
+    from exporter import MetricsExporter
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+
+    def ready_check():
+        alive = {index: process.is_alive() for index, process in processes.items()}
+        return all(alive.values()) and bool(alive), {'shard_groups': alive}
+
+    exporter = MetricsExporter(
+        registry,
+        render_ttl=prometheus_config['render_cache_ttl'],
+        metrics_path=prometheus_config['metrics_path'],
+        ready_check=ready_check
+    )
+    await exporter.start('0.0.0.0', prometheus_config['port'])
+    return exporter
+
+
+async def supervise(config, config_path, groups, shard_count, restart_delay=10,
+                    max_restart_delay=600, stable_after=300):
+    """
+    Start one process per shard group and restart any that exit, backing
+    off while a group keeps crashing. A group that rejects the config
+    stops them all; returns the exit status for the launcher.
+    """
+    from prometheus_client import multiprocess
+
+    from config_loader import EXIT_CONFIG_ERROR
+
+    context = multiprocessing.get_context('spawn')
+    processes = {}
+    started_at = {}
+    crashes = {}
+    restart_at = {}
+    stopping = asyncio.Event()
+    status = 0
+
+    def start(index):
+        process = context.Process(
+            target=run_shard_group,
+            args=(config_path, groups[index], shard_count),
+            name=f'shard-group-{index}'
+        )
+        process.start()
+        processes[index] = process
+        started_at[index] = time.monotonic()
+        logger.info(f"Started shard group {index} (shards {groups[index]}) as pid {process.pid}")
+
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGTERM, stopping.set)
+    loop.add_signal_handler(signal.SIGINT, stopping.set)
+
+    exporter = None
+    if config['prometheus']['enabled']:
+        exporter = await serve_multiprocess_metrics(config['prometheus'], processes)
+
+    for index in range(len(groups)):
+        start(index)
+
+    while not stopping.is_set():
+        try:
+            await asyncio.wait_for(stopping.wait(), timeout=1)
+        except asyncio.TimeoutError:
+            pass
+        now = time.monotonic()
+        for index, process in list(processes.items()):
+            if process.is_alive() or stopping.is_set():
+                continue
+            if index not in restart_at:
+                multiprocess.mark_process_dead(process.pid)
+                if process.exitcode == EXIT_CONFIG_ERROR:
+                    # Restarting can't help until the config is fixed
+                    logger.error(f"Shard group {index} rejected the config, stopping")
+                    status = EXIT_CONFIG_ERROR
+                    stopping.set()
+                    break
+                crashes[index] = 0 if now - started_at[index] >= stable_after else crashes.get(index, 0) + 1
+                delay = min(restart_delay * 2 ** crashes[index], max_restart_delay)
+                logger.error(f"Shard group {index} exited with code {process.exitcode}, restarting in {delay}s")
+                restart_at[index] = now + delay
+            elif now >= restart_at[index]:
+                del restart_at[index]
+                start(index)
+
+    logger.info("Stopping shard groups")
+    for process in processes.values():
+        process.terminate()
+    for process in processes.values():
+        await loop.run_in_executor(None, process.join, 30)
+        multiprocess.mark_process_dead(process.pid)
+    if exporter:
+        await exporter.stop()
+    return status
+
+
+def main(config_path='config.yml'):
+    from config_loader import EXIT_CONFIG_ERROR, ConfigError, load_config
+
+    try:
+        config = load_config(config_path)
+    except ConfigError as e:
+        logger.error(str(e))
+        sys.exit(EXIT_CONFIG_ERROR)
+    sharding = config['discord']['sharding']
+    processes = sharding['processes']
+    if processes > 1 and not sharding['enabled']:
+        logger.warning("discord.sharding.processes is ignored while sharding is disabled; running one process")
+        processes = 1
+
+    if processes <= 1:
+        import bot
+
+        asyncio.run(bot.main(config_path))
+        return
+
+    shard_count = sharding['shard_count']
+    if not shard_count:
+        shard_count = asyncio.run(recommended_shard_count(config['discord']['token']))
+    groups = shard_groups(shard_count, processes)
+    logger.info(f"Running {shard_count} shards across {len(groups)} processes")
+
+    # Must be set before any process imports prometheus_client
+    multiproc_dir = sharding['metrics_dir']
+    shutil.rmtree(multiproc_dir, ignore_errors=True)
+    os.makedirs(multiproc_dir)
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = multiproc_dir
+
+    sys.exit(asyncio.run(supervise(config, config_path, groups, shard_count)))
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
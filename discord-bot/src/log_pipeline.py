@@ -0,0 +1,147 @@
+"""
+Log Pipeline
+Moves log I/O off the event loop: loggers only put records on a bounded
+queue (QueueHandler) and a QueueListener thread writes them to stderr
+and a size-rotated file, as text or JSON lines. When the queue is full
+records are dropped and counted instead of blocking the caller.
+"""
+
+import copy
+import json
+import logging
+import os
+import queue
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from prometheus_client import Counter, Gauge
+
+from config_loader import parse_size
+
+LOG_RECORDS_DROPPED = Counter('discord_log_records_dropped_total', 'Log records dropped because the log queue was full', ['level'])
+LOG_QUEUE_SIZE = Gauge('discord_log_queue_size', 'Log records waiting to be written', multiprocess_mode='livesum')
+
+DEFAULT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_traceback_formatter = logging.Formatter()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'process': record.process,
+            'thread': record.threadName
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that never blocks: records that don't fit are counted and dropped"""
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.labels(level=record.levelname).inc()
+
+    def prepare(self, record):
+        # Like QueueHandler.prepare, but keep the traceback apart from the
+        # message so the JSON formatter can report it as its own field
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = _traceback_formatter.formatException(record.exc_info)
+        record.msg, record.args, record.exc_info = record.message, None, None
+        LOG_QUEUE_SIZE.set(self.queue.qsize())
+        return record
+
+
+class DrainingQueueListener(QueueListener):
+    """QueueListener whose stop() doesn't fail when the queue is full"""
+
+    def enqueue_sentinel(self):
+        # The base class uses put_nowait, which raises queue.Full at
+        # shutdown under load. The listener thread is still draining, so
+        # wait briefly for room, then drop the oldest record to make some
+        while True:
+            try:
+                self.queue.put(self._sentinel, timeout=1)
+                return
+            except queue.Full:
+                try:
+                    record = self.queue.get_nowait()
+                except queue.Empty:
+                    continue
+                self.queue.task_done()
+                LOG_RECORDS_DROPPED.labels(level=record.levelname).inc()
+
+
+_listener = None
+
+
+def setup_logging(logging_config, file_suffix=None):
+    """
+    Route the root logger through a bounded queue to a listener thread.
+    Calling it again replaces the previous pipeline. Returns the listener.
+    """
+    global _listener
+
+    formatter = JsonFormatter() if logging_config.get('json') else logging.Formatter(
+        logging_config.get('format') or DEFAULT_FORMAT
+    )
+    sinks = [logging.StreamHandler()]
+    path = logging_config.get('file')
+    if path:
+        if file_suffix:
+            base, extension = os.path.splitext(path)
+            path = f"{base}.{file_suffix}{extension}"
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        sinks.append(RotatingFileHandler(
+            path,
+            maxBytes=parse_size(logging_config.get('max_size') or 0),
+            backupCount=logging_config.get('backup_count', 5),
+            encoding='utf-8',
+            delay=True
+        ))
+    for sink in sinks:
+        sink.setFormatter(formatter)
+
+    records = queue.Queue(maxsize=logging_config.get('queue_size', 10000))
+    listener = DrainingQueueListener(records, *sinks, respect_handler_level=True)
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    stop_logging()
+    root.addHandler(DroppingQueueHandler(records))
+    set_level(logging_config.get('level', 'INFO'))
+
+    listener.start()
+    _listener = listener
+    return listener
+
+
+def set_level(level):
+    logging.getLogger().setLevel(getattr(logging, str(level).upper(), logging.INFO))
+
+
+def stop_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for sink in _listener.handlers:
+            sink.close()
+        _listener = None
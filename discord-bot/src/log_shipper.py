@@ -0,0 +1,329 @@
+"""
+Log Shipper
+Pushes collected messages to a Loki-compatible /loki/api/v1/push
+endpoint. Entries are batched by size or age, grouped into one stream
+per guild/channel and sent as gzip-compressed JSON. Failed pushes are
+retried with exponential backoff; while the endpoint is down, batches
+are spilled to a size-bounded spool directory and replayed once it
+recovers. The spool is drained before any newer batch is pushed, since
+Loki rejects entries older than what it already has for a stream
+(beyond its out-of-order window).
+"""
+
+import asyncio
+import gzip
+import json
+import logging
+import os
+import random
+import time
+from collections import deque
+
+import aiohttp
+from prometheus_client import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+SHIPPER_ENTRIES = Counter('discord_log_shipper_entries_total', 'Collected messages handled by the log shipper', ['result'])
+SHIPPER_BYTES = Counter('discord_log_shipper_bytes_total', 'Compressed bytes pushed to Loki')
+SHIPPER_PUSHES = Counter('discord_log_shipper_pushes_total', 'Push attempts to Loki', ['outcome'])
+SHIPPER_PUSH_TIME = Histogram('discord_log_shipper_push_seconds', 'Loki push request latency')
+SHIPPER_PENDING = Gauge('discord_log_shipper_pending_entries', 'Entries buffered in memory for the next push', multiprocess_mode='livesum')
+SHIPPER_SPOOL_BYTES = Gauge('discord_log_shipper_spool_bytes', 'Bytes of batches spilled to disk awaiting replay', multiprocess_mode='livesum')
+SHIPPER_LAG = Gauge('discord_log_shipper_lag_seconds', 'Age of the oldest collected message not yet accepted by Loki', multiprocess_mode='livemax')
+
+
+class PushError(Exception):
+    """A push failed; ``retry`` says whether sending it again could succeed"""
+
+    def __init__(self, message, retry=True, out_of_order=False):
+        super().__init__(message)
+        self.retry = retry
+        self.out_of_order = out_of_order
+
+
+# Loki's 400 responses for entries behind what a stream already holds
+OUT_OF_ORDER_MARKERS = ('out of order', 'too far behind')
+
+
+def rejected_result(error):
+    return 'out_of_order' if error.out_of_order else 'rejected'
+
+
+def build_payload(records, static_labels):
+    """Group LogRecords into Loki streams keyed by guild and channel"""
+    streams = {}
+    for record in records:
+        key = (record.guild, record.channel)
+        values = streams.get(key)
+        if values is None:
+            values = streams[key] = []
+        line = json.dumps({'author': record.author, 'content': record.content}, ensure_ascii=False)
+        values.append([str(int(record.timestamp * 1e9)), line])
+    return {
+        'streams': [
+            {'stream': {**static_labels, 'guild': guild, 'channel': channel}, 'values': values}
+            for (guild, channel), values in streams.items()
+        ]
+    }
+
+
+class LokiShipper:
+    """Batches LogRecords and pushes them to Loki without blocking the event loop"""
+
+    def __init__(self, url, labels=None, tenant_id=None, batch_size=500, batch_wait=2.0,
+                 max_pending=10000, timeout=10, max_retries=5, min_backoff=0.5,
+                 max_backoff=30.0, spool_path='data/loki-spool', spool_max_bytes=100 * 1024 ** 2):
+        self.url = url.rstrip('/') + '/loki/api/v1/push'
+        self.labels = labels or {'job': 'discord-bot'}
+        self.tenant_id = tenant_id
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.spool_path = spool_path
+        self.spool_max_bytes = spool_max_bytes
+
+        self._pending = deque()
+        self._wakeup = asyncio.Event()
+        self._session = None
+        self._closed = False
+        self._down_until = 0.0
+        self._failures = 0
+        self._spool = deque()  # (path, size, oldest timestamp), oldest first
+        self._spool_bytes = 0
+        self._spool_seq = 0
+
+        os.makedirs(self.spool_path, exist_ok=True)
+        self._load_spool()
+
+    # -- event loop side -------------------------------------------------
+
+    def append(self, record):
+        """Queue a LogRecord for shipping; never blocks"""
+        self._pending.append(record)
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    def _take_batch(self):
+        count = min(len(self._pending), self.batch_size)
+        return [self._pending.popleft() for _ in range(count)]
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=2, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self._session
+
+    async def _push(self, body):
+        headers = {'Content-Type': 'application/json', 'Content-Encoding': 'gzip'}
+        if self.tenant_id:
+            headers['X-Scope-OrgID'] = self.tenant_id
+        start = time.perf_counter()
+        try:
+            async with self._get_session().post(self.url, data=body, headers=headers) as response:
+                if response.status < 300:
+                    SHIPPER_PUSHES.labels(outcome='success').inc()
+                    SHIPPER_BYTES.inc(len(body))
+                    return
+                text = (await response.text())[:200]
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            SHIPPER_PUSHES.labels(outcome='error').inc()
+            raise PushError(f"push failed: {e!r}")
+        finally:
+            SHIPPER_PUSH_TIME.observe(time.perf_counter() - start)
+
+        SHIPPER_PUSHES.labels(outcome=f"http_{response.status}").inc()
+        # 429 and 5xx are transient; any other 4xx would be rejected again
+        retry = response.status == 429 or response.status >= 500
+        out_of_order = response.status == 400 and any(marker in text.lower() for marker in OUT_OF_ORDER_MARKERS)
+        raise PushError(f"Loki returned HTTP {response.status}: {text}", retry=retry, out_of_order=out_of_order)
+
+    def _backoff(self, attempt):
+        delay = min(self.max_backoff, self.min_backoff * 2 ** attempt)
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _push_with_retries(self, body):
+        """Return True once pushed, False if the endpoint is unavailable; raises PushError if rejected"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self._push(body)
+                self._failures = 0
+                self._down_until = 0.0
+                return True
+            except PushError as e:
+                if not e.retry:
+                    raise
+                if attempt == self.max_retries or self._closed:
+                    logger.warning(f"Loki unavailable after {attempt + 1} attempts: {e}")
+                    break
+                await asyncio.sleep(self._backoff(attempt))
+        self._failures += 1
+        self._down_until = time.monotonic() + self._backoff(self._failures + 2)
+        return False
+
+    async def _run_blocking(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, func, *args)
+
+    async def _ship(self, batch):
+        oldest = batch[0].timestamp
+        body = await self._run_blocking(self._encode, batch, self.labels)
+        # Behind a non-empty spool a live batch waits its turn on disk;
+        # pushing it first would make Loki reject the older spooled entries
+        if not self._spool and time.monotonic() >= self._down_until:
+            try:
+                if await self._push_with_retries(body):
+                    SHIPPER_ENTRIES.labels(result='sent').inc(len(batch))
+                    return True
+            except PushError as e:
+                logger.error(f"Dropping {len(batch)} log entries rejected by Loki: {e}")
+                SHIPPER_ENTRIES.labels(result=rejected_result(e)).inc(len(batch))
+                return True
+        await self._spill(body, oldest, len(batch))
+        SHIPPER_ENTRIES.labels(result='spilled').inc(len(batch))
+        return False
+
+    async def _spill(self, body, oldest, entries):
+        # <oldest ns>-<seq>-<entries>.json.gz sorts oldest first
+        self._spool_seq += 1
+        name = f"{int(oldest * 1e9):020d}-{self._spool_seq:06d}-{entries}.json.gz"
+        path = os.path.join(self.spool_path, name)
+        await self._run_blocking(self._write, path, body)
+        self._spool.append((path, len(body), oldest))
+        self._spool_bytes += len(body)
+
+        # Bounded spool: the oldest batches go first
+        while self._spool_bytes > self.spool_max_bytes and len(self._spool) > 1:
+            dropped, size, _ = self._spool.popleft()
+            self._spool_bytes -= size
+            SHIPPER_ENTRIES.labels(result='dropped').inc(self._entries_in(dropped))
+            await self._run_blocking(self._unlink, dropped)
+            logger.warning(f"Log spool over {self.spool_max_bytes} bytes, dropped {os.path.basename(dropped)}")
+
+    async def _replay_one(self):
+        """Push the oldest spooled batch; returns False if Loki is still down"""
+        path, size, _ = self._spool[0]
+        try:
+            body = await self._run_blocking(self._read, path)
+        except OSError as e:
+            logger.error(f"Discarding unreadable spool file {path}: {e}")
+            body = None
+        if body is not None:
+            try:
+                if not await self._push_with_retries(body):
+                    return False
+                SHIPPER_ENTRIES.labels(result='replayed').inc(self._entries_in(path))
+            except PushError as e:
+                logger.error(f"Discarding spooled batch {path} rejected by Loki: {e}")
+                SHIPPER_ENTRIES.labels(result=rejected_result(e)).inc(self._entries_in(path))
+        if self._spool and self._spool[0][0] == path:
+            self._spool.popleft()
+            self._spool_bytes -= size
+            await self._run_blocking(self._unlink, path)
+        return True
+
+    def _update_metrics(self):
+        SHIPPER_PENDING.set(len(self._pending))
+        SHIPPER_SPOOL_BYTES.set(self._spool_bytes)
+        oldest = [self._pending[0].timestamp] if self._pending else []
+        if self._spool:
+            oldest.append(self._spool[0][2])
+        SHIPPER_LAG.set(time.time() - min(oldest) if oldest else 0)
+
+    async def run(self):
+        """Ship batches until closed"""
+        while not self._closed:
+            if len(self._pending) < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.batch_wait)
+                except asyncio.TimeoutError:
+                    pass
+            self._wakeup.clear()
+
+            try:
+                # Oldest first: spilled batches go out before anything newer
+                while self._spool and time.monotonic() >= self._down_until and len(self._pending) <= self.max_pending:
+                    if not await self._replay_one():
+                        break
+                # Keep memory bounded while Loki is down or the spool drains:
+                # overflow goes to disk behind the spooled batches
+                while len(self._pending) > self.max_pending:
+                    await self._ship(self._take_batch())
+                if self._pending and not self._spool:
+                    await self._ship(self._take_batch())
+            except Exception as e:
+                logger.error(f"Log shipper error: {e}")
+                await asyncio.sleep(self.batch_wait)
+            self._update_metrics()
+
+    async def close(self):
+        """Push or spill whatever is still buffered and release the session"""
+        self._closed = True
+        self._wakeup.set()
+        while self._pending:
+            await self._ship(self._take_batch())
+        self._update_metrics()
+        if self._session is not None:
+            await self._session.close()
+
+    # -- blocking side (default executor) ---------------------------------
+
+    @staticmethod
+    def _encode(batch, labels):
+        payload = build_payload(batch, labels)
+        return gzip.compress(json.dumps(payload, ensure_ascii=False).encode('utf-8'), compresslevel=6)
+
+    @staticmethod
+    def _write(path, body):
+        temp = path + '.tmp'
+        with open(temp, 'wb') as file:
+            file.write(body)
+        os.replace(temp, path)
+
+    def _load_spool(self):
+        """Pick up batches spilled by a previous run"""
+        for name in sorted(os.listdir(self.spool_path)):
+            path = os.path.join(self.spool_path, name)
+            if name.endswith('.tmp'):
+                self._unlink(path)
+                continue
+            if not name.endswith('.json.gz'):
+                continue
+            try:
+                oldest = int(name.split('-', 1)[0]) / 1e9
+                size = os.path.getsize(path)
+            except (ValueError, OSError):
+                continue
+            self._spool.append((path, size, oldest))
+            self._spool_bytes += size
+        if self._spool:
+            logger.info(f"Found {len(self._spool)} spooled log batches to replay")
+
+    @staticmethod
+    def _entries_in(path):
+        try:
+            return int(os.path.basename(path).split('-')[2].split('.')[0])
+        except (IndexError, ValueError):
+            return 0
+
+    @staticmethod
+    def _read(path):
+        with open(path, 'rb') as file:
+            return file.read()
+
+    @staticmethod
+    def _unlink(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
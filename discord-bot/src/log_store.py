@@ -0,0 +1,288 @@
+"""
+Log Store
+Append-only, day-segmented SQLite store for collected messages.
+Writes are batched onto a dedicated thread and segments past the
+retention window are dropped whole. Rows from a failed write are put
+back on the queue, which is capped by dropping the oldest rows.
+"""
+
+import asyncio
+import logging
+import os
+import re
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from prometheus_client import Counter
+
+from message_log import LogRecord
+
+logger = logging.getLogger(__name__)
+
+LOG_STORE_ERRORS = Counter('discord_log_store_errors_total', 'Failed log store flushes and compactions')
+LOG_STORE_DROPPED = Counter('discord_log_store_dropped_total', 'Queued log store records dropped because the queue was full')
+
+SEGMENT_RE = re.compile(r'^messages-(\d{8})\.sqlite3$')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    ts REAL NOT NULL,
+    guild TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    author TEXT NOT NULL,
+    content TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_ts ON messages (ts);
+CREATE INDEX IF NOT EXISTS idx_messages_channel_ts ON messages (channel, ts);
+CREATE INDEX IF NOT EXISTS idx_messages_author_ts ON messages (author, ts);
+"""
+
+
+def _day_of(timestamp):
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime('%Y%m%d')
+
+
+def _day_bounds(day):
+    start = datetime.strptime(day, '%Y%m%d').replace(tzinfo=timezone.utc)
+    return start.timestamp(), (start + timedelta(days=1)).timestamp()
+
+
+class LogStore:
+    """Persistent message store split into one SQLite segment per UTC day"""
+
+    def __init__(self, path, retention_days=7, batch_size=500, flush_interval=2.0, max_pending=50000):
+        self.path = path
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.records_written = 0
+
+        self._pending = []
+        self._wakeup = asyncio.Event()
+        self._closed = False
+        self._run_task = None
+        # Every SQLite call happens on this one thread
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='log-store')
+        self._segments = {}
+
+        os.makedirs(self.path, exist_ok=True)
+
+    # -- event loop side -------------------------------------------------
+
+    def append(self, record):
+        """Queue a LogRecord for the next batch; never blocks"""
+        self._pending.append((
+            record.timestamp,
+            record.guild,
+            record.channel,
+            record.author,
+            record.content
+        ))
+        if len(self._pending) > self.max_pending:
+            self._trim()
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    def _trim(self):
+        # Drop the oldest rows so the newest survive a long SQLite outage
+        excess = len(self._pending) - self.max_pending
+        if excess > 0:
+            del self._pending[:excess]
+            LOG_STORE_DROPPED.inc(excess)
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    async def flush(self):
+        """Write everything queued so far"""
+        if not self._pending:
+            return 0
+        batch, self._pending = self._pending, []
+        try:
+            failed = await self._run(self._write_batch, batch)
+        except Exception:
+            self._requeue(batch)
+            raise
+        self.records_written += len(batch) - len(failed)
+        if failed:
+            self._requeue(failed)
+            raise sqlite3.OperationalError(f"{len(failed)} of {len(batch)} records could not be written")
+        return len(batch)
+
+    def _requeue(self, rows):
+        # Unwritten rows go back ahead of anything queued meanwhile
+        self._pending[:0] = rows
+        self._trim()
+
+    async def query(self, channel=None, author=None, since=None, until=None, limit=10):
+        """Return up to ``limit`` of the newest matching records, oldest first"""
+        if isinstance(since, datetime):
+            since = since.timestamp()
+        if isinstance(until, datetime):
+            until = until.timestamp()
+        return await self._run(self._query, channel, author, since, until, limit)
+
+    async def compact(self):
+        """Drop segments that fall entirely outside the retention window"""
+        return await self._run(self._drop_expired, time.time())
+
+    async def run(self, compact_interval=3600):
+        """Flush batches and compact segments until closed"""
+        self._run_task = asyncio.current_task()
+        last_compact = 0.0
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._closed:
+                break
+
+            try:
+                await self.flush()
+                if time.monotonic() - last_compact >= compact_interval:
+                    dropped = await self.compact()
+                    if dropped:
+                        logger.info(f"Dropped expired log segments: {', '.join(dropped)}")
+                    last_compact = time.monotonic()
+            except Exception as e:
+                logger.error(f"Log store error: {e}")
+                LOG_STORE_ERRORS.inc()
+                await asyncio.sleep(self.flush_interval)
+
+    async def close(self):
+        """Flush remaining records and close all segments"""
+        self._closed = True
+        self._wakeup.set()
+        # Stop run() first so it can't submit work to the executor after
+        # it has been shut down; a write it has already started still runs
+        # to completion on the store thread
+        task = self._run_task
+        if task is not None and task is not asyncio.current_task() and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        try:
+            await self.flush()
+        finally:
+            try:
+                await self._run(self._close_segments)
+            finally:
+                self._executor.shutdown(wait=True)
+
+    # -- store thread side -----------------------------------------------
+
+    def _segment(self, day, create=True):
+        conn = self._segments.get(day)
+        if conn is not None:
+            return conn
+        path = os.path.join(self.path, f'messages-{day}.sqlite3')
+        if not create and not os.path.exists(path):
+            return None
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.executescript(SCHEMA)
+        self._segments[day] = conn
+        return conn
+
+    def _segment_days(self):
+        days = set(self._segments)
+        for name in os.listdir(self.path):
+            match = SEGMENT_RE.match(name)
+            if match:
+                days.add(match.group(1))
+        return sorted(days)
+
+    def _write_batch(self, batch):
+        """Write ``batch`` and return the rows whose segment write failed"""
+        by_day = {}
+        for row in batch:
+            by_day.setdefault(_day_of(row[0]), []).append(row)
+        failed = []
+        for day, rows in by_day.items():
+            try:
+                conn = self._segment(day)
+                with conn:
+                    conn.executemany(
+                        'INSERT INTO messages (ts, guild, channel, author, content) VALUES (?, ?, ?, ?, ?)',
+                        rows
+                    )
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to write {len(rows)} records to segment {day}: {e}")
+                failed.extend(rows)
+        return failed
+
+    def _query(self, channel, author, since, until, limit):
+        clauses = []
+        params = []
+        if channel is not None:
+            clauses.append('channel = ?')
+            params.append(channel)
+        if author is not None:
+            clauses.append('author = ?')
+            params.append(author)
+        if since is not None:
+            clauses.append('ts >= ?')
+            params.append(since)
+        if until is not None:
+            clauses.append('ts <= ?')
+            params.append(until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        sql = f'SELECT rowid, ts, guild, channel, author, content FROM messages {where} ORDER BY ts DESC LIMIT ?'
+
+        results = []
+        # Segment names are the sparse time index: skip days outside the range
+        for day in reversed(self._segment_days()):
+            start, end = _day_bounds(day)
+            if until is not None and start > until:
+                continue
+            if since is not None and end <= since:
+                break
+            conn = self._segment(day, create=False)
+            if conn is None:
+                continue
+            for row in conn.execute(sql, (*params, limit - len(results))):
+                results.append(LogRecord(*row))
+            if len(results) >= limit:
+                break
+
+        results.reverse()
+        return results
+
+    def _drop_expired(self, now):
+        cutoff = now - self.retention_days * 86400
+        dropped = []
+        for day in self._segment_days():
+            if _day_bounds(day)[1] > cutoff:
+                break
+            conn = self._segments.pop(day, None)
+            if conn is not None:
+                conn.close()
+            base = os.path.join(self.path, f'messages-{day}.sqlite3')
+            for suffix in ('', '-wal', '-shm'):
+                try:
+                    os.remove(base + suffix)
+                except FileNotFoundError:
+                    pass
+            dropped.append(day)
+        return dropped
+
+    def _close_segments(self):
+        segments, self._segments = self._segments, {}
+        for day, conn in segments.items():
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to close log segment {day}: {e}")
@@ -0,0 +1,47 @@
+"""
+Loop Monitor
+Measures event-loop lag by timing how late a periodic sleep wakes up,
+counts wakeups delayed past a threshold (something blocked the loop)
+and tracks how many tasks are alive
+"""
+
+import asyncio
+import logging
+import time
+
+from prometheus_client import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+LOOP_LAG = Gauge('discord_event_loop_lag_seconds', 'How late the event loop ran a scheduled wakeup', multiprocess_mode='livemax')
+LOOP_TASKS = Gauge('discord_event_loop_tasks', 'Tasks alive on the event loop', multiprocess_mode='livesum')
+DELAYED_WAKEUPS = Counter('discord_event_loop_delayed_wakeups_total', 'Event-loop wakeups that ran later than the lag threshold')
+
+
+class LoopLagMonitor:
+    """Tracks the latest and worst recent event-loop lag"""
+
+    def __init__(self, interval=0.5, window=60, lag_threshold=0.1):
+        self.interval = interval
+        self.window = window
+        self.lag_threshold = lag_threshold
+        self.delayed_wakeups = 0
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self._max_reset = time.monotonic()
+
+    async def run(self):
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self.lag = max(0.0, now - start - self.interval)
+            if now - self._max_reset > self.window:
+                self.max_lag = 0.0
+                self._max_reset = now
+            self.max_lag = max(self.max_lag, self.lag)
+            if self.lag > self.lag_threshold:
+                self.delayed_wakeups += 1
+                DELAYED_WAKEUPS.inc()
+            LOOP_LAG.set(self.lag)
+            LOOP_TASKS.set(len(asyncio.all_tasks()))
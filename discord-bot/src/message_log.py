@@ -0,0 +1,255 @@
+"""
+Message Log
+Fixed-capacity ring buffer of collected Discord messages with
+per-channel and per-author indexes for non-destructive queries
+"""
+
+import re
+import sys
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+
+
+class LogRecord:
+    """Compact record of a single collected message"""
+    __slots__ = ('seq', 'timestamp', 'guild', 'channel', 'author', 'content')
+
+    def __init__(self, seq, timestamp, guild, channel, author, content):
+        self.seq = seq
+        self.timestamp = timestamp
+        self.guild = guild
+        self.channel = channel
+        self.author = author
+        self.content = content
+
+    @property
+    def time(self):
+        return datetime.fromtimestamp(self.timestamp)
+
+    def to_dict(self):
+        return {
+            'timestamp': self.time.isoformat(),
+            'author': self.author,
+            'content': self.content,
+            'channel': self.channel,
+            'guild': self.guild
+        }
+
+
+class _Index:
+    """Ascending sequence numbers of the records matching one key"""
+    __slots__ = ('seqs', 'head')
+
+    def __init__(self):
+        self.seqs = array('q')
+        self.head = 0
+
+    def append(self, seq):
+        self.seqs.append(seq)
+
+    def prune(self, oldest_seq):
+        """Drop sequence numbers that have been overwritten in the ring"""
+        seqs = self.seqs
+        head = bisect_left(seqs, oldest_seq, lo=self.head)
+        # Compact once the dead prefix outweighs the live entries
+        if head > 64 and head * 2 > len(seqs):
+            del seqs[:head]
+            head = 0
+        self.head = head
+
+    def __len__(self):
+        return len(self.seqs) - self.head
+
+
+class MessageLog:
+    """Ring buffer of LogRecords with channel/author/time lookups"""
+
+    def __init__(self, capacity=1000):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self._slots = [None] * capacity
+        self._timestamps = array('d', bytes(8 * capacity))
+        self._next_seq = 0
+        self._by_channel = {}
+        self._by_author = {}
+
+    def __len__(self):
+        return min(self._next_seq, self.capacity)
+
+    @property
+    def oldest_seq(self):
+        return max(0, self._next_seq - self.capacity)
+
+    @property
+    def oldest_timestamp(self):
+        """Timestamp of the oldest record still held, or None when empty"""
+        if not self._next_seq:
+            return None
+        return self._timestamps[self.oldest_seq % self.capacity]
+
+    def append(self, guild, channel, author, content, timestamp=None):
+        """Store a message, overwriting the oldest record once full"""
+        if timestamp is None:
+            timestamp = time.time()
+        seq = self._next_seq
+        slot = seq % self.capacity
+
+        # Keep timestamps non-decreasing so time lookups can bisect
+        if seq and timestamp < self._timestamps[(seq - 1) % self.capacity]:
+            timestamp = self._timestamps[(seq - 1) % self.capacity]
+
+        evicted = self._slots[slot]
+        record = LogRecord(
+            seq,
+            timestamp,
+            sys.intern(str(guild)),
+            sys.intern(str(channel)),
+            sys.intern(str(author)),
+            content
+        )
+        self._slots[slot] = record
+        self._timestamps[slot] = timestamp
+        self._next_seq = seq + 1
+
+        self._index(self._by_channel, record.channel).append(seq)
+        self._index(self._by_author, record.author).append(seq)
+
+        if evicted is not None:
+            self._evict(self._by_channel, evicted.channel)
+            self._evict(self._by_author, evicted.author)
+
+        return record
+
+    def _index(self, indexes, key):
+        index = indexes.get(key)
+        if index is None:
+            index = indexes[key] = _Index()
+        return index
+
+    def _evict(self, indexes, key):
+        index = indexes.get(key)
+        if index is None:
+            return
+        index.prune(self.oldest_seq)
+        if not index:
+            del indexes[key]
+
+    def _timestamp_of(self, seq):
+        return self._timestamps[seq % self.capacity]
+
+    def _seq_range(self, since, until):
+        """Return the [lo, hi) sequence range covering since..until"""
+        lo, hi = self.oldest_seq, self._next_seq
+        key = self._timestamp_of
+        if since is not None:
+            lo = bisect_left(range(hi), since, lo=lo, key=key)
+        if until is not None:
+            hi = bisect_right(range(hi), until, lo=lo, key=key)
+        return lo, hi
+
+    def _index_range(self, index, since, until):
+        """Return the [lo, hi) slice of an index covering since..until"""
+        seqs = index.seqs
+        lo, hi = index.head, len(seqs)
+        key = self._timestamp_of
+        if since is not None:
+            lo = bisect_left(seqs, since, lo=lo, key=key)
+        if until is not None:
+            hi = bisect_right(seqs, until, lo=lo, key=key)
+        return lo, hi
+
+    def query(self, channel=None, author=None, since=None, until=None, limit=10):
+        """
+        Return up to ``limit`` of the newest matching records, oldest first.
+        ``since``/``until`` are epoch seconds. Records are never consumed.
+        """
+        if limit <= 0:
+            return []
+        if isinstance(since, datetime):
+            since = since.timestamp()
+        if isinstance(until, datetime):
+            until = until.timestamp()
+        if channel is not None:
+            channel = str(channel)
+        if author is not None:
+            author = str(author)
+
+        indexes = []
+        if channel is not None:
+            indexes.append(self._by_channel.get(channel))
+        if author is not None:
+            indexes.append(self._by_author.get(author))
+        if None in indexes:
+            return []
+
+        results = []
+        if not indexes:
+            lo, hi = self._seq_range(since, until)
+            for seq in range(hi - 1, max(lo, hi - limit) - 1, -1):
+                results.append(self._slots[seq % self.capacity])
+        else:
+            # Walk the smallest index and check the remaining filters
+            indexes.sort(key=len)
+            lo, hi = self._index_range(indexes[0], since, until)
+            seqs = indexes[0].seqs
+            for i in range(hi - 1, lo - 1, -1):
+                record = self._slots[seqs[i] % self.capacity]
+                if channel is not None and record.channel != channel:
+                    continue
+                if author is not None and record.author != author:
+                    continue
+                results.append(record)
+                if len(results) >= limit:
+                    break
+
+        results.reverse()
+        return results
+
+    def channels(self):
+        return list(self._by_channel)
+
+    def authors(self):
+        return list(self._by_author)
+
+
+_DURATION_RE = re.compile(r'^(\d+)([smhd])$')
+_DURATION_UNITS = {'s': 'seconds', 'm': 'minutes', 'h': 'hours', 'd': 'days'}
+
+
+def parse_duration(value):
+    """Parse a duration such as "30m" or "7d" into a timedelta"""
+    match = _DURATION_RE.match(value.strip())
+    if not match:
+        raise ValueError(f"Unrecognised duration '{value}' (use e.g. 30s, 15m, 6h, 7d)")
+    amount, unit = match.groups()
+    return timedelta(**{_DURATION_UNITS[unit]: int(amount)})
+
+
+def parse_time(value, now=None):
+    """
+    Parse a relative duration ("30m", "2h"), a wall-clock time ("02:00",
+    today) or an ISO timestamp into a datetime
+    """
+    if value is None:
+        return None
+    if now is None:
+        now = datetime.now()
+    value = value.strip()
+
+    if _DURATION_RE.match(value):
+        return now - parse_duration(value)
+
+    for fmt in ('%H:%M', '%H:%M:%S'):
+        try:
+            parsed = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        return now.replace(hour=parsed.hour, minute=parsed.minute, second=parsed.second, microsecond=0)
+
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Unrecognised time '{value}' (use 30m, 2h, HH:MM or ISO format)")
@@ -0,0 +1,78 @@
+"""
+Metrics Snapshot
+Reads metric values straight from the prometheus_client registry,
+aggregated across label sets and cached for a short TTL
+"""
+
+import os
+import time
+
+from prometheus_client import REGISTRY, CollectorRegistry
+from prometheus_client import multiprocess
+
+
+class Snapshot:
+    """Aggregated sample values captured from the registry at one instant"""
+
+    def __init__(self, timestamp, totals, series):
+        self.timestamp = timestamp
+        self.totals = totals
+        self.series = series
+
+    def value(self, name, default=0.0):
+        """Sum of a sample across all of its label sets"""
+        return self.totals.get(name, default)
+
+    def by_label(self, name, label):
+        """Sum of a sample grouped by one label, largest first"""
+        grouped = {}
+        for labels, value in self.series.get(name, ()):
+            key = labels.get(label, '')
+            grouped[key] = grouped.get(key, 0.0) + value
+        return sorted(grouped.items(), key=lambda item: item[1], reverse=True)
+
+
+def default_registry():
+    """
+    The process registry, or a registry merging every shard process when
+    running under the multiprocess launcher
+    """
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+class MetricsSnapshot:
+    """TTL-cached view over a CollectorRegistry"""
+
+    def __init__(self, registry=None, ttl=5.0):
+        self.registry = registry or default_registry()
+        self.ttl = ttl
+        self._snapshot = None
+        self._expires = 0.0
+
+    def get(self):
+        """Return the cached snapshot, collecting a fresh one once it expires"""
+        now = time.monotonic()
+        if self._snapshot is None or now >= self._expires:
+            self._snapshot = self._collect()
+            self._expires = now + self.ttl
+        return self._snapshot
+
+    def invalidate(self):
+        self._snapshot = None
+
+    def _collect(self):
+        totals = {}
+        series = {}
+        for family in self.registry.collect():
+            for sample in family.samples:
+                # Creation timestamps and cumulative buckets don't sum meaningfully
+                if sample.name.endswith(('_created', '_bucket')):
+                    continue
+                totals[sample.name] = totals.get(sample.name, 0.0) + sample.value
+                if sample.labels:
+                    series.setdefault(sample.name, []).append((sample.labels, sample.value))
+        return Snapshot(time.time(), totals, series)
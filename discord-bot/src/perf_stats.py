@@ -0,0 +1,231 @@
+"""
+Performance Stats
+Streaming latency quantiles per command and per gateway event, kept in
+DDSketches (log-spaced buckets with a fixed relative error) so memory
+stays bounded however many samples arrive. The window is a ring of
+time slots: each slot holds its own sketches and counters, expired slots
+are cleared lazily when reused, and a summary merges the live slots.
+"""
+
+import math
+import time
+from collections import Counter
+
+
+def format_latency(seconds):
+    if math.isnan(seconds):
+        return "n/a"
+    if seconds < 0.01:
+        return f"{seconds * 1000:.1f}ms"
+    return f"{seconds * 1000:.0f}ms" if seconds < 1 else f"{seconds:.2f}s"
+
+
+class DDSketch:
+    """
+    Quantile sketch with ``relative_accuracy`` error on every quantile.
+    At most ``max_bins`` buckets are kept; past that the lowest buckets
+    are collapsed, so only the fastest samples lose accuracy.
+    """
+    __slots__ = ('gamma_log', 'max_bins', 'min_value', 'bins', 'zero_count', 'count', 'sum', 'max')
+
+    def __init__(self, relative_accuracy=0.01, max_bins=512, min_value=1e-6):
+        self.gamma_log = math.log((1 + relative_accuracy) / (1 - relative_accuracy))
+        self.max_bins = max_bins
+        self.min_value = min_value
+        self.bins = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+        if value <= self.min_value:
+            self.zero_count += 1
+            return
+        index = math.ceil(math.log(value) / self.gamma_log)
+        bins = self.bins
+        bins[index] = bins.get(index, 0) + 1
+        if len(bins) > self.max_bins:
+            self._collapse()
+
+    def _collapse(self):
+        keys = sorted(self.bins)
+        excess = len(keys) - self.max_bins
+        lowest = keys[excess]
+        for key in keys[:excess]:
+            self.bins[lowest] += self.bins.pop(key)
+
+    def merge(self, other):
+        """Add another sketch's samples; both must share relative_accuracy"""
+        bins = self.bins
+        for index, count in other.bins.items():
+            bins[index] = bins.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        if other.max > self.max:
+            self.max = other.max
+        if len(bins) > self.max_bins:
+            self._collapse()
+        return self
+
+    def quantile(self, q):
+        if not self.count:
+            return math.nan
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return 0.0
+        seen = self.zero_count
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                # Midpoint of the bucket in log space keeps the error symmetric
+                value = 2 * math.exp(index * self.gamma_log) / (1 + math.exp(self.gamma_log))
+                return min(value, self.max)
+        return self.max
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else math.nan
+
+
+class _Slot:
+    __slots__ = ('epoch', 'started', 'commands', 'events', 'failures', 'messages', 'guilds', 'errors')
+
+    def __init__(self):
+        self.epoch = None
+
+    def reset(self, epoch, errors):
+        self.epoch = epoch
+        self.started = time.time()
+        self.commands = {}
+        self.events = {}
+        self.failures = Counter()
+        self.messages = 0
+        self.guilds = Counter()
+        # ERRORS_TOTAL at the start of the slot, so error counts for the
+        # window are a subtraction rather than a scan
+        self.errors = errors
+
+
+class PerfSummary:
+    """Merged view of the live window"""
+    __slots__ = ('seconds', 'messages', 'commands', 'events', 'failures', 'errors', 'guilds')
+
+    def __init__(self, seconds, messages, commands, events, failures, errors, guilds):
+        self.seconds = seconds
+        self.messages = messages
+        self.commands = commands
+        self.events = events
+        self.failures = failures
+        self.errors = errors
+        self.guilds = guilds
+
+    @property
+    def command_count(self):
+        return sum(sketch.count for sketch in self.commands.values())
+
+    def rate(self, count):
+        return count / self.seconds if self.seconds > 0 else 0.0
+
+
+class PerfTracker:
+    """Windowed per-command and per-event latency sketches plus throughput counters"""
+
+    def __init__(self, window=21600, slots=24, relative_accuracy=0.01, max_bins=512,
+                 max_guilds=200, error_counter=None):
+        self.window = window
+        self.slots = slots
+        self.slot_seconds = window / slots
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.max_guilds = max_guilds
+        self.error_counter = error_counter
+        self.started = time.monotonic()
+        self._slots = [_Slot() for _ in range(slots)]
+        self._current = None
+
+    def _slot(self):
+        epoch = int(time.monotonic() // self.slot_seconds)
+        current = self._current
+        if current is not None and current.epoch == epoch:
+            return current
+        current = self._slots[epoch % len(self._slots)]
+        if current.epoch != epoch:
+            current.reset(epoch, self._error_totals())
+        self._current = current
+        return current
+
+    def _error_totals(self):
+        totals = {}
+        if self.error_counter is None:
+            return totals
+        for metric in self.error_counter.collect():
+            for sample in metric.samples:
+                if sample.name.endswith('_total'):
+                    totals[sample.labels.get('type', '')] = sample.value
+        return totals
+
+    def _sketch(self, sketches, name):
+        sketch = sketches.get(name)
+        if sketch is None:
+            sketch = sketches[name] = DDSketch(self.relative_accuracy, self.max_bins)
+        return sketch
+
+    def observe_command(self, name, seconds, failed=False):
+        slot = self._slot()
+        self._sketch(slot.commands, name).add(seconds)
+        if failed:
+            slot.failures[name] += 1
+
+    def observe_event(self, name, seconds):
+        self._sketch(self._slot().events, name).add(seconds)
+
+    def record_message(self, guild_id, guild_name):
+        slot = self._slot()
+        slot.messages += 1
+        if guild_id is not None:
+            guilds = slot.guilds
+            guilds[(guild_id, guild_name)] += 1
+            # Keep per-slot guild counts bounded; small guilds can't be in the top list anyway
+            if len(guilds) > self.max_guilds * 2:
+                slot.guilds = Counter(dict(guilds.most_common(self.max_guilds)))
+
+    def summary(self, top_guilds=5):
+        """Merge the slots still inside the window"""
+        current = self._slot()
+        live = [
+            slot for slot in self._slots
+            if slot.epoch is not None and current.epoch - slot.epoch < len(self._slots)
+        ]
+        oldest = min(live, key=lambda slot: slot.epoch)
+
+        commands, events = {}, {}
+        failures, guilds = Counter(), Counter()
+        messages = 0
+        for slot in live:
+            for merged, sketches in ((commands, slot.commands), (events, slot.events)):
+                for name, sketch in sketches.items():
+                    self._sketch(merged, name).merge(sketch)
+            failures.update(slot.failures)
+            guilds.update(slot.guilds)
+            messages += slot.messages
+
+        now_errors = self._error_totals()
+        errors = {
+            error_type: total - oldest.errors.get(error_type, 0)
+            for error_type, total in now_errors.items()
+            if total - oldest.errors.get(error_type, 0) > 0
+        }
+        # Rates are over the whole window (or uptime, if shorter), including quiet slots
+        now = time.monotonic()
+        window_start = (current.epoch - len(self._slots) + 1) * self.slot_seconds
+        seconds = now - max(self.started, window_start)
+        return PerfSummary(
+            seconds, messages, commands, events, failures, errors,
+            guilds.most_common(top_guilds)
+        )
@@ -0,0 +1,308 @@
+"""
+Network Prober
+Checks the hosts in a Prometheus file_sd targets file directly, in the
+style of blackbox_exporter: a TCP connect probe for every target, an
+HTTP probe for ports with a configured path and DNS lookups for
+configured names. Each check runs on its own jittered schedule so
+probes of one host don't line up, bounded by a global and a per-host semaphore, and HTTP probes
+reuse pooled keep-alive connections.
+"""
+
+import asyncio
+import heapq
+import logging
+import random
+import socket
+import ssl
+import time
+
+import aiohttp
+import yaml
+from prometheus_client import Counter, Gauge, Histogram
+
+from file_sd import Target, load_targets
+
+logger = logging.getLogger(__name__)
+
+# Not instance/job: those would clash with the labels of the bot's own scrape
+PROBE_LABELS = ['target', 'module', 'target_job']
+
+PROBE_SUCCESS = Gauge('discord_probe_success', 'Whether the last probe succeeded', PROBE_LABELS, multiprocess_mode='livemax')
+PROBE_DURATION = Gauge('discord_probe_duration_seconds', 'Duration of the last probe', PROBE_LABELS, multiprocess_mode='livemax')
+PROBE_LATENCY = Histogram(
+    'discord_probe_latency_seconds', 'Probe latency of successful probes', PROBE_LABELS,
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+PROBE_HTTP_STATUS = Gauge('discord_probe_http_status_code', 'HTTP status of the last HTTP probe', ['target', 'target_job'], multiprocess_mode='livemax')
+PROBE_DNS_ADDRESSES = Gauge('discord_probe_dns_answer_addresses', 'Addresses returned by the last DNS probe', ['target'], multiprocess_mode='livemax')
+PROBE_FAILURES = Counter('discord_probe_failures_total', 'Failed probes by reason', ['module', 'reason'])
+PROBE_OVERRUNS = Counter('discord_probe_overruns_total', 'Scheduled probes skipped because the previous run of the same check was still going', ['module'])
+
+
+class Check:
+    """A scheduled probe: one module against one target or DNS name"""
+    __slots__ = ('module', 'instance', 'host', 'port', 'job', 'path', 'scheme', 'running')
+
+    def __init__(self, module, instance, host, port=None, job='', path=None, scheme='http'):
+        self.module = module
+        self.instance = instance
+        self.host = host
+        self.port = port
+        self.job = job
+        self.path = path
+        self.scheme = scheme
+        self.running = False
+
+    @property
+    def key(self):
+        return (self.instance, self.module)
+
+    @property
+    def labels(self):
+        return {'target': self.instance, 'module': self.module, 'target_job': self.job}
+
+
+class ProbeResult:
+    __slots__ = ('check', 'success', 'duration', 'detail')
+
+    def __init__(self, check, success, duration, detail):
+        self.check = check
+        self.success = success
+        self.duration = duration
+        self.detail = detail
+
+
+def _failure_reason(error):
+    if isinstance(error, asyncio.TimeoutError):
+        return 'timeout'
+    if isinstance(error, ConnectionRefusedError):
+        return 'refused'
+    if isinstance(error, socket.gaierror):
+        return 'dns'
+    if isinstance(error, (ssl.SSLError, aiohttp.ClientSSLError)):
+        return 'tls'
+    if isinstance(error, aiohttp.ClientResponseError):
+        return 'http'
+    return 'error'
+
+
+class Prober:
+    """Runs the checks on a jittered schedule and exports their results"""
+
+    def __init__(self, probe_config):
+        self._session = None
+        self._retired_sessions = set()
+        self._checks = {}
+        self._schedule = []
+        self._wakeup = asyncio.Event()
+        self._host_limits = {}
+        self._tasks = set()
+        self._closed = False
+        self.update(probe_config)
+
+    def update(self, probe_config):
+        """(Re)build the check list from config; checks that disappear lose their series"""
+        self.interval = probe_config['interval']
+        self.timeout = probe_config['timeout']
+        self.jitter = min(probe_config['jitter'], 0.9)
+        if self._session is not None and (
+            self.per_host != probe_config['per_host'] or self.verify_tls != probe_config['http']['verify_tls']
+        ):
+            # Both are baked into the connector; the next HTTP probe builds a new one
+            self._retire_session()
+        self.per_host = probe_config['per_host']
+        self.verify_tls = probe_config['http']['verify_tls']
+        self._limit = asyncio.Semaphore(probe_config['concurrency'])
+        self._host_limits = {}
+
+        checks = {}
+        targets = []
+        if probe_config['targets_file']:
+            try:
+                targets = load_targets(probe_config['targets_file'])
+            except (OSError, yaml.YAMLError) as e:
+                logger.error(f"Can't read probe targets from {probe_config['targets_file']}: {e}")
+                targets = [
+                    Target(check.host, check.port, {'job': check.job})
+                    for check in self._checks.values() if check.module == 'tcp'
+                ]
+        self.targets = targets
+
+        paths = probe_config['http']['paths']
+        for target in targets:
+            job = target.labels.get('job', '')
+            check = Check('tcp', target.instance, target.host, target.port, job)
+            checks[check.key] = check
+            path = paths.get(str(target.port))
+            if path:
+                scheme = 'https' if target.port in (443, 8443) else 'http'
+                check = Check('http', target.instance, target.host, target.port, job, path=path, scheme=scheme)
+                checks[check.key] = check
+        for name in probe_config['dns']['names']:
+            check = Check('dns', name, name)
+            checks[check.key] = check
+
+        for key, check in self._checks.items():
+            if key not in checks or checks[key].job != check.job:
+                self._forget(check)
+            else:
+                # Keep the object so a probe in flight clears the right flag
+                check.path, check.scheme = checks[key].path, checks[key].scheme
+                checks[key] = check
+        self._checks = checks
+
+        # Spread first runs over one interval so probes don't start in a burst
+        now = time.monotonic()
+        self._schedule = [(now + random.uniform(0, self.interval), key) for key in checks]
+        heapq.heapify(self._schedule)
+        self._wakeup.set()
+
+    def _forget(self, check):
+        for metric in (PROBE_SUCCESS, PROBE_DURATION, PROBE_LATENCY):
+            try:
+                metric.remove(check.instance, check.module, check.job)
+            except KeyError:
+                pass
+        if check.module == 'http':
+            try:
+                PROBE_HTTP_STATUS.remove(check.instance, check.job)
+            except KeyError:
+                pass
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=0,  # the semaphores below do the limiting
+                    limit_per_host=self.per_host,
+                    keepalive_timeout=max(self.interval * 2, 30),
+                    ssl=self.verify_tls
+                )
+            )
+        return self._session
+
+    def _retire_session(self):
+        session, self._session = self._session, None
+        self._retired_sessions.add(session)
+
+        async def close_later():
+            # Probes already using it finish within one timeout
+            await asyncio.sleep(self.timeout)
+            self._retired_sessions.discard(session)
+            await session.close()
+
+        task = asyncio.ensure_future(close_later())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _host_limit(self, host):
+        limit = self._host_limits.get(host)
+        if limit is None:
+            limit = self._host_limits[host] = asyncio.Semaphore(self.per_host)
+        return limit
+
+    # -- probe modules -------------------------------------------------
+
+    async def _probe_tcp(self, check):
+        _, writer = await asyncio.open_connection(check.host, check.port)
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+        return 'connected'
+
+    async def _probe_http(self, check):
+        url = f"{check.scheme}://{check.host}:{check.port}{check.path}"
+        async with self._get_session().get(url, allow_redirects=False) as response:
+            # Read the body so the connection goes back to the pool
+            await response.read()
+            PROBE_HTTP_STATUS.labels(target=check.instance, target_job=check.job).set(response.status)
+            if not 200 <= response.status < 400:
+                raise aiohttp.ClientResponseError(
+                    response.request_info, (), status=response.status, message=response.reason or ''
+                )
+            return f"HTTP {response.status}"
+
+    async def _probe_dns(self, check):
+        loop = asyncio.get_running_loop()
+        answers = await loop.getaddrinfo(check.host, None, proto=socket.IPPROTO_TCP)
+        addresses = sorted({answer[4][0] for answer in answers})
+        PROBE_DNS_ADDRESSES.labels(target=check.instance).set(len(addresses))
+        return ', '.join(addresses[:4])
+
+    async def probe(self, check):
+        """Run one check now and record the result"""
+        module = getattr(self, f"_probe_{check.module}")
+        async with self._limit, self._host_limit(check.host):
+            start = time.perf_counter()
+            try:
+                detail = await asyncio.wait_for(module(check), timeout=self.timeout)
+                success = True
+            except Exception as e:
+                detail = f"{_failure_reason(e)}: {e}" if str(e) else _failure_reason(e)
+                success = False
+                PROBE_FAILURES.labels(module=check.module, reason=_failure_reason(e)).inc()
+            duration = time.perf_counter() - start
+
+        labels = check.labels
+        PROBE_SUCCESS.labels(**labels).set(1 if success else 0)
+        PROBE_DURATION.labels(**labels).set(duration)
+        if success:
+            PROBE_LATENCY.labels(**labels).observe(duration)
+        return ProbeResult(check, success, duration, detail)
+
+    async def probe_host(self, name):
+        """Probe every check for a monitored host, hostname or host:port now"""
+        name = name.lower()
+        instances = {target.instance for target in self.targets if name in target.names}
+        checks = [
+            check for check in self._checks.values()
+            if check.instance in instances or (check.module == 'dns' and check.host.lower() == name)
+        ]
+        return await asyncio.gather(*(self.probe(check) for check in checks))
+
+    # -- scheduling ----------------------------------------------------
+
+    async def _run_scheduled(self, check):
+        try:
+            await self.probe(check)
+        finally:
+            check.running = False
+
+    async def run(self):
+        """Run checks as they come due until closed"""
+        while not self._closed:
+            now = time.monotonic()
+            while self._schedule and self._schedule[0][0] <= now:
+                _, key = heapq.heappop(self._schedule)
+                check = self._checks.get(key)
+                if check is None:
+                    continue
+                if check.running:
+                    PROBE_OVERRUNS.labels(module=check.module).inc()
+                else:
+                    check.running = True
+                    task = asyncio.create_task(self._run_scheduled(check))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+                # Jitter every run so checks against the same host drift apart
+                delay = self.interval * (1 + random.uniform(-self.jitter, self.jitter))
+                heapq.heappush(self._schedule, (now + delay, key))
+
+            self._wakeup.clear()
+            timeout = self._schedule[0][0] - now if self._schedule else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def close(self):
+        self._closed = True
+        self._wakeup.set()
+        for task in list(self._tasks):
+            task.cancel()
+        for session in (self._session, *self._retired_sessions):
+            if session is not None:
+                await session.close()
+        self._retired_sessions.clear()
@@ -0,0 +1,168 @@
+"""
+Query Client
+Long-lived, pooled clients for the Prometheus and Alertmanager HTTP
+APIs. Identical concurrent requests share one in-flight call and
+results are cached for a short TTL.
+"""
+
+import asyncio
+import functools
+import logging
+import time
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+
+class QueryError(Exception):
+    """Raised when an upstream API call fails or returns an error"""
+
+
+def format_series(metric):
+    """Render a Prometheus label set as name{label="value",...}"""
+    name = metric.get('__name__', '')
+    labels = ','.join(f'{k}="{v}"' for k, v in sorted(metric.items()) if k != '__name__')
+    return f"{name}{{{labels}}}" if labels else (name or '{}')
+
+
+class PooledAPIClient:
+    """Coalescing, TTL-caching GET client over one shared ClientSession"""
+
+    def __init__(self, base_url, cache_ttl=10, timeout=10, max_connections=10, max_cache_entries=256):
+        self.base_url = base_url.rstrip('/')
+        self.cache_ttl = cache_ttl
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.max_cache_entries = max_cache_entries
+        self.requests_sent = 0
+        self.cache_hits = 0
+        self.coalesced = 0
+
+        self._session = None
+        self._cache = {}
+        self._inflight = {}
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.max_connections,
+                    ttl_dns_cache=300,
+                    keepalive_timeout=60
+                ),
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self._session
+
+    async def get(self, path, params=None, ttl=None):
+        """GET ``path`` and return the decoded JSON body"""
+        key = (path, tuple(sorted((params or {}).items())))
+        now = time.monotonic()
+
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] > now:
+            self.cache_hits += 1
+            return cached[1]
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(key, path, params, ttl))
+            self._inflight[key] = task
+            task.add_done_callback(functools.partial(self._settled, key))
+        else:
+            self.coalesced += 1
+
+        # Shield so one cancelled caller doesn't cancel the shared request
+        return await asyncio.shield(task)
+
+    def _settled(self, key, task):
+        self._inflight.pop(key, None)
+        # Retrieve the exception so it isn't reported as never retrieved
+        # when every caller was cancelled before the request finished
+        if not task.cancelled():
+            task.exception()
+
+    async def _fetch(self, key, path, params, ttl):
+        self.requests_sent += 1
+        session = self._get_session()
+        try:
+            async with session.get(f"{self.base_url}{path}", params=params) as response:
+                try:
+                    body = await response.json(content_type=None)
+                except ValueError:
+                    body = None
+                if response.status >= 400 and not isinstance(body, dict):
+                    raise QueryError(f"{path} returned HTTP {response.status}")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise QueryError(f"{path} request failed: {e or type(e).__name__}") from e
+
+        body = self._unwrap(body)
+        self._store(key, body, self.cache_ttl if ttl is None else ttl)
+        return body
+
+    def _unwrap(self, body):
+        return body
+
+    def _store(self, key, value, ttl):
+        if ttl <= 0:
+            return
+        now = time.monotonic()
+        if len(self._cache) >= self.max_cache_entries:
+            self._cache = {k: v for k, v in self._cache.items() if v[0] > now}
+            while len(self._cache) >= self.max_cache_entries:
+                self._cache.pop(next(iter(self._cache)))
+        self._cache[key] = (now + ttl, value)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+
+class PrometheusClient(PooledAPIClient):
+    """Client for the Prometheus HTTP API (/api/v1)"""
+
+    def _unwrap(self, body):
+        if not isinstance(body, dict):
+            raise QueryError("Unexpected response from Prometheus")
+        if body.get('status') != 'success':
+            raise QueryError(f"{body.get('errorType', 'error')}: {body.get('error', 'query failed')}")
+        return body['data']
+
+    async def query(self, promql, time_=None):
+        """Evaluate an instant query"""
+        params = {'query': promql}
+        if time_ is not None:
+            params['time'] = f"{time_:.3f}"
+        return await self.get('/api/v1/query', params)
+
+    async def query_range(self, promql, start, end, step):
+        """Evaluate a range query; ``start``/``end`` are epoch seconds"""
+        params = {
+            'query': promql,
+            'start': f"{start:.3f}",
+            'end': f"{end:.3f}",
+            'step': f"{step}s"
+        }
+        return await self.get('/api/v1/query_range', params)
+
+    async def alerts(self):
+        """Return the alerts currently pending or firing in Prometheus"""
+        data = await self.get('/api/v1/alerts')
+        return data.get('alerts', [])
+
+
+class AlertmanagerClient(PooledAPIClient):
+    """Client for the Alertmanager v2 API"""
+
+    async def alerts(self, active=True, silenced=False, inhibited=False):
+        """Return alerts known to Alertmanager"""
+        params = {
+            'active': str(active).lower(),
+            'silenced': str(silenced).lower(),
+            'inhibited': str(inhibited).lower()
+        }
+        body = await self.get('/api/v2/alerts', params)
+        if not isinstance(body, list):
+            raise QueryError("Unexpected response from Alertmanager")
+        return body
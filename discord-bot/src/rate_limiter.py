@@ -0,0 +1,158 @@
+"""
+Rate Limiter
+Per-user sliding-window command limits and per-user, per-command
+cooldowns with constant-size state per key and idle-key eviction
+"""
+
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class _Window:
+    """Sliding-window-counter state: counts for the current and previous window"""
+    __slots__ = ('index', 'previous', 'current')
+
+    def __init__(self, index):
+        self.index = index
+        self.previous = 0
+        self.current = 0
+
+
+class SlidingWindowLimiter:
+    """Allows ``limit`` hits per ``window`` seconds per key"""
+
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self._windows = {}
+
+    def __len__(self):
+        return len(self._windows)
+
+    def hit(self, key, now=None):
+        """Record a hit; return 0 if allowed, otherwise seconds until retry"""
+        if now is None:
+            now = time.monotonic()
+        index, offset = divmod(now, self.window)
+        index = int(index)
+
+        state = self._windows.get(key)
+        if state is None:
+            state = self._windows[key] = _Window(index)
+        elif state.index != index:
+            state.previous = state.current if state.index == index - 1 else 0
+            state.current = 0
+            state.index = index
+
+        # Weight the previous window by how much of it still overlaps
+        elapsed = offset / self.window
+        if state.previous * (1 - elapsed) + state.current + 1 <= self.limit:
+            state.current += 1
+            return 0.0
+
+        if state.current + 1 > self.limit or not state.previous:
+            return self.window - offset
+        needed = 1 - (self.limit - 1 - state.current) / state.previous
+        return max((needed - elapsed) * self.window, 0.001)
+
+    def evict(self, now=None):
+        """Forget keys with no hits in the last two windows"""
+        if now is None:
+            now = time.monotonic()
+        current = int(now // self.window)
+        stale = [key for key, state in self._windows.items() if state.index < current - 1]
+        for key in stale:
+            del self._windows[key]
+        return len(stale)
+
+
+class CooldownTracker:
+    """Per-key expiry times for command cooldowns"""
+
+    def __init__(self):
+        self._expires = {}
+
+    def __len__(self):
+        return len(self._expires)
+
+    def remaining(self, key, now=None):
+        if now is None:
+            now = time.monotonic()
+        return max(self._expires.get(key, 0.0) - now, 0.0)
+
+    def start(self, key, duration, now=None):
+        if now is None:
+            now = time.monotonic()
+        self._expires[key] = now + duration
+
+    def evict(self, now=None):
+        if now is None:
+            now = time.monotonic()
+        expired = [key for key, expires in self._expires.items() if expires <= now]
+        for key in expired:
+            del self._expires[key]
+        return len(expired)
+
+
+class RateLimiter:
+    """Applies the `security.rate_limit` and `security.cooldowns` config"""
+
+    def __init__(self, security_config):
+        self.window = None
+        self.cooldown_tracker = CooldownTracker()
+        self.update(security_config)
+
+    def update(self, security_config):
+        """Apply new limits, keeping existing state where the window is unchanged"""
+        rate_limit = security_config.get('rate_limit', {})
+        self.enabled = rate_limit.get('enabled', False)
+        limit = rate_limit.get('max_commands', 10)
+        window = rate_limit.get('time_window', 60)
+        if self.window is None or self.window.window != window:
+            self.window = SlidingWindowLimiter(limit, window)
+        else:
+            self.window.limit = limit
+        self.cooldowns = dict(security_config.get('cooldowns') or {})
+
+    def __len__(self):
+        return len(self.window) + len(self.cooldown_tracker)
+
+    def check(self, user_id, command):
+        """
+        Return None if the command may run, otherwise a
+        (scope, retry_after) tuple where scope is "cooldown" or "global"
+        """
+        now = time.monotonic()
+        cooldown = self.cooldowns.get(command)
+        key = (user_id, command)
+        if cooldown:
+            remaining = self.cooldown_tracker.remaining(key, now)
+            if remaining:
+                return 'cooldown', remaining
+
+        if self.enabled:
+            retry_after = self.window.hit(user_id, now)
+            if retry_after:
+                return 'global', retry_after
+
+        if cooldown:
+            self.cooldown_tracker.start(key, cooldown, now)
+        return None
+
+    def evict(self):
+        now = time.monotonic()
+        return self.window.evict(now) + self.cooldown_tracker.evict(now)
+
+    async def run(self, interval=60):
+        """Periodically evict idle keys so memory stays flat"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                evicted = self.evict()
+                if evicted:
+                    logger.debug(f"Evicted {evicted} idle rate limit keys")
+            except Exception as e:
+                logger.error(f"Rate limiter eviction error: {e}")
@@ -0,0 +1,100 @@
+"""
+System Sampler
+Background task that samples host CPU, memory and disk usage into a
+shared snapshot so command handlers never call psutil on the event loop
+"""
+
+import asyncio
+import logging
+import time
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+
+class SystemSnapshot:
+    """Point-in-time view of host resource usage"""
+    __slots__ = (
+        'timestamp', 'cpu_percent', 'per_cpu_percent', 'cpu_count',
+        'memory_percent', 'memory_total', 'memory_used',
+        'disk_percent', 'disk_total', 'disk_used'
+    )
+
+    def __init__(self, timestamp=0.0, cpu_percent=0.0, per_cpu_percent=(), cpu_count=0,
+                 memory_percent=0.0, memory_total=0, memory_used=0,
+                 disk_percent=0.0, disk_total=0, disk_used=0):
+        self.timestamp = timestamp
+        self.cpu_percent = cpu_percent
+        self.per_cpu_percent = per_cpu_percent
+        self.cpu_count = cpu_count
+        self.memory_percent = memory_percent
+        self.memory_total = memory_total
+        self.memory_used = memory_used
+        self.disk_percent = disk_percent
+        self.disk_total = disk_total
+        self.disk_used = disk_used
+
+    @property
+    def age(self):
+        return time.time() - self.timestamp
+
+
+class SystemSampler:
+    """Refreshes a SystemSnapshot every ``interval`` seconds"""
+
+    def __init__(self, interval=5, disk_path='/'):
+        self.interval = interval
+        self.disk_path = disk_path
+        self.snapshot = SystemSnapshot()
+        self._ready = asyncio.Event()
+        # Prime the CPU counters so the first non-blocking read is meaningful
+        psutil.cpu_percent(interval=None, percpu=True)
+
+    def _sample(self):
+        """Collect a snapshot; runs in a worker thread"""
+        per_cpu = tuple(psutil.cpu_percent(interval=None, percpu=True))
+        memory = psutil.virtual_memory()
+        disk = psutil.disk_usage(self.disk_path)
+        return SystemSnapshot(
+            timestamp=time.time(),
+            cpu_percent=round(sum(per_cpu) / len(per_cpu), 1) if per_cpu else 0.0,
+            per_cpu_percent=per_cpu,
+            cpu_count=len(per_cpu),
+            memory_percent=memory.percent,
+            memory_total=memory.total,
+            memory_used=memory.used,
+            disk_percent=disk.percent,
+            disk_total=disk.total,
+            disk_used=disk.used
+        )
+
+    async def refresh(self):
+        """Take a sample off the event loop and publish it"""
+        loop = asyncio.get_running_loop()
+        self.snapshot = await loop.run_in_executor(None, self._sample)
+        self._ready.set()
+        return self.snapshot
+
+    async def get(self, timeout=5):
+        """
+        Return the latest snapshot, waiting up to ``timeout`` seconds for
+        the first one; an empty snapshot (timestamp 0) if none arrived
+        """
+        if not self._ready.is_set():
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.snapshot
+
+    async def run(self):
+        """Sample forever at the configured cadence"""
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"System sampler error: {e}")
+                # Don't leave callers of get() waiting on a sample that failed
+                self._ready.set()
+            await asyncio.sleep(self.interval)
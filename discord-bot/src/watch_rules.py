@@ -0,0 +1,249 @@
+"""
+Watch Rules
+Matches collected messages against configured incident keywords and
+regexes in one pass. Messages are split into tokens once and keywords
+are found by intersecting them with a hash index, so adding keywords
+doesn't add per-message work. Regexes are joined into one alternation
+that screens each message in a single search; only messages it hits
+are searched rule by rule, so overlapping matches of different rules
+all count. Notifications are throttled per rule and channel.
+"""
+
+import logging
+import re
+import string
+import time
+from datetime import datetime
+
+import discord
+import yaml
+from prometheus_client import Counter, Gauge
+
+from file_sd import load_targets
+
+logger = logging.getLogger(__name__)
+
+WATCH_HITS = Counter('discord_watch_rule_hits_total', 'Messages matching a watch rule', ['rule'])
+WATCH_NOTIFICATIONS = Counter('discord_watch_notifications_total', 'Watch rule notifications', ['rule', 'outcome'])
+WATCH_RULES = Gauge('discord_watch_rules', 'Compiled watch rules', multiprocess_mode='livemax')
+
+# Punctuation that separates tokens; '.', '-' and '_' are kept inside
+# them so hostnames and IPs ("vice-bot-one", "172.236.225.9") stay whole
+_SEPARATORS = str.maketrans({char: ' ' for char in string.punctuation + '“”‘’…' if char not in '.-_'})
+
+# Constructs that change meaning or fail inside a joined alternation:
+# inline global flags like (?i), numbered backreferences like \1 (an odd
+# number of backslashes before the digit) and named groups, whose names
+# may collide between rules. Such regexes skip the screening pass.
+_UNJOINABLE_RES = (
+    re.compile(r'\(\?[aiLmsux]+\)'),
+    re.compile(r'(?<!\\)(?:\\\\)*\\[1-9]'),
+    re.compile(r'\(\?P[<=]')
+)
+
+SEVERITY_COLORS = {
+    'critical': discord.Color.red(),
+    'warning': discord.Color.orange()
+}
+
+
+class WatchRule:
+    """One configured rule and its match/notification state"""
+    __slots__ = ('name', 'severity', 'channels', 'throttle', 'hits', 'last_notified', 'suppressed')
+
+    def __init__(self, name, severity='warning', channels=None, throttle=300):
+        self.name = name
+        self.severity = severity
+        self.channels = frozenset(channels or ())
+        self.throttle = throttle
+        self.hits = 0
+        self.last_notified = {}
+        self.suppressed = {}
+
+    def applies_to(self, channel):
+        return not self.channels or channel in self.channels
+
+
+def tokenize(text):
+    """Lower-cased tokens of a message, in order"""
+    return [token.strip('.-') for token in text.lower().translate(_SEPARATORS).split()]
+
+
+def target_hosts(path):
+    """Hosts and hostnames from a Prometheus file_sd targets file, e.g. vice-network.yml"""
+    hosts = []
+    for target in load_targets(path):
+        for host in (target.host, target.labels.get('hostname')):
+            if host and host not in hosts:
+                hosts.append(host)
+    return hosts
+
+
+class WatchRules:
+    """Compiled rule set; ``compile`` swaps in a new one atomically"""
+
+    def __init__(self, watch_config=None):
+        self.rules = {}
+        self._keywords = {}
+        self._phrases = {}
+        self._first_tokens = frozenset()
+        self._regexes = []
+        self._screen = None
+        self._unscreened = []
+        if watch_config:
+            self.compile(watch_config)
+
+    def __len__(self):
+        return len(self.rules)
+
+    def compile(self, watch_config):
+        """
+        Build the index from the ``monitoring.watch`` config. Raises
+        ValueError on an invalid rule and leaves the current set in place.
+        """
+        throttle = watch_config.get('throttle', 300)
+        rule_configs = list(watch_config.get('rules') or [])
+        if watch_config.get('targets_file'):
+            try:
+                hosts = target_hosts(watch_config['targets_file'])
+            except (OSError, yaml.YAMLError) as e:
+                logger.warning(f"Not watching target hosts, can't read {watch_config['targets_file']}: {e}")
+            else:
+                rule_configs.append({'name': 'target-host', 'keywords': hosts, 'severity': 'warning'})
+
+        rules = {}
+        keywords = {}
+        phrases = {}
+        regexes = []
+        unscreened = []
+        for index, config in enumerate(rule_configs):
+            if not isinstance(config, dict) or not config.get('name'):
+                raise ValueError(f"watch rule #{index + 1} needs a name")
+            name = str(config['name'])
+            if name in rules:
+                raise ValueError(f"duplicate watch rule '{name}'")
+            rule = rules[name] = WatchRule(
+                name,
+                severity=config.get('severity', 'warning'),
+                channels=[str(channel).lstrip('#') for channel in config.get('channels') or ()],
+                throttle=config.get('throttle', throttle)
+            )
+            # Keep counters and throttle state for rules that survive a reload
+            previous = self.rules.get(name)
+            if previous is not None:
+                rule.hits = previous.hits
+                rule.last_notified = previous.last_notified
+                rule.suppressed = previous.suppressed
+
+            for keyword in config.get('keywords') or ():
+                tokens = tuple(token for token in tokenize(str(keyword)) if token)
+                if not tokens:
+                    raise ValueError(f"watch rule '{name}' has an empty keyword")
+                if len(tokens) == 1:
+                    keywords.setdefault(tokens[0], []).append(rule)
+                else:
+                    phrases.setdefault(tokens[0], []).append((tokens[1:], rule))
+
+            for pattern in ([config['regex']] if config.get('regex') else []) + list(config.get('regexes') or ()):
+                pattern = str(pattern)
+                try:
+                    compiled = re.compile(pattern, re.IGNORECASE)
+                except re.error as e:
+                    raise ValueError(f"watch rule '{name}': invalid regex {pattern!r}: {e}")
+                if any(unjoinable.search(pattern) for unjoinable in _UNJOINABLE_RES):
+                    unscreened.append((compiled, rule))
+                else:
+                    regexes.append((compiled, rule))
+
+        screen = None
+        if regexes:
+            # Matches iff at least one joined regex matches somewhere
+            try:
+                screen = re.compile('|'.join(f'(?:{regex.pattern})' for regex, _ in regexes), re.IGNORECASE)
+            except re.error as e:
+                logger.warning(f"Can't join watch regexes, searching each one: {e}")
+                regexes, unscreened = [], regexes + unscreened
+
+        self.rules = rules
+        self._keywords = keywords
+        self._phrases = phrases
+        self._first_tokens = frozenset(keywords) | frozenset(phrases)
+        self._regexes = regexes
+        self._screen = screen
+        self._unscreened = unscreened
+        WATCH_RULES.set(len(rules))
+        return self
+
+    def match(self, content, channel=None):
+        """Return {rule: matched text} for every rule the message hits"""
+        hits = {}
+        tokens = tokenize(content)
+        for token in self._first_tokens.intersection(tokens):
+            for rule in self._keywords.get(token, ()):
+                hits.setdefault(rule, token)
+            for rest, rule in self._phrases.get(token, ()):
+                for position, candidate in enumerate(tokens):
+                    if candidate == token and tuple(tokens[position + 1:position + 1 + len(rest)]) == rest:
+                        hits.setdefault(rule, ' '.join((token,) + rest))
+                        break
+        regexes = self._regexes if self._screen is not None and self._screen.search(content) else ()
+        for regex, rule in (*regexes, *self._unscreened):
+            if rule in hits:
+                continue
+            found = regex.search(content)
+            if found:
+                hits[rule] = found.group()
+
+        if channel is not None:
+            hits = {rule: text for rule, text in hits.items() if rule.applies_to(channel)}
+        for rule in hits:
+            rule.hits += 1
+            WATCH_HITS.labels(rule=rule.name).inc()
+        return hits
+
+    def should_notify(self, rule, channel_id, now=None):
+        """Throttle notifications to one per rule and channel per ``rule.throttle`` seconds"""
+        if now is None:
+            now = time.monotonic()
+        last = rule.last_notified.get(channel_id)
+        if last is not None and now - last < rule.throttle:
+            rule.suppressed[channel_id] = rule.suppressed.get(channel_id, 0) + 1
+            WATCH_NOTIFICATIONS.labels(rule=rule.name, outcome='throttled').inc()
+            return False
+        rule.last_notified[channel_id] = now
+        WATCH_NOTIFICATIONS.labels(rule=rule.name, outcome='sent').inc()
+        return True
+
+
+class WatchNotice:
+    """A watch hit in the shape AlertOutbox delivers"""
+    __slots__ = ('key', 'rule', 'matched', 'message_ref', 'suppressed', 'message')
+
+    def __init__(self, rule, matched, message, suppressed=0):
+        self.key = ('watch', rule.name, message.channel.id)
+        self.rule = rule
+        self.matched = matched
+        self.message_ref = message
+        self.suppressed = suppressed
+        self.message = None
+
+    @property
+    def firing(self):
+        # AlertOutbox mentions the alert role only for firing groups
+        return self.rule.severity == 'critical'
+
+    def render(self):
+        message = self.message_ref
+        embed = discord.Embed(
+            title=f"👀 Watch rule: {self.rule.name}"[:256],
+            description=message.content[:1000],
+            color=SEVERITY_COLORS.get(self.rule.severity, discord.Color.gold()),
+            timestamp=datetime.now(),
+            url=message.jump_url
+        )
+        embed.add_field(name="Matched", value=f"`{self.matched[:100]}`", inline=True)
+        embed.add_field(name="Channel", value=f"#{message.channel}", inline=True)
+        embed.add_field(name="Author", value=str(message.author), inline=True)
+        if self.suppressed:
+            embed.set_footer(text=f"{self.suppressed} more hit(s) since the last notification")
+        return embed
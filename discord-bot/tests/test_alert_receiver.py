@@ -0,0 +1,180 @@
+"""
+Alert Receiver Tests
+Feeds Alertmanager-shaped payloads to AlertReceiver, over HTTP through a
+local aiohttp test server where the endpoint matters, and delivers them
+to a fake channel that records sends and edits.
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')))
+
+from alert_receiver import AlertOutbox, AlertReceiver  # noqa: E402
+
+
+class FakeMessage:
+    def __init__(self, channel, embed):
+        self.channel = channel
+        self.embed = embed
+
+    async def edit(self, embed):
+        self.embed = embed
+        self.channel.edits.append(embed)
+
+
+class FakeChannel:
+    """Stands in for a discord.TextChannel and records what was sent"""
+
+    def __init__(self):
+        self.sent = []
+        self.sent_at = []
+        self.edits = []
+
+    async def send(self, content=None, embed=None, allowed_mentions=None):
+        self.sent.append(embed)
+        self.sent_at.append(time.monotonic())
+        return FakeMessage(self, embed)
+
+
+class RecordingOutbox:
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, group):
+        self.submitted.append(group)
+
+
+def alert(status='firing', fingerprint='abc', instance='vice-db-one:9100'):
+    return {
+        'status': status,
+        'fingerprint': fingerprint,
+        'labels': {'alertname': 'InstanceDown', 'severity': 'critical', 'instance': instance},
+        'annotations': {'summary': f'{instance} is down'},
+        'startsAt': '2026-01-01T00:00:00Z'
+    }
+
+
+def payload(*alerts, key='{}:{alertname="InstanceDown"}'):
+    return {'groupKey': key, 'groupLabels': {'alertname': 'InstanceDown'}, 'alerts': list(alerts)}
+
+
+async def wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def test_repeated_alert_is_deduplicated():
+    outbox = RecordingOutbox()
+    receiver = AlertReceiver(lambda group: outbox)
+
+    assert receiver.ingest(payload(alert())) == 1
+    assert receiver.ingest(payload(alert())) == 0
+    assert len(outbox.submitted) == 1
+    assert len(receiver.groups) == 1
+
+
+def test_empty_and_unknown_status_payloads_create_no_group():
+    outbox = RecordingOutbox()
+    receiver = AlertReceiver(lambda group: outbox)
+
+    assert receiver.ingest(payload()) == 0
+    assert receiver.ingest(payload(alert(status='exploded'), 'not an alert')) == 0
+    assert receiver.groups == {}
+    assert outbox.submitted == []
+
+
+def test_resolve_edits_the_existing_message():
+    async def scenario():
+        channel = FakeChannel()
+
+        async def resolve_target():
+            return channel, None
+
+        outbox = AlertOutbox(resolve_target, burst=10, per=1.0)
+        receiver = AlertReceiver(lambda group: outbox)
+        try:
+            receiver.ingest(payload(alert()))
+            await wait_for(lambda: len(channel.sent) == 1)
+            receiver.ingest(payload(alert(status='resolved')))
+            await wait_for(lambda: len(channel.edits) == 1)
+        finally:
+            outbox._task.cancel()
+        return channel
+
+    channel = asyncio.run(scenario())
+
+    assert len(channel.sent) == 1
+    assert channel.sent[0].title.startswith('🔥 [FIRING:1]')
+    assert channel.edits[0].title.startswith('✅ [RESOLVED]')
+
+
+def test_groups_expire_after_resolution_or_ttl():
+    receiver = AlertReceiver(lambda group: RecordingOutbox(), resolved_retention=60, group_ttl=600)
+    receiver.ingest(payload(alert(status='resolved'), key='resolved'))
+    receiver.ingest(payload(alert(), key='stale'))
+    receiver.ingest(payload(alert(), key='fresh'))
+
+    receiver.groups['resolved'].resolved_at -= 61
+    receiver.groups['stale'].updated_at -= 601
+    receiver.expire()
+
+    assert set(receiver.groups) == {'fresh'}
+
+
+def test_webhook_rejects_bad_token_and_malformed_payloads():
+    async def scenario():
+        outbox = RecordingOutbox()
+        receiver = AlertReceiver(lambda group: outbox, token='s3cret')
+        app = web.Application()
+        receiver.add_routes(app)
+        async with TestClient(TestServer(app)) as client:
+            unauthorized = await client.post('/alerts', json=payload(alert()))
+            wrong_token = await client.post(
+                '/alerts', json=payload(alert()), headers={'Authorization': 'Bearer nope'}
+            )
+            headers = {'Authorization': 'Bearer s3cret'}
+            bad_json = await client.post('/alerts', data='{', headers=headers)
+            no_alerts = await client.post('/alerts', json={'status': 'firing'}, headers=headers)
+            accepted = await client.post('/alerts', json=payload(alert()), headers=headers)
+            return (
+                [r.status for r in (unauthorized, wrong_token, bad_json, no_alerts, accepted)],
+                await accepted.json(),
+                len(outbox.submitted)
+            )
+
+    statuses, body, submitted = asyncio.run(scenario())
+
+    assert statuses == [401, 401, 400, 400, 200]
+    assert body == {'status': 'ok', 'updated': 1}
+    assert submitted == 1
+
+
+def test_outbox_keeps_to_the_channel_rate_limit():
+    async def scenario():
+        channel = FakeChannel()
+
+        async def resolve_target():
+            return channel, None
+
+        outbox = AlertOutbox(resolve_target, burst=2, per=0.3)
+        receiver = AlertReceiver(lambda group: outbox)
+        try:
+            for n in range(3):
+                receiver.ingest(payload(alert(fingerprint=str(n)), key=f'group-{n}'))
+            await wait_for(lambda: len(channel.sent) == 3)
+        finally:
+            outbox._task.cancel()
+        return channel.sent_at
+
+    sent_at = asyncio.run(scenario())
+
+    assert sent_at[1] - sent_at[0] < 0.1
+    assert sent_at[2] - sent_at[0] >= 0.25
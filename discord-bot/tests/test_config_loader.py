@@ -0,0 +1,195 @@
+"""
+Config Loader Tests
+Environment interpolation operators, schema coercion and its error
+messages, and reloads through ConfigWatcher.
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+import yaml
+
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')))
+
+from config_loader import ConfigError, ConfigWatcher, Field, interpolate, load_config, validate  # noqa: E402
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'config.yml')
+
+
+@pytest.mark.parametrize('template, environ, expected', [
+    ('${NAME}', {'NAME': 'vice'}, 'vice'),
+    ('${NAME}', {}, ''),
+    ('${NAME:-fallback}', {}, 'fallback'),
+    ('${NAME:-fallback}', {'NAME': ''}, 'fallback'),
+    ('${NAME:-fallback}', {'NAME': 'vice'}, 'vice'),
+    ('${NAME-fallback}', {}, 'fallback'),
+    ('${NAME-fallback}', {'NAME': ''}, ''),
+    ('${NAME-fallback}', {'NAME': 'vice'}, 'vice'),
+    ('http://${HOST:-localhost}:${PORT:-9090}/', {'PORT': '9091'}, 'http://localhost:9091/'),
+    ('$NAME and {NAME}', {'NAME': 'vice'}, '$NAME and {NAME}')
+])
+def test_interpolation_operators(template, environ, expected):
+    assert interpolate(template, environ) == expected
+
+
+def test_interpolation_walks_nested_values_without_mutating_them():
+    raw = {'a': ['${X:-1}', {'b': '${Y-2}'}], 'c': 3}
+
+    resolved = interpolate(raw, {'Y': 'y'})
+
+    assert resolved == {'a': ['1', {'b': 'y'}], 'c': 3}
+    assert raw == {'a': ['${X:-1}', {'b': '${Y-2}'}], 'c': 3}
+
+
+@pytest.mark.parametrize('kind, value, expected', [
+    (bool, 'yes', True),
+    (bool, 'Off', False),
+    (bool, 1, True),
+    (int, '42', 42),
+    (float, '0.5', 0.5),
+    ('size', '10MB', 10 * 1024 ** 2),
+    ('size', '1.5k', 1536),
+    ('size', 2048, 2048),
+    ('str_list', 'a, b,,c', ['a', 'b', 'c']),
+    ('str_list', [1, 'b'], ['1', 'b']),
+    ('int_map', {'graph': '30'}, {'graph': 30})
+])
+def test_coercion(kind, value, expected):
+    assert Field(kind).coerce(value) == expected
+
+
+@pytest.mark.parametrize('kind, value, message', [
+    (bool, 'maybe', "expected a boolean, got 'maybe'"),
+    (int, True, 'expected an integer'),
+    (int, 'ten', "invalid literal for int() with base 10: 'ten'"),
+    ('size', '10 parsecs', "invalid size '10 parsecs'"),
+    ('str_list', {'a': 1}, 'expected a list'),
+    ('int_map', ['a'], 'expected a mapping'),
+    ('mapping_list', ['a'], 'expected a list of mappings')
+])
+def test_coercion_errors_name_the_key(kind, value, message):
+    with pytest.raises(ConfigError) as excinfo:
+        validate({'section': {'key': value}}, {'section': {'key': Field(kind, default='unused')}})
+
+    assert str(excinfo.value) == f"Invalid configuration:\n  section.key: {message}"
+
+
+def test_validation_collects_every_error():
+    schema = {
+        'token': Field(str, required=True),
+        'interval': Field(float, minimum=1),
+        'mode': Field(str, choices=('full', 'lean')),
+        'nested': {'count': Field(int)}
+    }
+
+    with pytest.raises(ConfigError) as excinfo:
+        validate({'interval': '0.5', 'mode': 'huge', 'nested': 'flat'}, schema)
+
+    assert str(excinfo.value).splitlines()[1:] == [
+        '  token is required',
+        '  interval must be >= 1',
+        '  mode must be one of full, lean',
+        '  nested must be a mapping'
+    ]
+
+
+def test_defaults_are_filled_and_unknown_keys_kept():
+    config = validate({'extra': 1, 'section': {'given': '2'}}, {
+        'section': {'given': Field(int), 'missing': Field(int, default=7)},
+        'absent': {'flag': Field(bool, default=True)}
+    })
+
+    assert config == {'extra': 1, 'section': {'given': 2, 'missing': 7}, 'absent': {'flag': True}}
+
+
+def test_shipped_config_is_valid():
+    config = load_config(CONFIG_PATH, environ={'DISCORD_TOKEN': 'token'})
+
+    assert config['discord']['token'] == 'token'
+    assert isinstance(config['logging']['max_size'], int)
+
+
+def write_config(path, **overrides):
+    config = {'discord': {'token': 'token', 'prefix': '!'}}
+    config['discord'].update(overrides)
+    path.write_text(yaml.safe_dump(config))
+
+
+def test_watcher_reloads_only_valid_changes(tmp_path):
+    path = tmp_path / 'config.yml'
+    write_config(path)
+
+    async def scenario():
+        seen = []
+
+        async def on_change(config):
+            seen.append(config['discord']['prefix'])
+
+        watcher = ConfigWatcher(str(path), on_change)
+        unchanged = await watcher.check()
+
+        write_config(path, prefix='?!')
+        reloaded = await watcher.check()
+        again = await watcher.check()
+
+        path.write_text('discord: {prefix: "!!"}\n')
+        rejected = await watcher.check()
+        return seen, unchanged, reloaded, again, rejected
+
+    seen, unchanged, reloaded, again, rejected = asyncio.run(scenario())
+
+    assert seen == ['?!']
+    assert unchanged is None
+    assert reloaded['discord']['prefix'] == '?!'
+    assert again is None
+    assert rejected is None
+
+
+def test_unreadable_config_raises_config_error(tmp_path):
+    path = tmp_path / 'config.yml'
+    path.write_text('discord: [unclosed\n')
+
+    with pytest.raises(ConfigError, match='Failed to read'):
+        load_config(str(path))
+    with pytest.raises(ConfigError, match='Failed to read'):
+        load_config(str(tmp_path / 'missing.yml'))
+
+
+def test_list_and_dict_defaults_are_not_shared():
+    schema = {'channels': Field('str_list', default=[]), 'cooldowns': Field('int_map', default={})}
+    first = validate({}, schema)
+    first['channels'].append('logs')
+    first['cooldowns']['graph'] = 30
+
+    second = validate({}, schema)
+
+    assert second == {'channels': [], 'cooldowns': {}}
+    assert schema['channels'].default == []
+
+
+def test_paths_resolve_against_the_config_directory(tmp_path):
+    path = tmp_path / 'conf' / 'config.yml'
+    path.parent.mkdir()
+    path.write_text(yaml.safe_dump({
+        'discord': {'token': 'token'},
+        'monitoring': {
+            'watch': {'targets_file': '../targets/hosts.yml'},
+            'probes': {'targets_file': '/etc/prometheus/targets/hosts.yml'}
+        }
+    }))
+
+    config = load_config(str(path))
+
+    assert config['monitoring']['watch']['targets_file'] == str(tmp_path / 'targets' / 'hosts.yml')
+    assert config['monitoring']['probes']['targets_file'] == '/etc/prometheus/targets/hosts.yml'
+
+
+def test_shipped_targets_file_exists_wherever_the_bot_starts(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+
+    config = load_config(CONFIG_PATH, environ={'DISCORD_TOKEN': 'token'})
+
+    assert os.path.isfile(config['monitoring']['watch']['targets_file'])
+    assert os.path.isfile(config['monitoring']['probes']['targets_file'])
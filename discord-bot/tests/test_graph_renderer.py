@@ -0,0 +1,80 @@
+"""
+Graph Renderer Tests
+Min/max downsampling, and a full render through the worker process pool
+against a stub Prometheus client.
+"""
+
+import asyncio
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')))
+
+from graph_renderer import GraphRenderer, downsample_minmax  # noqa: E402
+
+
+class StubPrometheus:
+    """Answers query_range with one noisy series at the requested step"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def query_range(self, promql, start, end, step):
+        self.calls.append((promql, start, end, step))
+        timestamps = np.arange(start, end, step, dtype=np.float64)
+        values = np.sin(timestamps / 600) + (timestamps % 997 == 0) * 10
+        return {
+            'resultType': 'matrix',
+            'result': [{
+                'metric': {'__name__': 'up', 'job': 'node'},
+                'values': [[t, str(v)] for t, v in zip(timestamps, values)]
+            }]
+        }
+
+
+def test_downsample_keeps_extremes_and_bounds_points():
+    timestamps = np.arange(10000, dtype=np.float64)
+    values = np.zeros(10000)
+    values[1234] = 50.0
+    values[8765] = -50.0
+    values[4000:4010] = np.nan
+
+    ts, vs = downsample_minmax(timestamps, values, 300)
+
+    assert len(vs) <= 300
+    assert 50.0 in vs and -50.0 in vs
+    assert not np.isnan(vs).any()
+    assert np.all(np.diff(ts) > 0)
+
+
+def test_short_series_is_left_alone():
+    timestamps = np.arange(10, dtype=np.float64)
+    values = np.arange(10, dtype=np.float64)
+
+    ts, vs = downsample_minmax(timestamps, values, 300)
+
+    assert ts is timestamps and vs is values
+
+
+def test_render_through_worker_processes():
+    async def scenario():
+        prometheus = StubPrometheus()
+        renderer = GraphRenderer(prometheus, max_points=200, workers=1, use_processes=True)
+        try:
+            end = 1_700_000_000
+            first, second = await asyncio.gather(
+                renderer.render('up', 86400, end=end),
+                renderer.render('up', 86400, end=end)
+            )
+        finally:
+            renderer.close()
+        return prometheus, renderer, first, second
+
+    prometheus, renderer, first, second = asyncio.run(scenario())
+
+    assert first.startswith(b'\x89PNG')
+    assert first == second
+    assert len(prometheus.calls) == 1
+    assert renderer.renders == 1
@@ -0,0 +1,47 @@
+"""
+Log Pipeline Tests
+Stopping the listener with a full queue, and size-based rotation settings.
+"""
+
+import logging
+import os
+import queue
+import sys
+from logging.handlers import RotatingFileHandler
+
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')))
+
+from log_pipeline import LOG_RECORDS_DROPPED, DrainingQueueListener, setup_logging, stop_logging  # noqa: E402
+
+
+def log_record(message):
+    return logging.LogRecord('test', logging.WARNING, __file__, 0, message, None, None)
+
+
+def test_sentinel_makes_room_in_a_full_queue():
+    records = queue.Queue(maxsize=3)
+    for n in range(3):
+        records.put_nowait(log_record(f'message {n}'))
+    listener = DrainingQueueListener(records, logging.NullHandler())
+    dropped_before = LOG_RECORDS_DROPPED.labels(level='WARNING')._value.get()
+
+    listener.enqueue_sentinel()
+
+    remaining = [records.get_nowait() for _ in range(3)]
+    assert LOG_RECORDS_DROPPED.labels(level='WARNING')._value.get() - dropped_before == 1
+    assert [record.msg for record in remaining[:2]] == ['message 1', 'message 2']
+    assert remaining[2] is listener._sentinel
+
+
+def test_stop_flushes_queued_records_to_the_file(tmp_path):
+    path = tmp_path / 'bot.log'
+    listener = setup_logging({'file': str(path), 'max_size': '1MB', 'backup_count': 2, 'queue_size': 100})
+    try:
+        sink = next(sink for sink in listener.handlers if isinstance(sink, RotatingFileHandler))
+        logging.getLogger('test').warning('written before stop')
+    finally:
+        stop_logging()
+        logging.getLogger().handlers.clear()
+
+    assert sink.maxBytes == 1024 ** 2
+    assert 'written before stop' in path.read_text()
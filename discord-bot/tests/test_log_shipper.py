@@ -0,0 +1,173 @@
+"""
+Log Shipper Tests
+Runs LokiShipper against a local stub of Loki's push endpoint that can
+be taken down and, like Loki, rejects entries older than what a stream
+already holds.
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')))
+
+from log_shipper import LokiShipper  # noqa: E402
+from message_log import LogRecord  # noqa: E402
+
+
+class StubLoki:
+    """/loki/api/v1/push that answers 503 while down and enforces stream order"""
+
+    def __init__(self):
+        self.down = False
+        self.accepted = []
+        self.rejected = 0
+        self._newest = {}
+        self._runner = None
+        self.url = None
+
+    async def _push(self, request):
+        if self.down:
+            return web.Response(status=503, text='unavailable')
+        # aiohttp has already undone the gzip Content-Encoding
+        payload = json.loads(await request.read())
+        for stream in payload['streams']:
+            key = tuple(sorted(stream['stream'].items()))
+            timestamps = [int(ts) for ts, _ in stream['values']]
+            if timestamps[0] < self._newest.get(key, 0):
+                self.rejected += 1
+                return web.Response(status=400, text='entry out of order')
+            self._newest[key] = timestamps[-1]
+        for stream in payload['streams']:
+            self.accepted.extend(json.loads(line)['content'] for _, line in stream['values'])
+        return web.Response(status=204)
+
+    async def __aenter__(self):
+        app = web.Application()
+        app.router.add_post('/loki/api/v1/push', self._push)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+        self.url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._runner.cleanup()
+
+
+def records(start, count, base=None):
+    base = time.time() if base is None else base
+    return [
+        LogRecord(seq, base + seq * 0.001, 'vice', 'logs', 'tester', f'message {seq}')
+        for seq in range(start, start + count)
+    ]
+
+
+def shipper_for(stub, tmp_path, **kwargs):
+    options = dict(
+        batch_size=50, batch_wait=0.05, max_retries=0, min_backoff=0.01, max_backoff=0.05,
+        spool_path=str(tmp_path / 'spool')
+    )
+    options.update(kwargs)
+    return LokiShipper(stub.url, **options)
+
+
+def spool_files(tmp_path):
+    return sorted((tmp_path / 'spool').glob('*.json.gz'))
+
+
+async def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.02)
+
+
+def test_undeliverable_batches_spill_then_replay_before_newer_ones(tmp_path):
+    async def scenario():
+        async with StubLoki() as stub:
+            # Behind a non-empty spool, batches wait in memory until max_pending overflows to disk
+            shipper = shipper_for(stub, tmp_path, max_pending=50)
+            task = asyncio.ensure_future(shipper.run())
+            base = time.time()
+            try:
+                stub.down = True
+                for record in records(0, 200, base):
+                    shipper.append(record)
+                await wait_for(lambda: shipper.pending == 50 and len(spool_files(tmp_path)) == 3)
+
+                stub.down = False
+                for record in records(200, 200, base):
+                    shipper.append(record)
+                await wait_for(lambda: len(stub.accepted) == 400)
+                spooled_after = spool_files(tmp_path)
+            finally:
+                await shipper.close()
+                await task
+            return stub, spooled_after
+
+    stub, spooled_after = asyncio.run(scenario())
+
+    assert stub.accepted == [f'message {seq}' for seq in range(400)]
+    assert stub.rejected == 0
+    assert spooled_after == []
+
+
+def test_spool_from_a_previous_run_is_replayed_first(tmp_path):
+    async def scenario():
+        async with StubLoki() as stub:
+            base = time.time()
+            stub.down = True
+            first = shipper_for(stub, tmp_path)
+            for record in records(0, 100, base):
+                first.append(record)
+            await first.close()
+            spooled = len(spool_files(tmp_path))
+
+            stub.down = False
+            second = shipper_for(stub, tmp_path)
+            task = asyncio.ensure_future(second.run())
+            try:
+                for record in records(100, 100, base):
+                    second.append(record)
+                await wait_for(lambda: len(stub.accepted) == 200)
+            finally:
+                await second.close()
+                await task
+            return stub, spooled
+
+    stub, spooled = asyncio.run(scenario())
+
+    assert spooled == 2
+    assert stub.accepted == [f'message {seq}' for seq in range(200)]
+
+
+def test_spool_stays_within_its_size_limit(tmp_path):
+    async def scenario():
+        async with StubLoki() as stub:
+            stub.down = True
+            shipper = shipper_for(stub, tmp_path, spool_max_bytes=4096)
+            base = time.time()
+            sizes = []
+            try:
+                for batch in range(40):
+                    for record in records(batch * 50, 50, base):
+                        shipper.append(record)
+                    await shipper._ship(shipper._take_batch())
+                    sizes.append(sum(path.stat().st_size for path in spool_files(tmp_path)))
+            finally:
+                await shipper.close()
+            return shipper, sizes, spool_files(tmp_path)
+
+    shipper, sizes, files = asyncio.run(scenario())
+
+    assert max(sizes) <= 4096
+    assert shipper._spool_bytes == sizes[-1]
+    # The oldest batches were dropped, the newest kept
+    assert files[-1].name.endswith('-000040-50.json.gz')
+    assert len(files) < 40
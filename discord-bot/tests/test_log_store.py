@@ -0,0 +1,155 @@
+"""
+Log Store Tests
+Day segmentation, querying across segments, requeue on failed writes,
+the max_pending cap, retention and a clean shutdown of the run loop.
+"""
+
+import asyncio
+import os
+import sqlite3
+import sys
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')))
+
+from log_store import LOG_STORE_DROPPED, LOG_STORE_ERRORS, LogStore  # noqa: E402
+from message_log import LogRecord  # noqa: E402
+
+DAY_ONE = datetime(2026, 3, 1, 23, 59, tzinfo=timezone.utc).timestamp()
+DAY_TWO = datetime(2026, 3, 2, 0, 1, tzinfo=timezone.utc).timestamp()
+
+
+def record(timestamp, content, channel='logs', author='tester'):
+    return LogRecord(0, timestamp, 'vice', channel, author, content)
+
+
+def segments(path):
+    return sorted(name for name in os.listdir(path) if name.endswith('.sqlite3'))
+
+
+def test_records_are_split_into_utc_day_segments(tmp_path):
+    async def scenario():
+        store = LogStore(str(tmp_path))
+        try:
+            store.append(record(DAY_ONE, 'late'))
+            store.append(record(DAY_TWO, 'early'))
+            store.append(record(DAY_TWO + 1, 'other channel', channel='general'))
+            await store.flush()
+            return (
+                await store.query(limit=10),
+                await store.query(channel='logs', limit=10),
+                await store.query(since=DAY_TWO, limit=10),
+                await store.query(limit=1)
+            )
+        finally:
+            await store.close()
+
+    everything, logs, day_two, newest = asyncio.run(scenario())
+
+    assert segments(tmp_path) == ['messages-20260301.sqlite3', 'messages-20260302.sqlite3']
+    assert [r.content for r in everything] == ['late', 'early', 'other channel']
+    assert [r.content for r in logs] == ['late', 'early']
+    assert [r.content for r in day_two] == ['early', 'other channel']
+    assert [r.content for r in newest] == ['other channel']
+
+
+def test_failed_segment_write_is_requeued(tmp_path):
+    async def scenario():
+        store = LogStore(str(tmp_path))
+        write_batch = store._write_batch
+
+        def fail_day_two(batch):
+            # Day one's rows are written, day two's segment fails
+            failed = [row for row in batch if row[0] >= DAY_TWO]
+            write_batch([row for row in batch if row[0] < DAY_TWO])
+            return failed
+
+        try:
+            store.append(record(DAY_ONE, 'kept'))
+            store.append(record(DAY_TWO, 'retried'))
+            store._write_batch = fail_day_two
+            try:
+                await store.flush()
+            except sqlite3.OperationalError as e:
+                error = str(e)
+            pending_after_failure = store.pending
+            store._write_batch = write_batch
+            await store.flush()
+            return error, pending_after_failure, store.records_written, await store.query(limit=10)
+        finally:
+            await store.close()
+
+    error, pending, written, rows = asyncio.run(scenario())
+
+    assert error == '1 of 2 records could not be written'
+    assert pending == 1
+    assert written == 2
+    assert [r.content for r in rows] == ['kept', 'retried']
+
+
+def test_queue_is_capped_by_dropping_the_oldest(tmp_path):
+    async def scenario():
+        store = LogStore(str(tmp_path), max_pending=3)
+        dropped_before = LOG_STORE_DROPPED._value.get()
+        try:
+            for n in range(5):
+                store.append(record(DAY_ONE + n, f'message {n}'))
+            dropped = LOG_STORE_DROPPED._value.get() - dropped_before
+            await store.flush()
+            return dropped, await store.query(limit=10)
+        finally:
+            await store.close()
+
+    dropped, rows = asyncio.run(scenario())
+
+    assert dropped == 2
+    assert [r.content for r in rows] == ['message 2', 'message 3', 'message 4']
+
+
+def test_segments_past_retention_are_dropped(tmp_path):
+    async def scenario():
+        store = LogStore(str(tmp_path), retention_days=1)
+        try:
+            store.append(record(DAY_ONE, 'old'))
+            store.append(record(DAY_TWO, 'recent'))
+            await store.flush()
+            # One day after the end of day two: day one is wholly expired
+            dropped = await store._run(store._drop_expired, DAY_TWO + 86400)
+            return dropped, await store.query(limit=10)
+        finally:
+            await store.close()
+
+    dropped, rows = asyncio.run(scenario())
+
+    assert dropped == ['20260301']
+    assert segments(tmp_path) == ['messages-20260302.sqlite3']
+    assert [r.content for r in rows] == ['recent']
+
+
+class LateWakeup(asyncio.Event):
+    """An event whose waiters resume well after it is set"""
+
+    async def wait(self):
+        await super().wait()
+        await asyncio.sleep(0.1)
+        return True
+
+
+def test_close_stops_a_run_loop_that_wakes_late(tmp_path):
+    async def scenario():
+        errors_before = LOG_STORE_ERRORS._value.get()
+        store = LogStore(str(tmp_path), flush_interval=60)
+        store._wakeup = LateWakeup()
+        task = asyncio.ensure_future(store.run(compact_interval=0))
+        await asyncio.sleep(0.05)
+        store.append(record(DAY_ONE, 'at shutdown'))
+        await store.close()
+        # Give a run() that survived close() the chance to touch the executor
+        await asyncio.sleep(0.2)
+        return task, LOG_STORE_ERRORS._value.get() - errors_before, store.records_written
+
+    task, errors, written = asyncio.run(scenario())
+
+    assert task.done()
+    assert errors == 0
+    assert written == 1
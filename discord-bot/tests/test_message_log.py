@@ -0,0 +1,89 @@
+"""
+Message Log Tests
+Ring eviction, the per-channel and per-author indexes, and time-bounded
+queries against a model that keeps every record in a plain list.
+"""
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')))
+
+from message_log import MessageLog  # noqa: E402
+
+
+def contents(records):
+    return [record.content for record in records]
+
+
+def test_ring_keeps_only_the_newest_records():
+    log = MessageLog(capacity=3)
+    for n in range(5):
+        log.append('vice', 'logs', 'tester', f'message {n}', timestamp=100 + n)
+
+    assert len(log) == 3
+    assert log.oldest_seq == 2
+    assert log.oldest_timestamp == 102
+    assert contents(log.query(limit=10)) == ['message 2', 'message 3', 'message 4']
+    assert contents(log.query(limit=2)) == ['message 3', 'message 4']
+
+
+def test_evicted_keys_leave_the_indexes():
+    log = MessageLog(capacity=2)
+    log.append('vice', 'alerts', 'alice', 'first', timestamp=1)
+    log.append('vice', 'logs', 'bob', 'second', timestamp=2)
+    log.append('vice', 'logs', 'bob', 'third', timestamp=3)
+
+    assert sorted(log.channels()) == ['logs']
+    assert sorted(log.authors()) == ['bob']
+    assert log.query(channel='alerts') == []
+    assert log.query(author='alice') == []
+    assert contents(log.query(channel='logs', author='bob')) == ['second', 'third']
+
+
+def test_queries_match_a_full_scan_after_many_evictions():
+    rng = random.Random(7)
+    capacity = 200
+    log = MessageLog(capacity=capacity)
+    model = []
+    for n in range(5000):
+        channel, author = f'c{rng.randrange(4)}', f'u{rng.randrange(6)}'
+        log.append('vice', channel, author, f'm{n}', timestamp=n * 0.5)
+        model.append((n * 0.5, channel, author, f'm{n}'))
+    held = model[-capacity:]
+
+    for _ in range(200):
+        channel = rng.choice([None, 'c0', 'c1', 'c2', 'c3', 'missing'])
+        author = rng.choice([None, 'u0', 'u3', 'u5'])
+        since = rng.choice([None, held[0][0] - 10, held[50][0], held[150][0] + 0.25])
+        until = rng.choice([None, held[100][0], held[-1][0] + 10])
+        limit = rng.choice([1, 5, 50, 500])
+        expected = [
+            content for timestamp, c, a, content in held
+            if (channel is None or c == channel)
+            and (author is None or a == author)
+            and (since is None or timestamp >= since)
+            and (until is None or timestamp <= until)
+        ][-limit:]
+        assert contents(log.query(channel, author, since, until, limit)) == expected
+
+
+def test_index_compacts_its_dead_prefix():
+    log = MessageLog(capacity=10)
+    for n in range(1000):
+        log.append('vice', 'logs', 'tester', f'message {n}', timestamp=n)
+
+    index = log._by_channel['logs']
+    assert len(index) == 10
+    # Pruned entries are deleted once they outweigh the live ones
+    assert len(index.seqs) < 200
+
+
+def test_out_of_order_timestamps_are_clamped():
+    log = MessageLog(capacity=5)
+    log.append('vice', 'logs', 'tester', 'late', timestamp=10)
+    early = log.append('vice', 'logs', 'tester', 'early clock', timestamp=5)
+
+    assert early.timestamp == 10
+    assert contents(log.query(since=10)) == ['late', 'early clock']
@@ -0,0 +1,180 @@
+"""
+Prober Tests
+Runs TCP, HTTP and DNS probes against local stub servers and checks the
+per-host concurrency limit and live reload of connector settings.
+"""
+
+import asyncio
+import os
+import socket
+import sys
+
+import yaml
+from aiohttp import web
+
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')))
+
+from prober import Check, Prober  # noqa: E402
+
+
+def probe_config(targets_file=None, per_host=4, verify_tls=False, paths=None, dns_names=()):
+    return {
+        'targets_file': targets_file,
+        'interval': 30,
+        'timeout': 2,
+        'jitter': 0.1,
+        'concurrency': 64,
+        'per_host': per_host,
+        'http': {'paths': paths or {}, 'verify_tls': verify_tls},
+        'dns': {'names': list(dns_names)}
+    }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class StubHTTP:
+    """/ok answers 200, /broken 503, /slow 200 after a delay; tracks concurrency"""
+
+    def __init__(self, delay=0.1):
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._runner = None
+        self.port = None
+
+    async def _ok(self, request):
+        return web.Response(text='ok')
+
+    async def _broken(self, request):
+        return web.Response(status=503, text='unavailable')
+
+    async def _slow(self, request):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        return web.Response(text='ok')
+
+    async def __aenter__(self):
+        app = web.Application()
+        app.router.add_get('/ok', self._ok)
+        app.router.add_get('/broken', self._broken)
+        app.router.add_get('/slow', self._slow)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._runner.cleanup()
+
+
+def test_tcp_probe_success_and_refused(tmp_path):
+    async def scenario():
+        server = await asyncio.start_server(lambda reader, writer: writer.close(), '127.0.0.1', 0)
+        open_port = server.sockets[0].getsockname()[1]
+        closed_port = free_port()
+        targets = tmp_path / 'targets.yml'
+        targets.write_text(yaml.safe_dump([
+            {'targets': [f'127.0.0.1:{open_port}', f'127.0.0.1:{closed_port}'], 'labels': {'job': 'node'}}
+        ]))
+        prober = Prober(probe_config(str(targets)))
+        try:
+            results = {result.check.port: result for result in await prober.probe_host('127.0.0.1')}
+        finally:
+            await prober.close()
+            server.close()
+        return results[open_port], results[closed_port]
+
+    up, down = asyncio.run(scenario())
+
+    assert up.success and up.detail == 'connected'
+    assert not down.success and down.detail.startswith('refused')
+
+
+def test_http_probe_success_and_error_status():
+    async def scenario():
+        async with StubHTTP() as stub:
+            prober = Prober(probe_config())
+            try:
+                ok = await prober.probe(Check('http', f'127.0.0.1:{stub.port}', '127.0.0.1', stub.port, path='/ok'))
+                broken = await prober.probe(Check('http', f'127.0.0.1:{stub.port}', '127.0.0.1', stub.port, path='/broken'))
+            finally:
+                await prober.close()
+        return ok, broken
+
+    ok, broken = asyncio.run(scenario())
+
+    assert ok.success and ok.detail == 'HTTP 200'
+    assert not broken.success and broken.detail.startswith('http')
+
+
+def test_dns_probe_success_and_failure():
+    async def scenario():
+        prober = Prober(probe_config())
+        try:
+            return (
+                await prober.probe(Check('dns', 'localhost', 'localhost')),
+                await prober.probe(Check('dns', 'no-such-host.invalid', 'no-such-host.invalid'))
+            )
+        finally:
+            await prober.close()
+
+    resolved, missing = asyncio.run(scenario())
+
+    assert resolved.success and '127.0.0.1' in resolved.detail
+    assert not missing.success
+
+
+def test_per_host_limit_bounds_concurrent_probes():
+    async def scenario():
+        async with StubHTTP(delay=0.1) as stub:
+            prober = Prober(probe_config(per_host=2))
+            checks = [
+                Check('http', f'127.0.0.1:{stub.port}/{n}', '127.0.0.1', stub.port, path='/slow')
+                for n in range(6)
+            ]
+            try:
+                results = await asyncio.gather(*(prober.probe(check) for check in checks))
+            finally:
+                await prober.close()
+            return results, stub.max_in_flight
+
+    results, max_in_flight = asyncio.run(scenario())
+
+    assert all(result.success for result in results)
+    assert max_in_flight == 2
+
+
+def test_reload_rebuilds_the_session_when_connector_settings_change():
+    async def scenario():
+        async with StubHTTP() as stub:
+            prober = Prober(probe_config(per_host=4))
+            check = Check('http', f'127.0.0.1:{stub.port}', '127.0.0.1', stub.port, path='/ok')
+            try:
+                await prober.probe(check)
+                first = prober._session
+                prober.update(probe_config(per_host=4))
+                unchanged = prober._session
+                prober.update(probe_config(per_host=1))
+                await prober.probe(check)
+                second = prober._session
+                limit = second.connector.limit_per_host
+            finally:
+                await prober.close()
+            return first, unchanged, second, limit
+
+    first, unchanged, second, limit = asyncio.run(scenario())
+
+    assert unchanged is first
+    assert second is not first
+    assert limit == 1
+    assert first.closed and second.closed
@@ -0,0 +1,139 @@
+"""
+Query Client Tests
+Runs PrometheusClient against a local aiohttp stub server that stands in
+for Prometheus and counts the requests it receives.
+"""
+
+import asyncio
+import gc
+import os
+import sys
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')))
+
+from query_client import PrometheusClient, QueryError  # noqa: E402
+
+
+class StubPrometheus:
+    """Minimal /api/v1/query endpoint with a request counter and a delay"""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.requests = 0
+        self._runner = None
+        self.url = None
+
+    async def _query(self, request):
+        self.requests += 1
+        await asyncio.sleep(self.delay)
+        if request.query['query'] == 'bad':
+            return web.json_response({'status': 'error', 'errorType': 'bad_data', 'error': 'parse error'}, status=400)
+        return web.json_response({
+            'status': 'success',
+            'data': {
+                'resultType': 'vector',
+                'result': [{'metric': {'query': request.query['query']}, 'value': [0, str(self.requests)]}]
+            }
+        })
+
+    async def __aenter__(self):
+        app = web.Application()
+        app.router.add_get('/api/v1/query', self._query)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}"
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._runner.cleanup()
+
+
+def test_concurrent_identical_queries_share_one_request():
+    async def scenario():
+        async with StubPrometheus() as stub:
+            client = PrometheusClient(stub.url, cache_ttl=10)
+            try:
+                results = await asyncio.gather(*(client.query('up') for _ in range(20)))
+            finally:
+                await client.close()
+            return stub.requests, client, results
+
+    requests, client, results = asyncio.run(scenario())
+
+    assert requests == 1
+    assert client.requests_sent == 1
+    assert client.coalesced == 19
+    assert all(result == results[0] for result in results)
+
+
+def test_distinct_queries_are_not_coalesced():
+    async def scenario():
+        async with StubPrometheus() as stub:
+            client = PrometheusClient(stub.url, cache_ttl=10)
+            try:
+                await asyncio.gather(client.query('up'), client.query('down'))
+            finally:
+                await client.close()
+            return stub.requests
+
+    assert asyncio.run(scenario()) == 2
+
+
+def test_cached_result_expires_after_ttl():
+    async def scenario():
+        async with StubPrometheus(delay=0) as stub:
+            client = PrometheusClient(stub.url, cache_ttl=0.2)
+            try:
+                first = await client.query('up')
+                cached = await client.query('up')
+                counts = [stub.requests]
+                await asyncio.sleep(0.3)
+                expired = await client.query('up')
+                counts.append(stub.requests)
+            finally:
+                await client.close()
+            return counts, client.cache_hits, first, cached, expired
+
+    counts, cache_hits, first, cached, expired = asyncio.run(scenario())
+
+    assert counts == [1, 2]
+    assert cache_hits == 1
+    assert cached == first
+    assert expired != first
+
+
+def test_failed_request_with_every_caller_cancelled_is_not_reported():
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        reported = []
+        loop.set_exception_handler(lambda loop, context: reported.append(context['message']))
+        async with StubPrometheus(delay=0.1) as stub:
+            client = PrometheusClient(stub.url, cache_ttl=10)
+            try:
+                callers = [asyncio.ensure_future(client.query('bad')) for _ in range(3)]
+                await asyncio.sleep(0.02)
+                for caller in callers:
+                    caller.cancel()
+                await asyncio.gather(*callers, return_exceptions=True)
+                await asyncio.sleep(0.2)
+                inflight = dict(client._inflight)
+                del callers
+                gc.collect()
+                try:
+                    await client.query('bad')
+                except QueryError as e:
+                    error = str(e)
+            finally:
+                await client.close()
+        return reported, inflight, error
+
+    reported, inflight, error = asyncio.run(scenario())
+
+    assert reported == []
+    assert inflight == {}
+    assert error == 'bad_data: parse error'
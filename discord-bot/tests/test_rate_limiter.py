@@ -0,0 +1,110 @@
+"""
+Rate Limiter Tests
+Sliding-window counter math, retry-after values, cooldowns and eviction
+of idle keys, all driven by explicit clock values.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')))
+
+import rate_limiter  # noqa: E402
+from rate_limiter import CooldownTracker, RateLimiter, SlidingWindowLimiter  # noqa: E402
+
+
+def test_limit_within_one_window():
+    limiter = SlidingWindowLimiter(limit=2, window=10)
+
+    assert limiter.hit('alice', now=0) == 0
+    assert limiter.hit('alice', now=1) == 0
+    # Both hits are in the current window: retry when it ends
+    assert limiter.hit('alice', now=2) == 8
+    assert limiter.hit('bob', now=2) == 0
+
+
+def test_previous_window_is_weighted_by_its_overlap():
+    limiter = SlidingWindowLimiter(limit=2, window=10)
+    limiter.hit('alice', now=0)
+    limiter.hit('alice', now=1)
+
+    # Two hits last window count as one when halfway through this one
+    assert limiter.hit('alice', now=15) == 0
+    retry_after = limiter.hit('alice', now=15)
+    assert retry_after == 5
+    assert limiter.hit('alice', now=15 + retry_after) == 0
+
+
+def test_blocked_hits_are_not_counted():
+    limiter = SlidingWindowLimiter(limit=1, window=10)
+    limiter.hit('alice', now=0)
+    for now in range(1, 10):
+        assert limiter.hit('alice', now=now) > 0
+
+    # Only the one allowed hit carries over into the next window
+    assert abs(limiter.hit('alice', now=19.5) - 0.5) < 1e-9
+    assert limiter.hit('alice', now=20) == 0
+
+
+def test_window_after_an_idle_gap_starts_empty():
+    limiter = SlidingWindowLimiter(limit=1, window=10)
+    limiter.hit('alice', now=5)
+
+    assert limiter.hit('alice', now=25) == 0
+
+
+def test_idle_keys_are_evicted_after_two_windows():
+    limiter = SlidingWindowLimiter(limit=5, window=10)
+    limiter.hit('alice', now=0)
+    limiter.hit('bob', now=15)
+
+    assert limiter.evict(now=19) == 0
+    assert limiter.evict(now=20) == 1
+    assert len(limiter) == 1
+    assert limiter.evict(now=30) == 1
+    assert len(limiter) == 0
+
+
+def test_cooldowns_expire_and_are_evicted():
+    cooldowns = CooldownTracker()
+    cooldowns.start(('alice', 'status'), 30, now=100)
+
+    assert cooldowns.remaining(('alice', 'status'), now=110) == 20
+    assert cooldowns.remaining(('bob', 'status'), now=110) == 0
+    assert cooldowns.evict(now=129) == 0
+    assert cooldowns.evict(now=130) == 1
+    assert len(cooldowns) == 0
+
+
+def test_cooldown_is_checked_before_the_global_limit(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(rate_limiter.time, 'monotonic', lambda: clock[0])
+    limiter = RateLimiter({
+        'rate_limit': {'enabled': True, 'max_commands': 2, 'time_window': 60},
+        'cooldowns': {'graph': 30}
+    })
+
+    assert limiter.check('alice', 'graph') is None
+    assert limiter.check('alice', 'graph') == ('cooldown', 30)
+    assert limiter.check('alice', 'status') is None
+    scope, retry_after = limiter.check('alice', 'status')
+    assert scope == 'global' and retry_after > 0
+
+    clock[0] += 30
+    # The cooldown is over but the window is still full
+    assert limiter.check('alice', 'graph')[0] == 'global'
+
+
+def test_update_keeps_state_unless_the_window_changes(monkeypatch):
+    monkeypatch.setattr(rate_limiter.time, 'monotonic', lambda: 1000.0)
+    config = {'rate_limit': {'enabled': True, 'max_commands': 1, 'time_window': 60}}
+    limiter = RateLimiter(config)
+    limiter.check('alice', 'status')
+
+    limiter.update({'rate_limit': {'enabled': True, 'max_commands': 2, 'time_window': 60}})
+    assert limiter.check('alice', 'status') is None
+    assert limiter.check('alice', 'status')[0] == 'global'
+
+    limiter.update({'rate_limit': {'enabled': True, 'max_commands': 2, 'time_window': 30}})
+    assert len(limiter.window) == 0
+    assert limiter.check('alice', 'status') is None
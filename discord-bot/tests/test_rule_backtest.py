@@ -0,0 +1,186 @@
+"""
+Rule Backtest Tests
+The PromQL subset in scripts/rule_backtest.py: parsing and operator
+precedence, counter resets in rate(), vector matching, `for:` handling
+and firing episodes, and that every shipped rule parses.
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'scripts')))
+
+from rule_backtest import (  # noqa: E402
+    DEFAULT_RULES, BacktestError, Evaluator, Fixture, Parser, backtest, episodes, firing_mask, load_rules
+)
+
+STEP = 15
+
+
+def make_fixture(series, points):
+    """Fixture from {(name, labels tuple): [value per step, None for a gap]}"""
+    fixture = Fixture(0, STEP, points, 'test')
+    fixture.add_series([
+        {
+            'metric': {'__name__': name, **dict(labels)},
+            'values': [[column * STEP, str(value)] for column, value in enumerate(values) if value is not None]
+        }
+        for (name, labels), values in series.items()
+    ])
+    return fixture
+
+
+def evaluate(text, fixture=None):
+    evaluator = Evaluator(fixture or make_fixture({}, 4))
+    return evaluator.evaluate(Parser(text).parse())
+
+
+def rows(vector):
+    """{labels tuple: values list} with NaN as None"""
+    return {
+        tuple(sorted(labels.items())): [None if np.isnan(value) else round(float(value), 6) for value in values]
+        for labels, values in zip(vector.labels, vector.values)
+    }
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('1 + 2 * 3', 7),
+    ('(1 + 2) * 3', 9),
+    ('2 ^ 3 ^ 2', 512),
+    ('-2 ^ 2', -4),
+    ('10 - 4 - 3', 3),
+    ('7 % 4 + 0x10', 19),
+    ('3 > bool 2', 1),
+    ('abs(-1.5e1)', 15)
+])
+def test_scalar_precedence(text, expected):
+    assert rows(evaluate(text)) == {(): [expected] * 4}
+
+
+@pytest.mark.parametrize('text, message', [
+    ('max_over_time(rate(x[5m])[1h:])', 'subqueries are not supported'),
+    ('sum(x, 2)', 'parameters to sum() are not supported'),
+    ('x offset', 'unexpected end of expression'),
+    ('x{job=web}', 'expected a quoted label value'),
+    ('1 > 2', 'comparisons between scalars need bool'),
+    ('topk(3, x)', 'function topk() is not supported'),
+    ('rate(x[15s])', 'range is shorter than two fixture steps')
+])
+def test_unsupported_syntax_is_reported(text, message):
+    fixture = make_fixture({('x', ()): [1, 2, 3, 4]}, 4)
+    with pytest.raises(BacktestError, match=message.replace('(', r'\(').replace(')', r'\)')):
+        evaluate(text, fixture)
+
+
+def test_rate_and_irate_survive_a_counter_reset():
+    fixture = make_fixture({('requests_total', (('job', 'web'),)): [0, 15, 30, 10, 25]}, 5)
+
+    assert rows(evaluate('rate(requests_total[30s])', fixture)) == {
+        (('job', 'web'),): [None, 1, 1, 0.666667, 1]
+    }
+    assert rows(evaluate('irate(requests_total[1m])', fixture)) == {
+        (('job', 'web'),): [None, 1, 1, 0.666667, 1]
+    }
+    # Three samples span 30s of a 45s window
+    assert rows(evaluate('increase(requests_total[45s])', fixture)) == {
+        (('job', 'web'),): [None, None, 45, 37.5, 37.5]
+    }
+
+
+def test_over_time_functions_skip_gaps():
+    fixture = make_fixture({('temp', ()): [4, None, 2, 8, None]}, 5)
+
+    assert rows(evaluate('max_over_time(temp[30s])', fixture)) == {(): [4, 4, 2, 8, 8]}
+    assert rows(evaluate('avg_over_time(temp[45s])', fixture)) == {(): [4, 4, 3, 5, 5]}
+    assert rows(evaluate('sum_over_time(temp[15s])', fixture)) == {(): [4, None, 2, 8, None]}
+
+
+def test_aggregation_and_group_left_matching():
+    fixture = make_fixture({
+        ('cpu', (('instance', 'a'), ('mode', 'user'))): [1, 2],
+        ('cpu', (('instance', 'a'), ('mode', 'system'))): [3, 4],
+        ('cpu', (('instance', 'b'), ('mode', 'user'))): [5, 6],
+        ('cores', (('instance', 'a'), ('site', 'dc1'))): [2, 2],
+        ('cores', (('instance', 'b'), ('site', 'dc2'))): [4, 4]
+    }, 2)
+
+    assert rows(evaluate('sum by (instance) (cpu)', fixture)) == {
+        (('instance', 'a'),): [4, 6],
+        (('instance', 'b'),): [5, 6]
+    }
+    assert rows(evaluate('cpu / on(instance) group_left(site) cores', fixture)) == {
+        (('instance', 'a'), ('mode', 'user'), ('site', 'dc1')): [0.5, 1],
+        (('instance', 'a'), ('mode', 'system'), ('site', 'dc1')): [1.5, 2],
+        (('instance', 'b'), ('mode', 'user'), ('site', 'dc2')): [1.25, 1.5]
+    }
+    with pytest.raises(BacktestError, match='many-to-one matching needs group_left'):
+        evaluate('cpu / on(instance) cores', fixture)
+
+
+def test_comparison_filters_and_set_operations():
+    fixture = make_fixture({
+        ('up', (('job', 'web'),)): [1, 0, 1],
+        ('up', (('job', 'db'),)): [0, 0, 1],
+        ('maintenance', (('job', 'db'),)): [1, 1, None]
+    }, 3)
+
+    assert rows(evaluate('up == 0', fixture)) == {
+        (('__name__', 'up'), ('job', 'web')): [None, 0, None],
+        (('__name__', 'up'), ('job', 'db')): [0, 0, None]
+    }
+    assert rows(evaluate('up == 0 unless on(job) maintenance', fixture)) == {
+        (('__name__', 'up'), ('job', 'web')): [None, 0, None]
+    }
+
+
+def test_for_duration_and_episodes():
+    active = np.array([[True, True, True, False, True, True, True, True]])
+
+    firing = firing_mask(active, 2)
+
+    # Fires on the third consecutive active evaluation; a gap restarts the wait
+    assert firing[0].tolist() == [False, False, True, False, False, False, True, True]
+    assert episodes(firing[0]) == [(2, 3), (6, 8)]
+    assert firing_mask(active, 0) is active
+
+
+def test_backtest_through_a_recording_rule():
+    fixture = make_fixture({
+        ('requests_total', (('instance', 'a'),)): [0, 0, 0, 0, 15, 30, 45, 60, 60, 60, 75, 90],
+        # Counter reset at column 3: the 20 after it still counts as an increase
+        ('requests_total', (('instance', 'b'),)): [50, 65, 80, 20, 35, 50, 65, 80, 95, 110, 125, 140]
+    }, 12)
+    rules = [
+        {'record': 'instance:requests:rate30s', 'expr': 'rate(requests_total[30s])', 'file': 'f', 'group': 'g'},
+        {
+            'alert': 'BusyInstance', 'expr': 'instance:requests:rate30s > 0.5', 'for': '30s',
+            'labels': {'severity': 'warning'}, 'file': 'f', 'group': 'g'
+        },
+        {'alert': 'Unknown', 'expr': 'missing_metric > 0', 'file': 'f', 'group': 'g'},
+        {'alert': 'Unsupported', 'expr': 'topk(1, requests_total)', 'file': 'f', 'group': 'g'}
+    ]
+
+    busy, missing, unsupported = backtest(rules, fixture, flap_window=60)
+
+    assert busy['status'] == 'ok'
+    assert busy['series'] == 2
+    assert busy['fires'] == 2
+    assert busy['firing_seconds'] == (2 + 9) * STEP
+    assert [(e['start'], e['end'], e['labels']) for e in busy['episodes']] == [
+        (3 * STEP, None, {'instance': 'b'}),
+        (6 * STEP, 8 * STEP, {'instance': 'a'})
+    ]
+    assert missing['status'] == 'missing'
+    assert missing['errors'] == ['missing series: missing_metric']
+    assert unsupported['status'] == 'unsupported'
+
+
+def test_shipped_rules_parse():
+    rules = load_rules([DEFAULT_RULES])
+
+    assert rules
+    for rule in rules:
+        Parser(str(rule['expr'])).parse()
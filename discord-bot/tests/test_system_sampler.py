@@ -0,0 +1,50 @@
+"""
+System Sampler Tests
+get() must never hang on a first sample that fails or never comes.
+"""
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')))
+
+from system_sampler import SystemSampler  # noqa: E402
+
+
+def test_get_returns_a_sample_once_the_sampler_runs():
+    async def scenario():
+        sampler = SystemSampler(interval=60)
+        task = asyncio.ensure_future(sampler.run())
+        try:
+            return await sampler.get(timeout=5)
+        finally:
+            task.cancel()
+
+    snapshot = asyncio.run(scenario())
+
+    assert snapshot.timestamp > 0
+    assert snapshot.cpu_count > 0
+
+
+def test_failed_first_sample_releases_waiters():
+    async def scenario():
+        sampler = SystemSampler(interval=60)
+
+        def broken():
+            raise OSError("disk gone")
+
+        sampler._sample = broken
+        task = asyncio.ensure_future(sampler.run())
+        try:
+            return await asyncio.wait_for(sampler.get(timeout=30), timeout=2)
+        finally:
+            task.cancel()
+
+    assert asyncio.run(scenario()).timestamp == 0
+
+
+def test_get_times_out_when_the_sampler_never_starts():
+    snapshot = asyncio.run(SystemSampler(interval=60).get(timeout=0.05))
+
+    assert snapshot.timestamp == 0
@@ -0,0 +1,195 @@
+"""
+Target Discovery Tests
+Inventory var merging, Terraform address overrides, duplicate targets,
+the http_sd endpoint's ETag/304 handling and atomic file_sd writes.
+"""
+
+import json
+import os
+import sys
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+import yaml
+
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'scripts')))
+
+import target_discovery  # noqa: E402
+from target_discovery import (  # noqa: E402
+    Discovery, build_target_groups, etag_matches, make_handler, read_inventory, write_atomic
+)
+
+INVENTORY = {
+    'all': {
+        'vars': {'node_exporter_port': 9100, 'site': 'all'},
+        'children': {
+            'monitoring': {
+                'vars': {'site': 'monitoring', 'grafana_port': 3000},
+                'hosts': {
+                    'mon-1': {'ansible_host': '10.0.0.5', 'scrape_jobs': ['node', 'grafana']}
+                },
+                'children': {
+                    'edge': {
+                        'vars': {'site': 'edge'},
+                        'hosts': {
+                            'edge-1': {'ansible_host': '10.0.0.6', 'node_exporter_port': 9101},
+                            'mon-1': {'grafana_port': 3001}
+                        }
+                    }
+                }
+            },
+            'bots': {
+                'hosts': {
+                    # Same address and port as mon-1's node exporter
+                    'bot-1': {'ansible_host': '10.0.0.5'},
+                    'bot-2': {'ansible_host': '10.0.0.7', 'scrape_jobs': ['discord-bot', 'bogus']}
+                }
+            }
+        }
+    }
+}
+
+
+def write_inventory(path, inventory=INVENTORY):
+    path.write_text(yaml.safe_dump(inventory, sort_keys=False))
+    return str(path)
+
+
+def test_vars_merge_from_all_through_child_groups_to_host(tmp_path):
+    hosts = read_inventory(write_inventory(tmp_path / 'hosts.yml'))
+
+    mon_vars, mon_groups = hosts['mon-1']
+    assert mon_vars['site'] == 'edge'
+    assert mon_vars['grafana_port'] == 3001
+    assert mon_vars['node_exporter_port'] == 9100
+    assert mon_groups == ['monitoring', 'edge']
+    assert hosts['edge-1'][0]['node_exporter_port'] == 9101
+    assert hosts['bot-1'] == ({'node_exporter_port': 9100, 'site': 'all', 'ansible_host': '10.0.0.5'}, ['bots'])
+
+
+def test_duplicate_targets_are_kept_once(tmp_path):
+    hosts = read_inventory(write_inventory(tmp_path / 'hosts.yml'))
+
+    groups, duplicates = build_target_groups(hosts, {})
+
+    targets = {(group['labels']['job'], group['labels']['hostname']): group['targets'][0] for group in groups}
+    assert targets == {
+        ('discord-bot', 'bot-2'): '10.0.0.7:8080',
+        ('grafana', 'mon-1'): '10.0.0.5:3001',
+        ('node', 'edge-1'): '10.0.0.6:9101',
+        ('node', 'mon-1'): '10.0.0.5:9100'
+    }
+    assert duplicates == [('10.0.0.5:9100', 'bot-1/node', 'mon-1/node')]
+    edge = next(group for group in groups if group['labels']['hostname'] == 'edge-1')
+    assert edge['labels']['group'] == 'monitoring'
+    assert edge['labels']['__meta_ansible_groups'] == ',monitoring,edge,'
+
+
+def test_terraform_outputs_override_ansible_host():
+    hosts = {
+        'web-1': ({'ansible_host': '10.0.0.1'}, ['web']),
+        'web-2': ({'ansible_host': '10.0.0.2', 'terraform_output': 'web_public'}, ['web']),
+        'web-3': ({'ansible_host': '10.0.0.3'}, ['web'])
+    }
+    outputs = {'web_1_ip': '192.0.2.1', 'web_public': '192.0.2.2', 'web_3_ip': ['not', 'an', 'address']}
+
+    groups, _ = build_target_groups(hosts, outputs)
+
+    assert [group['targets'][0] for group in groups] == ['192.0.2.1:9100', '192.0.2.2:9100', '10.0.0.3:9100']
+
+
+def test_etag_matching():
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('W/"abc"', '"abc"')
+    assert etag_matches('"xyz", "abc"', '"abc"')
+    assert etag_matches('*', '"abc"')
+    assert not etag_matches('"xyz"', '"abc"')
+    assert not etag_matches(None, '"abc"')
+
+
+@pytest.fixture
+def server(tmp_path):
+    discovery = Discovery(write_inventory(tmp_path / 'hosts.yml'), str(tmp_path / 'outputs.json'))
+    discovery.refresh(force=True)
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(discovery))
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield discovery, f"http://127.0.0.1:{httpd.server_address[1]}"
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def get(url, etag=None):
+    request = urllib.request.Request(url, headers={'If-None-Match': etag} if etag else {})
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status, response.headers.get('ETag'), response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers.get('ETag'), e.read()
+
+
+def test_http_sd_answers_304_until_the_targets_change(server, tmp_path):
+    discovery, url = server
+
+    status, etag, body = get(f"{url}/targets?job=node")
+    assert status == 200
+    assert [group['labels']['hostname'] for group in json.loads(body)] == ['edge-1', 'mon-1']
+    assert get(f"{url}/targets?job=node", etag)[:2] == (304, etag)
+    assert get(f"{url}/targets?job=node", 'W/' + etag)[0] == 304
+    assert get(f"{url}/targets", etag)[0] == 200
+    assert get(f"{url}/targets?job=awx")[2] == b'[]'
+
+    inventory = yaml.safe_load(yaml.safe_dump(INVENTORY))
+    inventory['all']['children']['bots']['hosts']['bot-1']['ansible_host'] = '10.0.0.18'
+    write_inventory(tmp_path / 'hosts.yml', inventory)
+    assert discovery.refresh()
+
+    status, new_etag, body = get(f"{url}/targets?job=node", etag)
+    assert status == 200
+    assert new_etag != etag
+    assert len(json.loads(body)) == 3
+
+
+def test_broken_inventory_keeps_the_last_good_build(server, tmp_path):
+    discovery, url = server
+    before = get(f"{url}/targets")
+
+    (tmp_path / 'hosts.yml').write_text('all: [unclosed\n')
+
+    assert not discovery.refresh()
+    assert discovery.error.startswith("Can't read inventory")
+    assert get(f"{url}/targets") == before
+    status, _, body = get(f"{url}/healthz")
+    assert status == 200
+    assert json.loads(body)['error'] == discovery.error
+
+
+def test_write_atomic_replaces_only_on_change(tmp_path):
+    path = tmp_path / 'targets' / 'inventory.yml'
+
+    assert write_atomic(str(path), 'first\n')
+    assert not write_atomic(str(path), 'first\n')
+    assert write_atomic(str(path), 'second\n')
+    assert path.read_text() == 'second\n'
+    assert oct(path.stat().st_mode & 0o777) == oct(0o644)
+    assert os.listdir(path.parent) == ['inventory.yml']
+
+
+def test_failed_write_leaves_the_old_file_and_no_temp_file(tmp_path, monkeypatch):
+    path = tmp_path / 'inventory.yml'
+    path.write_text('old\n')
+
+    def fail(source, destination):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(target_discovery.os, 'replace', fail)
+    with pytest.raises(OSError):
+        write_atomic(str(path), 'new\n')
+
+    assert path.read_text() == 'old\n'
+    assert os.listdir(tmp_path) == ['inventory.yml']
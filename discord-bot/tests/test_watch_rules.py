@@ -0,0 +1,113 @@
+"""
+Watch Rules Tests
+Tokenizing, keyword/phrase/regex matching, the channel filter and
+notification throttling.
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')))
+
+from watch_rules import WatchRules, tokenize  # noqa: E402
+
+
+def rules(*rule_configs, throttle=300):
+    return WatchRules({'throttle': throttle, 'rules': list(rule_configs)})
+
+
+def names(hits):
+    return {rule.name: text for rule, text in hits.items()}
+
+
+def test_tokenize_keeps_hostnames_and_ips_whole():
+    assert tokenize('Is vice-bot-one (172.236.225.9) DOWN?!') == ['is', 'vice-bot-one', '172.236.225.9', 'down']
+    assert tokenize('"Outage" on node_exporter.') == ['outage', 'on', 'node_exporter']
+
+
+def test_keywords_match_whole_tokens_only():
+    watch = rules({'name': 'outage', 'keywords': ['down']})
+
+    assert names(watch.match('the API is DOWN again')) == {'outage': 'down'}
+    assert watch.match('downtime window tonight') == {}
+
+
+def test_phrases_match_consecutive_tokens():
+    watch = rules({'name': 'degraded', 'keywords': ['packet loss', 'timed out']})
+
+    assert names(watch.match('seeing packet loss to the DB')) == {'degraded': 'packet loss'}
+    assert names(watch.match('lost a packet, then packet   loss!')) == {'degraded': 'packet loss'}
+    assert watch.match('packet sizes and loss budgets') == {}
+
+
+def test_overlapping_regexes_of_different_rules_all_match():
+    watch = rules(
+        {'name': 'http-5xx', 'regex': r'HTTP 5\d\d'},
+        {'name': 'server-error', 'regex': r'5\d\d error'}
+    )
+
+    assert names(watch.match('got HTTP 503 error from upstream')) == {
+        'http-5xx': 'HTTP 503',
+        'server-error': '503 error'
+    }
+    assert watch.match('all green') == {}
+
+
+def test_regexes_that_cannot_be_joined_still_match():
+    watch = rules(
+        {'name': 'flags', 'regex': r'(?s)disk.full'},
+        {'name': 'repeat', 'regex': r'(\w+) \1'},
+        {'name': 'named', 'regexes': [r'(?P<code>5\d\d) (?P=code)', r'(?P<code>oom)']},
+        {'name': 'plain', 'regex': r'no space left'}
+    )
+
+    assert names(watch.match('disk\nfull: no space left')) == {'flags': 'disk\nfull', 'plain': 'no space left'}
+    assert names(watch.match('error error 503 503 OOM')) == {'repeat': 'error error', 'named': '503 503'}
+
+
+def test_invalid_rules_raise_and_keep_the_previous_set():
+    watch = rules({'name': 'outage', 'keywords': ['down']})
+
+    with pytest.raises(ValueError):
+        watch.compile({'rules': [{'name': 'broken', 'regex': '(unclosed'}]})
+    with pytest.raises(ValueError):
+        watch.compile({'rules': [{'name': 'twice'}, {'name': 'twice'}]})
+
+    assert list(watch.rules) == ['outage']
+    assert names(watch.match('down')) == {'outage': 'down'}
+
+
+def test_channel_filter():
+    watch = rules(
+        {'name': 'logs-only', 'keywords': ['error'], 'channels': ['#logs']},
+        {'name': 'anywhere', 'keywords': ['error']}
+    )
+
+    assert set(names(watch.match('error', channel='logs'))) == {'logs-only', 'anywhere'}
+    assert set(names(watch.match('error', channel='general'))) == {'anywhere'}
+
+
+def test_notifications_are_throttled_per_rule_and_channel():
+    watch = rules({'name': 'outage', 'keywords': ['down']}, throttle=60)
+    rule = watch.rules['outage']
+
+    assert watch.should_notify(rule, 1, now=1000)
+    assert not watch.should_notify(rule, 1, now=1030)
+    assert not watch.should_notify(rule, 1, now=1059)
+    assert watch.should_notify(rule, 2, now=1059)
+    assert rule.suppressed == {1: 2}
+    assert watch.should_notify(rule, 1, now=1061)
+
+
+def test_reload_keeps_state_of_surviving_rules():
+    watch = rules({'name': 'outage', 'keywords': ['down']})
+    watch.match('down')
+    watch.should_notify(watch.rules['outage'], 1, now=1000)
+
+    watch.compile({'rules': [{'name': 'outage', 'keywords': ['offline']}]})
+
+    assert watch.rules['outage'].hits == 1
+    assert 1 in watch.rules['outage'].last_notified
+    assert names(watch.match('server offline')) == {'outage': 'offline'}
@@ -0,0 +1,1042 @@
+#!/usr/bin/env python3
+"""
+Alert Rule Backtest
+Replays prometheus/rules/*.yml against recorded history to show when
+each alert would have fired. Series are held as NumPy matrices (one row
+per series, one column per evaluation step), so every rule is evaluated
+over the whole range at once rather than step by step. Recording rules
+are evaluated first and feed the alerts that use them.
+
+Supported PromQL: selectors with matchers and offset; rate, irate,
+increase, abs, time, histogram_quantile and {min,max,avg,sum}_over_time;
+sum/avg/min/max/count with by/without; arithmetic, comparisons (with
+bool) and and/or/unless with on/ignoring/group_left/group_right.
+Anything else is reported as unsupported rather than guessed.
+
+History comes from a fixture: either an .npz recorded with --record, or
+the JSON `result` of a Prometheus query_range (optionally gzipped) with
+a top-level "step". Rate windows are computed from the samples on the
+fixture's step grid, so record at the scrape interval for results close
+to what Prometheus evaluates.
+
+Usage:
+    python scripts/rule_backtest.py --prometheus http://localhost:9090 --range 7d --record week.npz
+    python scripts/rule_backtest.py --fixture week.npz
+    python scripts/rule_backtest.py --fixture week.npz --alert HighCPUUsage --output report.json
+"""
+
+import argparse
+import glob
+import gzip
+import json
+import math
+import operator
+import os
+import re
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import warnings
+from collections import namedtuple
+from datetime import datetime, timezone
+
+import numpy as np
+import yaml
+
+REPO_ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+DEFAULT_RULES = os.path.join(REPO_ROOT, 'prometheus', 'rules', '*.yml')
+
+DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800, 'y': 31536000}
+DURATION_RE = re.compile(r'(\d+)(ms|[smhdwy])')
+
+# Prometheus rejects query_range calls returning more than 11000 points per series
+MAX_POINTS_PER_QUERY = 10000
+
+
+class BacktestError(Exception):
+    """A rule can't be evaluated: unsupported syntax or invalid matching"""
+
+
+def parse_duration(text):
+    """Seconds from a Prometheus duration such as "5m" or "1h30m" """
+    text = str(text).strip()
+    parts = DURATION_RE.findall(text)
+    if not parts or ''.join(number + unit for number, unit in parts) != text:
+        raise ValueError(f"invalid duration '{text}'")
+    return sum(int(number) * DURATION_UNITS[unit] for number, unit in parts)
+
+
+def format_duration(seconds):
+    seconds = int(round(seconds))
+    if seconds == 0:
+        return '0s'
+    parts = []
+    for unit, size in (('d', 86400), ('h', 3600), ('m', 60), ('s', 1)):
+        if seconds >= size:
+            parts.append(f"{seconds // size}{unit}")
+            seconds %= size
+    return ''.join(parts[:2])
+
+
+def format_labels(labels):
+    return '{' + ', '.join(f'{key}="{value}"' for key, value in sorted(labels.items()) if key != '__name__') + '}'
+
+
+# -- parsing -------------------------------------------------------------
+
+TOKEN_RE = re.compile(r'''
+    (?P<space>\s+|\#[^\n]*)
+  | (?P<duration>(?:\d+(?:ms|[smhdwy]))+)(?![\w:.])
+  | (?P<number>0[xX][0-9a-fA-F]+|(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<ident>[a-zA-Z_:][\w:]*)
+  | (?P<string>"(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')
+  | (?P<op>==|!=|>=|<=|=~|!~|[-+*/%^<>=(){}\[\],])
+''', re.VERBOSE)
+
+Num = namedtuple('Num', 'value')
+Selector = namedtuple('Selector', 'name matchers range offset')
+Call = namedtuple('Call', 'func args')
+Aggregate = namedtuple('Aggregate', 'op grouping labels expr')
+Binary = namedtuple('Binary', 'op lhs rhs bool matching match_labels group group_labels')
+Negate = namedtuple('Negate', 'expr')
+
+AGGREGATIONS = ('sum', 'avg', 'min', 'max', 'count')
+SET_OPS = ('and', 'or', 'unless')
+COMPARISONS = ('==', '!=', '>', '<', '>=', '<=')
+PRECEDENCE = {
+    'or': 1, 'and': 2, 'unless': 2,
+    '==': 3, '!=': 3, '>': 3, '<': 3, '>=': 3, '<=': 3,
+    '+': 4, '-': 4, '*': 5, '/': 5, '%': 5, '^': 6
+}
+
+
+def tokenize(text):
+    tokens = []
+    position = 0
+    while position < len(text):
+        match = TOKEN_RE.match(text, position)
+        if not match:
+            raise BacktestError(f"unexpected character {text[position]!r} at {position}")
+        position = match.end()
+        if match.lastgroup != 'space':
+            tokens.append((match.lastgroup, match.group()))
+    return tokens
+
+
+class Parser:
+    """Recursive-descent parser for the supported PromQL subset"""
+
+    def __init__(self, text):
+        self.tokens = tokenize(text)
+        self.position = 0
+
+    def peek(self, offset=0):
+        index = self.position + offset
+        return self.tokens[index] if index < len(self.tokens) else (None, None)
+
+    def take(self, value=None):
+        kind, text = self.peek()
+        if kind is None:
+            raise BacktestError("unexpected end of expression")
+        if value is not None and text != value:
+            raise BacktestError(f"expected '{value}', got '{text}'")
+        self.position += 1
+        return kind, text
+
+    def parse(self):
+        expr = self.expression(1)
+        if self.peek()[0] is not None:
+            raise BacktestError(f"unexpected '{self.peek()[1]}'")
+        return expr
+
+    def binary_operator(self):
+        kind, text = self.peek()
+        if kind == 'op' and text in PRECEDENCE:
+            return text
+        if kind == 'ident' and text in SET_OPS:
+            return text
+        return None
+
+    def expression(self, min_precedence):
+        lhs = self.unary()
+        while True:
+            op = self.binary_operator()
+            if op is None or PRECEDENCE[op] < min_precedence:
+                return lhs
+            self.take()
+            return_bool = False
+            if self.peek() == ('ident', 'bool'):
+                self.take()
+                return_bool = True
+            matching, match_labels, group, group_labels = None, (), None, ()
+            if self.peek()[1] in ('on', 'ignoring'):
+                matching = self.take()[1]
+                match_labels = self.label_list()
+            if self.peek()[1] in ('group_left', 'group_right'):
+                group = self.take()[1]
+                if self.peek()[1] == '(':
+                    group_labels = self.label_list()
+            # ^ is right-associative, everything else left
+            next_precedence = PRECEDENCE[op] if op == '^' else PRECEDENCE[op] + 1
+            rhs = self.expression(next_precedence)
+            lhs = Binary(op, lhs, rhs, return_bool, matching, match_labels, group, group_labels)
+
+    def unary(self):
+        if self.peek() in (('op', '-'), ('op', '+')):
+            sign = self.take()[1]
+            expr = self.expression(PRECEDENCE['^'])
+            return Negate(expr) if sign == '-' else expr
+        return self.postfix(self.primary())
+
+    def postfix(self, expr):
+        if self.peek()[1] == '[':
+            if not isinstance(expr, Selector):
+                raise BacktestError("subqueries are not supported")
+            self.take('[')
+            kind, text = self.take()
+            if kind != 'duration':
+                raise BacktestError(f"expected a range duration, got '{text}'")
+            self.take(']')
+            expr = expr._replace(range=parse_duration(text))
+        if self.peek() == ('ident', 'offset'):
+            if not isinstance(expr, Selector):
+                raise BacktestError("offset only applies to selectors")
+            self.take()
+            kind, text = self.take()
+            if kind != 'duration':
+                raise BacktestError(f"expected an offset duration, got '{text}'")
+            expr = expr._replace(offset=parse_duration(text))
+        return expr
+
+    def label_list(self):
+        self.take('(')
+        labels = []
+        while self.peek()[1] != ')':
+            kind, text = self.take()
+            if kind != 'ident':
+                raise BacktestError(f"expected a label name, got '{text}'")
+            labels.append(text)
+            if self.peek()[1] == ',':
+                self.take()
+        self.take(')')
+        return tuple(labels)
+
+    def matchers(self):
+        self.take('{')
+        matchers = []
+        while self.peek()[1] != '}':
+            kind, label = self.take()
+            if kind != 'ident':
+                raise BacktestError(f"expected a label name, got '{label}'")
+            _, op = self.take()
+            if op not in ('=', '!=', '=~', '!~'):
+                raise BacktestError(f"invalid matcher operator '{op}'")
+            kind, value = self.take()
+            if kind != 'string':
+                raise BacktestError(f"expected a quoted label value, got '{value}'")
+            matchers.append((label, op, json.loads('"' + value[1:-1].replace('"', '\\"') + '"')))
+            if self.peek()[1] == ',':
+                self.take()
+        self.take('}')
+        return tuple(matchers)
+
+    def primary(self):
+        kind, text = self.peek()
+        if kind == 'number':
+            self.take()
+            return Num(float(int(text, 16)) if text.lower().startswith('0x') else float(text))
+        if kind == 'duration':
+            raise BacktestError(f"unexpected duration '{text}'")
+        if kind == 'string':
+            raise BacktestError("string literals are not supported")
+        if text == '(':
+            self.take()
+            expr = self.expression(1)
+            self.take(')')
+            return expr
+        if text == '{':
+            return Selector(None, self.matchers(), None, 0)
+        if kind != 'ident':
+            raise BacktestError(f"unexpected '{text}'")
+
+        self.take()
+        if text in AGGREGATIONS and self.peek()[1] in ('(', 'by', 'without'):
+            grouping, labels = None, ()
+            if self.peek()[1] in ('by', 'without'):
+                grouping = self.take()[1]
+                labels = self.label_list()
+            self.take('(')
+            expr = self.expression(1)
+            if self.peek()[1] == ',':
+                raise BacktestError(f"parameters to {text}() are not supported")
+            self.take(')')
+            if grouping is None and self.peek()[1] in ('by', 'without'):
+                grouping = self.take()[1]
+                labels = self.label_list()
+            return Aggregate(text, grouping, labels, expr)
+        if self.peek()[1] == '(':
+            self.take('(')
+            args = []
+            while self.peek()[1] != ')':
+                args.append(self.expression(1))
+                if self.peek()[1] == ',':
+                    self.take()
+            self.take(')')
+            return Call(text, tuple(args))
+        matchers = self.matchers() if self.peek()[1] == '{' else ()
+        return Selector(text, matchers, None, 0)
+
+
+def selector_names(expr):
+    """Metric names a parsed expression reads"""
+    if isinstance(expr, Selector):
+        names = {expr.name} if expr.name else set()
+        names.update(value for label, op, value in expr.matchers if label == '__name__' and op == '=')
+        return names
+    if isinstance(expr, Call):
+        return set().union(*(selector_names(arg) for arg in expr.args)) if expr.args else set()
+    if isinstance(expr, Aggregate):
+        return selector_names(expr.expr)
+    if isinstance(expr, Binary):
+        return selector_names(expr.lhs) | selector_names(expr.rhs)
+    if isinstance(expr, Negate):
+        return selector_names(expr.expr)
+    return set()
+
+
+# -- fixtures --------------------------------------------------------------
+
+class Fixture:
+    """Aligned history: per metric, a label list and an (n series, n steps) matrix"""
+
+    def __init__(self, start, step, points, source):
+        self.start = start
+        self.step = step
+        self.points = points
+        self.source = source
+        self.timestamps = start + step * np.arange(points, dtype=np.float64)
+        self._metrics = {}
+        self._lazy = None
+        self._lazy_names = set()
+
+    def names(self):
+        return set(self._metrics) | self._lazy_names
+
+    def get(self, name):
+        if name not in self._metrics and name in self._lazy_names:
+            labels = json.loads(str(self._lazy[f"{name}.labels"]))
+            self._metrics[name] = (labels, self._lazy[f"{name}.values"])
+        return self._metrics.get(name)
+
+    @property
+    def series_count(self):
+        return sum(len(self.get(name)[0]) for name in self.names())
+
+    @classmethod
+    def load(cls, path):
+        if path.endswith('.npz'):
+            archive = np.load(path)
+            meta = json.loads(str(archive['meta']))
+            fixture = cls(meta['start'], meta['step'], meta['points'], path)
+            fixture._lazy = archive
+            fixture._lazy_names = set(meta['metrics'])
+            return fixture
+
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rt') as file:
+            data = json.load(file)
+        result = data.get('result', data.get('data', {}).get('result', []))
+        if not result:
+            raise ValueError(f"{path} has no series")
+        stamps = [float(sample[0]) for series in result for sample in series['values']]
+        step = float(data['step'])
+        start = min(stamps)
+        points = int(round((max(stamps) - start) / step)) + 1
+        fixture = cls(start, step, points, path)
+        fixture.add_series(result)
+        return fixture
+
+    def add_series(self, result):
+        """Merge query_range result series into the matrices"""
+        grouped = {}
+        for series in result:
+            labels = dict(series['metric'])
+            name = labels.get('__name__')
+            if not name or not series.get('values'):
+                continue
+            values = np.array(series['values'], dtype=np.float64)
+            columns = np.rint((values[:, 0] - self.start) / self.step).astype(np.int64)
+            keep = (columns >= 0) & (columns < self.points)
+            grouped.setdefault(name, []).append((labels, columns[keep], values[keep, 1]))
+
+        for name, entries in grouped.items():
+            labels, matrix = self._metrics.get(name, ([], np.empty((0, self.points))))
+            index = {json.dumps(item, sort_keys=True): row for row, item in enumerate(labels)}
+            rows = []
+            for series_labels, columns, values in entries:
+                key = json.dumps(series_labels, sort_keys=True)
+                if key not in index:
+                    index[key] = len(labels) + len(rows)
+                    rows.append(series_labels)
+            if rows:
+                matrix = np.vstack([matrix, np.full((len(rows), self.points), np.nan)])
+                labels = labels + rows
+            for series_labels, columns, values in entries:
+                matrix[index[json.dumps(series_labels, sort_keys=True)], columns] = values
+            self._metrics[name] = (labels, matrix)
+
+    def save(self, path):
+        arrays = {'meta': np.array(json.dumps({
+            'start': self.start, 'step': self.step, 'points': self.points, 'metrics': sorted(self.names())
+        }))}
+        for name in self.names():
+            labels, matrix = self.get(name)
+            arrays[f"{name}.labels"] = np.array(json.dumps(labels))
+            arrays[f"{name}.values"] = matrix
+        np.savez_compressed(path, **arrays)
+
+
+def record(prometheus_url, names, start, end, step, timeout=60):
+    """Pull raw history for ``names`` from Prometheus into a Fixture"""
+    start = math.floor(start / step) * step
+    points = int((end - start) // step) + 1
+    fixture = Fixture(start, step, points, prometheus_url)
+    chunk = MAX_POINTS_PER_QUERY * step
+    for name in sorted(names):
+        chunk_start = start
+        while chunk_start <= end:
+            chunk_end = min(end, chunk_start + chunk - step)
+            query = urllib.parse.urlencode({
+                'query': f'{{__name__="{name}"}}',
+                'start': chunk_start, 'end': chunk_end, 'step': step
+            })
+            url = f"{prometheus_url.rstrip('/')}/api/v1/query_range?{query}"
+            with urllib.request.urlopen(url, timeout=timeout) as response:
+                body = json.load(response)
+            if body.get('status') != 'success':
+                raise RuntimeError(f"query for {name} failed: {body.get('error')}")
+            fixture.add_series(body['data']['result'])
+            chunk_start = chunk_end + step
+        series = fixture.get(name)
+        print(f"  {name}: {len(series[0]) if series else 0} series", file=sys.stderr)
+    return fixture
+
+
+# -- evaluation --------------------------------------------------------------
+
+class Vector:
+    __slots__ = ('labels', 'values')
+
+    def __init__(self, labels, values):
+        self.labels = labels
+        self.values = values
+
+
+class Scalar:
+    __slots__ = ('values',)
+
+    def __init__(self, values):
+        self.values = values
+
+
+class RangeVector:
+    __slots__ = ('vector', 'seconds', 'steps')
+
+    def __init__(self, vector, seconds, steps):
+        self.vector = vector
+        self.seconds = seconds
+        self.steps = steps
+
+
+ARITHMETIC = {
+    '+': np.add, '-': np.subtract, '*': np.multiply, '/': np.divide,
+    '%': np.fmod, '^': np.power
+}
+COMPARE = {
+    '==': operator.eq, '!=': operator.ne, '>': operator.gt,
+    '<': operator.lt, '>=': operator.ge, '<=': operator.le
+}
+
+
+def shift(matrix, steps):
+    """Move columns right by ``steps``, filling the gap with NaN"""
+    if steps <= 0:
+        return matrix
+    shifted = np.full_like(matrix, np.nan)
+    if steps < matrix.shape[-1]:
+        shifted[..., steps:] = matrix[..., :-steps]
+    return shifted
+
+
+def drop_name(labels):
+    return [{key: value for key, value in item.items() if key != '__name__'} for item in labels]
+
+
+def counter_adjusted(matrix):
+    """Add back the value lost at each counter reset so differences stay monotonic"""
+    previous = matrix[:, :-1]
+    resets = matrix[:, 1:] < previous
+    correction = np.cumsum(np.where(resets, previous, 0.0), axis=1)
+    adjusted = matrix.copy()
+    adjusted[:, 1:] += correction
+    return adjusted
+
+
+def window_extreme(matrix, steps, combine):
+    """max/min over a sliding window of ``steps`` columns in O(log steps) passes"""
+    result = matrix
+    covered = 1
+    while covered * 2 <= steps:
+        result = combine(result, shift(result, covered))
+        covered *= 2
+    if covered < steps:
+        result = combine(result, shift(result, steps - covered))
+    return result
+
+
+def window_sum(matrix, steps):
+    """Sum and count of present samples over a sliding window of ``steps`` columns"""
+    present = ~np.isnan(matrix)
+    zeros = np.zeros((matrix.shape[0], 1))
+    totals = np.concatenate([zeros, np.cumsum(np.where(present, matrix, 0.0), axis=1)], axis=1)
+    counts = np.concatenate([zeros, np.cumsum(present, axis=1, dtype=np.float64)], axis=1)
+    upper = np.arange(1, matrix.shape[1] + 1)
+    lower = np.maximum(upper - steps, 0)
+    return totals[:, upper] - totals[:, lower], counts[:, upper] - counts[:, lower]
+
+
+class Evaluator:
+    """Evaluates parsed expressions over every step of a Fixture at once"""
+
+    def __init__(self, fixture):
+        self.fixture = fixture
+        self.step = fixture.step
+        self.points = fixture.points
+        self.recorded = {}
+        self.missing = set()
+        self.warnings = []
+
+    def evaluate(self, expr):
+        self.missing = set()
+        self.warnings = []
+        with np.errstate(all='ignore'), warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            result = self._eval(expr)
+        if isinstance(result, RangeVector):
+            raise BacktestError("expression returns a range vector")
+        if isinstance(result, Scalar):
+            values = np.broadcast_to(result.values, (self.points,)).astype(np.float64)
+            result = Vector([{}], values[np.newaxis, :].copy())
+        return result
+
+    def steps(self, seconds):
+        return max(1, int(round(seconds / self.step)))
+
+    def _eval(self, expr):
+        if isinstance(expr, Num):
+            return Scalar(np.float64(expr.value))
+        if isinstance(expr, Selector):
+            return self._select(expr)
+        if isinstance(expr, Negate):
+            value = self._eval(expr.expr)
+            if isinstance(value, Scalar):
+                return Scalar(-value.values)
+            return Vector(drop_name(value.labels), -value.values)
+        if isinstance(expr, Call):
+            return self._call(expr)
+        if isinstance(expr, Aggregate):
+            return self._aggregate(expr)
+        if isinstance(expr, Binary):
+            return self._binary(expr)
+        raise BacktestError(f"unsupported expression {expr!r}")
+
+    def _select(self, selector):
+        names = [selector.name] if selector.name else [
+            value for label, op, value in selector.matchers if label == '__name__' and op == '='
+        ]
+        if not names:
+            raise BacktestError("selectors without a metric name are not supported")
+        name = names[0]
+        source = self.recorded.get(name) or self.fixture.get(name)
+        if source is None:
+            self.missing.add(name)
+            labels, matrix = [], np.empty((0, self.points))
+        else:
+            labels, matrix = source
+            rows = [
+                row for row, item in enumerate(labels)
+                if all(self._matches(item.get(label, ''), op, value) for label, op, value in selector.matchers)
+            ]
+            labels = [labels[row] for row in rows]
+            matrix = matrix[rows]
+            if not rows:
+                self.missing.add(name + '{' + ', '.join(f'{l}{o}"{v}"' for l, o, v in selector.matchers) + '}')
+        if selector.offset:
+            matrix = shift(matrix, self.steps(selector.offset))
+        vector = Vector(labels, matrix)
+        if selector.range is not None:
+            return RangeVector(vector, selector.range, self.steps(selector.range))
+        return vector
+
+    @staticmethod
+    def _matches(actual, op, value):
+        if op == '=':
+            return actual == value
+        if op == '!=':
+            return actual != value
+        matched = re.fullmatch(value, actual) is not None
+        return matched if op == '=~' else not matched
+
+    # -- functions --
+
+    def _call(self, call):
+        func, args = call.func, call.args
+        if func == 'time':
+            return Scalar(self.fixture.timestamps)
+        if func in ('rate', 'irate', 'increase') or func.endswith('_over_time'):
+            if len(args) != 1:
+                raise BacktestError(f"{func}() takes one range vector")
+            window = self._eval(args[0])
+            if not isinstance(window, RangeVector):
+                raise BacktestError(f"{func}() needs a range vector")
+            return Vector(drop_name(window.vector.labels), self._range_function(func, window))
+        if func == 'abs':
+            value = self._eval(args[0])
+            if isinstance(value, Scalar):
+                return Scalar(np.abs(value.values))
+            return Vector(drop_name(value.labels), np.abs(value.values))
+        if func == 'histogram_quantile':
+            quantile = self._eval(args[0])
+            vector = self._eval(args[1])
+            if not isinstance(quantile, Scalar) or not isinstance(vector, Vector):
+                raise BacktestError("histogram_quantile() takes a scalar and a vector")
+            return self._histogram_quantile(float(np.mean(quantile.values)), vector)
+        raise BacktestError(f"function {func}() is not supported")
+
+    def _range_function(self, func, window):
+        matrix, steps = window.vector.values, window.steps
+        if func in ('rate', 'increase'):
+            if steps < 2:
+                raise BacktestError(f"{func}() range is shorter than two fixture steps")
+            adjusted = counter_adjusted(matrix)
+            # Samples in (t - range, t]: first is steps - 1 columns back
+            per_second = (adjusted - shift(adjusted, steps - 1)) / ((steps - 1) * self.step)
+            return per_second * window.seconds if func == 'increase' else per_second
+        if func == 'irate':
+            previous = shift(matrix, 1)
+            delta = np.where(matrix < previous, matrix, matrix - previous)
+            return delta / self.step
+        if func == 'max_over_time':
+            return window_extreme(matrix, steps, np.fmax)
+        if func == 'min_over_time':
+            return window_extreme(matrix, steps, np.fmin)
+        if func in ('sum_over_time', 'avg_over_time'):
+            totals, counts = window_sum(matrix, steps)
+            totals[counts == 0] = np.nan
+            return totals if func == 'sum_over_time' else totals / counts
+        raise BacktestError(f"function {func}() is not supported")
+
+    def _histogram_quantile(self, quantile, vector):
+        groups = {}
+        for row, labels in enumerate(vector.labels):
+            if 'le' not in labels:
+                continue
+            key = tuple(sorted((k, v) for k, v in labels.items() if k not in ('le', '__name__')))
+            groups.setdefault(key, []).append((float(labels['le']), row))
+
+        out_labels, out_rows = [], []
+        for key, buckets in groups.items():
+            buckets.sort()
+            bounds = np.array([bound for bound, _ in buckets])
+            counts = vector.values[[row for _, row in buckets]]
+            if len(bounds) < 2 or not np.isinf(bounds[-1]):
+                continue
+            counts = np.maximum.accumulate(np.nan_to_num(counts), axis=0)
+            total = counts[-1]
+            rank = quantile * total
+            index = np.argmax(counts >= rank, axis=0)
+            upper_count = np.take_along_axis(counts, index[np.newaxis, :], axis=0)[0]
+            lower_count = np.where(index > 0, np.take_along_axis(counts, np.maximum(index - 1, 0)[np.newaxis, :], axis=0)[0], 0.0)
+            upper = bounds[index]
+            lower = np.where(index > 0, bounds[np.maximum(index - 1, 0)], 0.0)
+            width = upper_count - lower_count
+            values = lower + (upper - lower) * np.where(width > 0, (rank - lower_count) / width, 0.0)
+            # Ranks landing in the +Inf bucket report the highest finite bound
+            values = np.where(np.isinf(upper), bounds[-2], values)
+            values[~(total > 0)] = np.nan
+            out_labels.append(dict(key))
+            out_rows.append(values)
+        matrix = np.vstack(out_rows) if out_rows else np.empty((0, self.points))
+        return Vector(out_labels, matrix)
+
+    # -- aggregation --
+
+    def _aggregate(self, aggregate):
+        vector = self._eval(aggregate.expr)
+        if not isinstance(vector, Vector):
+            raise BacktestError(f"{aggregate.op}() needs an instant vector")
+        groups = {}
+        for row, labels in enumerate(vector.labels):
+            if aggregate.grouping == 'by':
+                key = tuple((label, labels[label]) for label in aggregate.labels if label in labels)
+            elif aggregate.grouping == 'without':
+                key = tuple(sorted(
+                    (k, v) for k, v in labels.items() if k not in aggregate.labels and k != '__name__'
+                ))
+            else:
+                key = ()
+            groups.setdefault(key, []).append(row)
+
+        out_labels, out_rows = [], []
+        for key, rows in groups.items():
+            matrix = vector.values[rows]
+            present = ~np.isnan(matrix)
+            count = present.sum(axis=0).astype(np.float64)
+            if aggregate.op == 'sum':
+                values = np.nansum(matrix, axis=0)
+            elif aggregate.op == 'avg':
+                values = np.nanmean(matrix, axis=0)
+            elif aggregate.op == 'max':
+                values = np.nanmax(matrix, axis=0)
+            elif aggregate.op == 'min':
+                values = np.nanmin(matrix, axis=0)
+            else:
+                values = count
+            values = np.where(count > 0, values, np.nan)
+            out_labels.append(dict(key))
+            out_rows.append(values)
+        matrix = np.vstack(out_rows) if out_rows else np.empty((0, self.points))
+        return Vector(out_labels, matrix)
+
+    # -- binary operators --
+
+    def _binary(self, binary):
+        lhs = self._eval(binary.lhs)
+        rhs = self._eval(binary.rhs)
+        if isinstance(lhs, RangeVector) or isinstance(rhs, RangeVector):
+            raise BacktestError(f"'{binary.op}' needs instant vectors")
+        op = binary.op
+
+        if isinstance(lhs, Scalar) and isinstance(rhs, Scalar):
+            if op in SET_OPS:
+                raise BacktestError(f"'{op}' needs vectors")
+            if op in COMPARISONS:
+                if not binary.bool:
+                    raise BacktestError("comparisons between scalars need bool")
+                return Scalar(COMPARE[op](lhs.values, rhs.values).astype(np.float64))
+            return Scalar(ARITHMETIC[op](lhs.values, rhs.values))
+
+        if isinstance(lhs, Scalar) or isinstance(rhs, Scalar):
+            if op in SET_OPS:
+                raise BacktestError(f"'{op}' needs vectors on both sides")
+            vector = rhs if isinstance(lhs, Scalar) else lhs
+            return self._apply(op, binary.bool, vector.labels, lhs.values, rhs.values, vector.values)
+
+        if op in SET_OPS:
+            return self._set_operation(binary, lhs, rhs)
+        return self._vector_match(binary, lhs, rhs)
+
+    def _apply(self, op, return_bool, labels, left, right, kept):
+        """Arithmetic or comparison over matched rows; ``kept`` is the value a filter keeps"""
+        if op in COMPARISONS:
+            condition = COMPARE[op](left, right)
+            if return_bool:
+                missing = np.isnan(left) | np.isnan(right)
+                values = np.where(missing, np.nan, condition.astype(np.float64))
+                return Vector(drop_name(labels), values)
+            values = np.where(condition, kept, np.nan)
+            keep = ~np.all(np.isnan(values), axis=1)
+            return Vector([item for item, flag in zip(labels, keep) if flag], values[keep])
+        return Vector(drop_name(labels), ARITHMETIC[op](left, right))
+
+    @staticmethod
+    def _signature(labels, binary):
+        if binary.matching == 'on':
+            return tuple(labels.get(label, '') for label in binary.match_labels)
+        ignored = set(binary.match_labels) if binary.matching == 'ignoring' else set()
+        return tuple(sorted((k, v) for k, v in labels.items() if k != '__name__' and k not in ignored))
+
+    def _result_labels(self, labels, binary, extra=None):
+        if binary.matching == 'on' and binary.group is None:
+            result = {label: labels[label] for label in binary.match_labels if label in labels}
+        elif binary.matching == 'ignoring' and binary.group is None:
+            result = {k: v for k, v in labels.items() if k not in binary.match_labels}
+        else:
+            result = dict(labels)
+        if extra:
+            for label in binary.group_labels:
+                if label in extra:
+                    result[label] = extra[label]
+        return result
+
+    def _vector_match(self, binary, lhs, rhs):
+        # group_right is group_left with the sides swapped
+        many, one = (rhs, lhs) if binary.group == 'group_right' else (lhs, rhs)
+        one_index = {}
+        for row, labels in enumerate(one.labels):
+            signature = self._signature(labels, binary)
+            if signature in one_index:
+                side = 'left' if one is lhs else 'right'
+                raise BacktestError(
+                    f"'{binary.op}': many-to-many matching, duplicate series on the {side} side for {signature}"
+                )
+            one_index[signature] = row
+
+        pairs = []
+        seen = set()
+        for row, labels in enumerate(many.labels):
+            signature = self._signature(labels, binary)
+            match = one_index.get(signature)
+            if match is None:
+                continue
+            if binary.group is None:
+                if signature in seen:
+                    raise BacktestError(f"'{binary.op}': many-to-one matching needs group_left/group_right")
+                seen.add(signature)
+            pairs.append((row, match))
+
+        if many.labels and one.labels and not pairs:
+            self.warnings.append(f"no series matched across '{binary.op}' (check on()/ignoring() labels)")
+        if not pairs:
+            return Vector([], np.empty((0, self.points)))
+
+        many_rows = [row for row, _ in pairs]
+        one_rows = [row for _, row in pairs]
+        labels = [self._result_labels(many.labels[m], binary, one.labels[o]) for m, o in pairs]
+        left = many.values[many_rows] if many is lhs else one.values[one_rows]
+        right = one.values[one_rows] if many is lhs else many.values[many_rows]
+        return self._apply(binary.op, binary.bool, labels, left, right, left)
+
+    def _set_operation(self, binary, lhs, rhs):
+        rhs_rows = {}
+        for row, labels in enumerate(rhs.labels):
+            rhs_rows.setdefault(self._signature(labels, binary), []).append(row)
+
+        if binary.op == 'or':
+            signatures = {self._signature(labels, binary) for labels in lhs.labels}
+            extra = [row for row, labels in enumerate(rhs.labels) if self._signature(labels, binary) not in signatures]
+            return Vector(lhs.labels + [rhs.labels[row] for row in extra], np.vstack([lhs.values, rhs.values[extra]]))
+
+        out_labels, out_rows = [], []
+        for row, labels in enumerate(lhs.labels):
+            matched = rhs_rows.get(self._signature(labels, binary), [])
+            present = (~np.isnan(rhs.values[matched])).any(axis=0) if matched else np.zeros(self.points, dtype=bool)
+            keep = present if binary.op == 'and' else ~present
+            values = np.where(keep, lhs.values[row], np.nan)
+            if not np.all(np.isnan(values)):
+                out_labels.append(labels)
+                out_rows.append(values)
+        matrix = np.vstack(out_rows) if out_rows else np.empty((0, self.points))
+        return Vector(out_labels, matrix)
+
+
+# -- alerts ----------------------------------------------------------------
+
+def firing_mask(active, for_steps):
+    """
+    An alert fires once its expression has held for ``for_steps``
+    evaluations in a row; a gap resets the pending timer
+    """
+    if for_steps <= 0:
+        return active
+    run = np.cumsum(active, axis=1)
+    resets = np.maximum.accumulate(np.where(active, 0, run), axis=1)
+    return (run - resets) > for_steps
+
+
+def episodes(firing):
+    """(start, end) column pairs of each firing run; end is exclusive"""
+    padded = np.concatenate([[False], firing, [False]])
+    changes = np.flatnonzero(np.diff(padded.astype(np.int8)))
+    return list(zip(changes[0::2], changes[1::2]))
+
+
+def load_rules(patterns):
+    rules = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)):
+            with open(path, 'r') as file:
+                document = yaml.safe_load(file) or {}
+            for group in document.get('groups') or ():
+                for rule in group.get('rules') or ():
+                    rules.append({**rule, 'file': os.path.basename(path), 'group': group.get('name', '')})
+    return rules
+
+
+def backtest(rules, fixture, alerts=None, flap_window=1800, max_episodes=10):
+    evaluator = Evaluator(fixture)
+    step = fixture.step
+    results = []
+    broken_records = {}
+
+    for rule in rules:
+        if 'record' not in rule:
+            continue
+        try:
+            expr = Parser(str(rule['expr'])).parse()
+            dependencies = [name for name in selector_names(expr) if name in broken_records]
+            if dependencies:
+                raise BacktestError(f"depends on {dependencies[0]}: {broken_records[dependencies[0]]}")
+            vector = evaluator.evaluate(expr)
+        except BacktestError as e:
+            broken_records[rule['record']] = str(e)
+            continue
+        labels = [{**item, **(rule.get('labels') or {}), '__name__': rule['record']} for item in vector.labels]
+        evaluator.recorded[rule['record']] = (labels, vector.values)
+        if evaluator.missing:
+            broken_records[rule['record']] = 'missing series ' + ', '.join(sorted(evaluator.missing))
+
+    for rule in rules:
+        if 'alert' not in rule or (alerts and rule['alert'] not in alerts):
+            continue
+        result = {
+            'alert': rule['alert'], 'file': rule['file'], 'group': rule['group'],
+            'expr': str(rule['expr']).strip(), 'for': rule.get('for', '0s'),
+            'severity': (rule.get('labels') or {}).get('severity', ''),
+            'status': 'ok', 'errors': [], 'warnings': [],
+            'fires': 0, 'flaps': 0, 'firing_seconds': 0.0, 'series': 0, 'episodes': []
+        }
+        results.append(result)
+        try:
+            expr = Parser(result['expr']).parse()
+            vector = evaluator.evaluate(expr)
+        except BacktestError as e:
+            result['status'] = 'unsupported'
+            result['errors'].append(str(e))
+            continue
+
+        result['warnings'] = list(evaluator.warnings)
+        missing = sorted(item for item in evaluator.missing if item.split('{')[0] not in broken_records)
+        for name in sorted(selector_names(expr)):
+            if name in broken_records:
+                missing.append(f"{name} ({broken_records[name]})")
+        if missing:
+            result['status'] = 'missing'
+            result['errors'] = [f"missing series: {item}" for item in missing]
+
+        for_steps = int(math.ceil(parse_duration(result['for']) / step)) if result['for'] else 0
+        firing = firing_mask(~np.isnan(vector.values), for_steps)
+        all_episodes = []
+        for row in np.flatnonzero(firing.any(axis=1)):
+            runs = episodes(firing[row])
+            labels = drop_name([vector.labels[row]])[0]
+            previous_end = None
+            for start, end in runs:
+                if previous_end is not None and (start - previous_end) * step <= flap_window:
+                    result['flaps'] += 1
+                previous_end = end
+                all_episodes.append((start, end, labels))
+        result['fires'] = len(all_episodes)
+        result['series'] = int(firing.any(axis=1).sum())
+        result['firing_seconds'] = float(firing.sum() * step)
+        all_episodes.sort(key=lambda episode: episode[0])
+        result['episodes'] = [
+            {
+                'start': float(fixture.timestamps[start]),
+                'end': float(fixture.timestamps[end]) if end < fixture.points else None,
+                'labels': labels
+            }
+            for start, end, labels in all_episodes[:max_episodes]
+        ]
+    return results
+
+
+def timestamp(value):
+    return datetime.fromtimestamp(value, tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def report(results, fixture, elapsed):
+    print(f"Backtest of {fixture.source}: {timestamp(fixture.start)} to "
+          f"{timestamp(fixture.timestamps[-1])} UTC, step {format_duration(fixture.step)}, "
+          f"{fixture.points} evaluations in {elapsed:.2f}s")
+    print()
+    width = max([len(result['alert']) for result in results] + [5])
+    print(f"{'ALERT':<{width}}  {'FILE':<18} {'FIRES':>5} {'FLAPS':>5} {'FIRING':>8}  STATUS")
+    for result in results:
+        print(f"{result['alert']:<{width}}  {result['file']:<18} {result['fires']:>5} {result['flaps']:>5} "
+              f"{format_duration(result['firing_seconds']):>8}  {result['status']}")
+
+    for result in results:
+        if not (result['episodes'] or result['errors'] or result['warnings']):
+            continue
+        print()
+        print(f"{result['alert']} ({result['file']}, for {result['for']})")
+        for error in result['errors']:
+            print(f"  ! {error}")
+        for warning in result['warnings']:
+            print(f"  ? {warning}")
+        for episode in result['episodes']:
+            end = timestamp(episode['end']) if episode['end'] is not None else 'still firing'
+            duration = (episode['end'] or fixture.timestamps[-1] + fixture.step) - episode['start']
+            print(f"  {timestamp(episode['start'])} -> {end} ({format_duration(duration)}) {format_labels(episode['labels'])}")
+        if result['fires'] > len(result['episodes']):
+            print(f"  ... {result['fires'] - len(result['episodes'])} more")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0], formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rules', action='append', help=f'rule file glob (default {os.path.relpath(DEFAULT_RULES)})')
+    parser.add_argument('--fixture', help='recorded history (.npz, or query_range JSON with "step")')
+    parser.add_argument('--prometheus', help='pull history from this Prometheus instead of a fixture')
+    parser.add_argument('--range', default='7d', help='history to pull with --prometheus (default 7d)')
+    parser.add_argument('--end', type=float, help='end of the pulled range as a Unix timestamp (default now)')
+    parser.add_argument('--step', default='15s', help='resolution to pull with --prometheus (default 15s)')
+    parser.add_argument('--record', help='save the pulled history as an .npz fixture')
+    parser.add_argument('--alert', action='append', help='only backtest these alerts')
+    parser.add_argument('--flap-window', default='30m', help='re-firing within this long of resolving counts as a flap')
+    parser.add_argument('--max-episodes', type=int, default=10, help='firing episodes listed per alert')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--strict', action='store_true', help='exit 1 if any alert is missing series or unsupported')
+    args = parser.parse_args()
+
+    if not args.fixture and not args.prometheus:
+        parser.error("one of --fixture or --prometheus is required")
+    rules = load_rules(args.rules or [DEFAULT_RULES])
+    if not rules:
+        parser.error("no rules found")
+
+    if args.prometheus:
+        names = set()
+        recorded = {rule['record'] for rule in rules if 'record' in rule}
+        for rule in rules:
+            try:
+                names |= selector_names(Parser(str(rule['expr'])).parse())
+            except BacktestError:
+                continue
+        end = args.end or time.time()
+        print(f"Pulling {len(names - recorded)} metrics from {args.prometheus}", file=sys.stderr)
+        try:
+            fixture = record(
+                args.prometheus, names - recorded, end - parse_duration(args.range), end, parse_duration(args.step)
+            )
+        except (urllib.error.URLError, RuntimeError) as e:
+            sys.exit(f"Failed to pull history: {e}")
+        if args.record:
+            fixture.save(args.record)
+            print(f"Saved fixture to {args.record}", file=sys.stderr)
+    else:
+        fixture = Fixture.load(args.fixture)
+
+    started = time.perf_counter()
+    results = backtest(
+        rules, fixture,
+        alerts=set(args.alert) if args.alert else None,
+        flap_window=parse_duration(args.flap_window),
+        max_episodes=args.max_episodes
+    )
+    report(results, fixture, time.perf_counter() - started)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({
+                'start': fixture.start, 'step': fixture.step, 'points': fixture.points,
+                'source': fixture.source, 'alerts': results
+            }, file, indent=2)
+    if args.strict and any(result['status'] != 'ok' for result in results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+"""
+Target Discovery
+Builds Prometheus target groups from the Ansible inventory (and, when
+present, `terraform output -json`) and serves them for http_sd_configs,
+so scrape targets no longer have to be kept by hand in
+prometheus/targets/*.yml.
+
+Every inventory host is scraped by the jobs in its `scrape_jobs` var
+(default: node). Each job's port comes from the usual inventory var,
+e.g. grafana_port; see JOBS. A host's address is its Terraform output
+(`terraform_output` var, or `<host_name>_ip`) when one is set,
+otherwise ansible_host. An address:port that more than one host or job
+resolves to is kept once, for the first of them, so nothing is scraped
+twice.
+
+Responses are rendered once per build and served from memory with an
+ETag; a request with a matching If-None-Match gets 304. Sources are
+polled by mtime and the target groups rebuilt only when one changes.
+With --file-sd the same groups are also written as a file_sd YAML file,
+replaced atomically so Prometheus never reads a partial file.
+
+Usage:
+    terraform -chdir=terraform output -json > terraform/outputs.json
+    python scripts/target_discovery.py --once --file-sd prometheus/targets/inventory.yml
+    python scripts/target_discovery.py --listen 0.0.0.0:9105 --file-sd prometheus/targets/inventory.yml
+
+Scrape config, one http_sd job per discovered job:
+    - job_name: 'node'
+      http_sd_configs:
+        - url: 'http://<host>:9105/targets?job=node'
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import yaml
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('target_discovery')
+
+REPO_ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+DEFAULT_INVENTORY = os.path.join(REPO_ROOT, 'ansible', 'inventory', 'hosts.yml')
+DEFAULT_TERRAFORM_OUTPUTS = os.path.join(REPO_ROOT, 'terraform', 'outputs.json')
+
+# job -> (inventory var holding its port, default port, metrics path)
+JOBS = {
+    'node': ('node_exporter_port', 9100, '/metrics'),
+    'prometheus': ('prometheus_port', 9090, '/metrics'),
+    'grafana': ('grafana_port', 3000, '/metrics'),
+    'alertmanager': ('alertmanager_port', 9093, '/metrics'),
+    'cadvisor': ('cadvisor_port', 8080, '/metrics'),
+    'discord-bot': ('bot_metrics_port', 8080, '/metrics'),
+    'awx': ('awx_port', 8052, '/api/v2/metrics/')
+}
+DEFAULT_SCRAPE_JOBS = ['node']
+
+FILE_SD_HEADER = (
+    "# Generated by scripts/target_discovery.py from the Ansible inventory\n"
+    "# and Terraform outputs. Do not edit; changes are overwritten.\n"
+)
+
+
+class DiscoveryError(Exception):
+    """A source file can't be read or parsed"""
+
+
+def read_inventory(path):
+    """
+    Return {host: (vars, groups)} from an Ansible YAML inventory. Vars
+    are merged the way Ansible does for a single inventory file: all,
+    then parent groups before their children, then host vars.
+    """
+    try:
+        with open(path, 'r') as file:
+            inventory = yaml.safe_load(file) or {}
+    except (OSError, yaml.YAMLError) as e:
+        raise DiscoveryError(f"Can't read inventory {path}: {e}")
+
+    # host -> [group vars, host vars, groups]
+    found = {}
+
+    def walk(name, group, inherited, parents):
+        group = group or {}
+        group_vars = {**inherited, **(group.get('vars') or {})}
+        groups = parents + ([name] if name != 'all' else [])
+        for host, host_vars in (group.get('hosts') or {}).items():
+            entry = found.setdefault(host, [{}, {}, []])
+            entry[0].update(group_vars)
+            entry[1].update(host_vars or {})
+            entry[2].extend(parent for parent in groups if parent not in entry[2])
+        for child, child_group in (group.get('children') or {}).items():
+            walk(child, child_group, group_vars, groups)
+
+    for name, group in inventory.items():
+        walk(name, group, {}, [])
+    return {
+        host: ({**group_vars, **host_vars}, groups)
+        for host, (group_vars, host_vars, groups) in found.items()
+    }
+
+
+def read_terraform_outputs(path):
+    """{output name: value} from `terraform output -json`; empty if the file doesn't exist"""
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r') as file:
+            outputs = json.load(file)
+    except (OSError, ValueError) as e:
+        raise DiscoveryError(f"Can't read Terraform outputs {path}: {e}")
+    return {
+        name: output.get('value') if isinstance(output, dict) else output
+        for name, output in outputs.items()
+    }
+
+
+def host_address(host, host_vars, outputs):
+    output = host_vars.get('terraform_output') or f"{host.replace('-', '_')}_ip"
+    address = outputs.get(output)
+    if isinstance(address, str) and address:
+        return address
+    return host_vars.get('ansible_host') or host
+
+
+def build_target_groups(hosts, outputs):
+    """
+    Target groups, one per host and job, sorted by job then host.
+    Returns (groups, duplicates) where duplicates lists the
+    (address, dropped host/job, kept host/job) collisions.
+    """
+    groups = []
+    seen = {}
+    duplicates = []
+    for host, (host_vars, member_of) in hosts.items():
+        address = host_address(host, host_vars, outputs)
+        scrape_jobs = host_vars.get('scrape_jobs', DEFAULT_SCRAPE_JOBS) or []
+        for job in scrape_jobs:
+            if job not in JOBS:
+                logger.warning(f"{host}: unknown scrape job '{job}'")
+                continue
+            port_var, default_port, metrics_path = JOBS[job]
+            try:
+                port = int(host_vars.get(port_var, default_port))
+            except (TypeError, ValueError):
+                logger.warning(f"{host}: {port_var} is not a port: {host_vars.get(port_var)!r}")
+                continue
+
+            target = f"{address}:{port}"
+            if target in seen:
+                duplicates.append((target, f"{host}/{job}", seen[target]))
+                continue
+            seen[target] = f"{host}/{job}"
+
+            labels = {
+                'job': job,
+                'hostname': host,
+                'group': member_of[0] if member_of else 'ungrouped',
+                '__meta_ansible_groups': ',' + ','.join(member_of) + ','
+            }
+            if metrics_path != '/metrics':
+                labels['__metrics_path__'] = metrics_path
+            groups.append({'targets': [target], 'labels': labels})
+
+    groups.sort(key=lambda group: (group['labels']['job'], group['labels']['hostname']))
+    return groups, duplicates
+
+
+def render_file_sd(groups):
+    return FILE_SD_HEADER + yaml.safe_dump(groups, sort_keys=False, default_flow_style=False)
+
+
+def write_atomic(path, content):
+    """Replace ``path`` with ``content`` via a rename in the same directory; no-op if unchanged"""
+    try:
+        with open(path, 'r') as file:
+            if file.read() == content:
+                return False
+    except OSError:
+        pass
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as file:
+            file.write(content)
+            file.flush()
+            os.fsync(file.fileno())
+        os.chmod(temp, 0o644)
+        os.replace(temp, path)
+    except BaseException:
+        try:
+            os.unlink(temp)
+        except OSError:
+            pass
+        raise
+    return True
+
+
+class Response:
+    """A rendered http_sd body and its ETag"""
+    __slots__ = ('body', 'etag')
+
+    def __init__(self, groups):
+        self.body = json.dumps(groups, separators=(',', ':')).encode('utf-8')
+        self.etag = '"' + hashlib.sha256(self.body).hexdigest()[:32] + '"'
+
+
+class Discovery:
+    """Holds the current target groups and rebuilds them when a source file changes"""
+
+    def __init__(self, inventory_path, terraform_outputs_path=None, file_sd_path=None):
+        self.inventory_path = inventory_path
+        self.terraform_outputs_path = terraform_outputs_path
+        self.file_sd_path = file_sd_path
+        self.groups = []
+        self.built_at = None
+        self.error = None
+        self._stamp = None
+        self._lock = threading.Lock()
+        # job (None for all) -> Response, swapped in whole on rebuild
+        self._responses = {None: Response([])}
+
+    def _stat(self):
+        stamps = []
+        for path in (self.inventory_path, self.terraform_outputs_path):
+            try:
+                stat = os.stat(path) if path else None
+            except OSError:
+                stat = None
+            stamps.append(None if stat is None else (stat.st_mtime_ns, stat.st_size, stat.st_ino))
+        return tuple(stamps)
+
+    def refresh(self, force=False):
+        """Rebuild if a source changed; returns True if the target groups were rebuilt"""
+        with self._lock:
+            stamp = self._stat()
+            if not force and stamp == self._stamp:
+                return False
+            self._stamp = stamp
+            try:
+                hosts = read_inventory(self.inventory_path)
+                outputs = read_terraform_outputs(self.terraform_outputs_path)
+            except DiscoveryError as e:
+                # Keep serving the last good build
+                self.error = str(e)
+                logger.error(f"Keeping previous targets: {e}")
+                return False
+
+            groups, duplicates = build_target_groups(hosts, outputs)
+            for target, dropped, kept in duplicates:
+                logger.warning(f"{target} is listed for both {kept} and {dropped}; keeping {kept}")
+
+            responses = {None: Response(groups)}
+            for job in sorted({group['labels']['job'] for group in groups}):
+                responses[job] = Response([group for group in groups if group['labels']['job'] == job])
+            self.groups = groups
+            self._responses = responses
+            self.built_at = time.time()
+            self.error = None
+            logger.info(
+                f"Built {len(groups)} targets for {len(hosts)} hosts"
+                + (f", dropped {len(duplicates)} duplicates" if duplicates else "")
+            )
+
+            if self.file_sd_path:
+                try:
+                    if write_atomic(self.file_sd_path, render_file_sd(groups)):
+                        logger.info(f"Wrote {self.file_sd_path}")
+                except OSError as e:
+                    self.error = f"Can't write {self.file_sd_path}: {e}"
+                    logger.error(self.error)
+            return True
+
+    def response(self, job=None):
+        """Cached Response for all groups or one job; a job with no targets gets an empty list"""
+        responses = self._responses
+        if job in responses:
+            return responses[job]
+        return Response([])
+
+    def run(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Refresh failed: {e}")
+
+
+def etag_matches(header, etag):
+    """If-None-Match check; weak validators compare equal to their strong form"""
+    if header is None:
+        return False
+    candidates = [candidate.strip() for candidate in header.split(',')]
+    return '*' in candidates or any(candidate.removeprefix('W/') == etag for candidate in candidates)
+
+
+def make_handler(discovery):
+    class Handler(BaseHTTPRequestHandler):
+        server_version = 'vice-target-discovery'
+
+        def _send(self, status, body=b'', content_type='application/json', etag=None):
+            self.send_response(status)
+            if etag:
+                self.send_header('ETag', etag)
+                # Let clients cache but always revalidate; a 304 costs nothing to serve
+                self.send_header('Cache-Control', 'no-cache')
+            if status != 304:
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            if status != 304 and self.command != 'HEAD':
+                self.wfile.write(body)
+
+        def do_GET(self):
+            url = urllib.parse.urlsplit(self.path)
+            if url.path == '/targets':
+                job = urllib.parse.parse_qs(url.query).get('job', [None])[0]
+                response = discovery.response(job)
+                if etag_matches(self.headers.get('If-None-Match'), response.etag):
+                    self._send(304, etag=response.etag)
+                else:
+                    self._send(200, response.body, etag=response.etag)
+            elif url.path == '/healthz':
+                status = {
+                    'targets': len(discovery.groups),
+                    'built_at': discovery.built_at,
+                    'error': discovery.error
+                }
+                code = 200 if discovery.built_at is not None else 503
+                self._send(code, json.dumps(status).encode('utf-8'))
+            else:
+                self._send(404, b'not found\n', content_type='text/plain')
+
+        do_HEAD = do_GET
+
+        def log_message(self, format, *args):
+            logger.debug("%s - %s", self.address_string(), format % args)
+
+    return Handler
+
+
+def parse_listen(value):
+    host, _, port = value.rpartition(':')
+    if not port.isdigit():
+        raise argparse.ArgumentTypeError(f"expected host:port, got '{value}'")
+    return host or '0.0.0.0', int(port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0], formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--inventory', default=DEFAULT_INVENTORY, help=f'Ansible inventory (default {os.path.relpath(DEFAULT_INVENTORY)})')
+    parser.add_argument('--terraform-outputs', default=DEFAULT_TERRAFORM_OUTPUTS,
+                        help=f'`terraform output -json` file, used if present (default {os.path.relpath(DEFAULT_TERRAFORM_OUTPUTS)})')
+    parser.add_argument('--file-sd', help='also write the target groups to this file_sd YAML file')
+    parser.add_argument('--listen', type=parse_listen, default=('127.0.0.1', 9105), help='host:port to serve http_sd on (default 127.0.0.1:9105)')
+    parser.add_argument('--interval', type=float, default=5, help='seconds between source file checks (default 5)')
+    parser.add_argument('--once', action='store_true', help='build once, write --file-sd (or print the groups) and exit')
+    args = parser.parse_args()
+
+    discovery = Discovery(args.inventory, args.terraform_outputs, args.file_sd)
+    discovery.refresh(force=True)
+    if discovery.built_at is None:
+        sys.exit(1)
+    if args.once:
+        if not args.file_sd:
+            sys.stdout.write(render_file_sd(discovery.groups))
+        sys.exit(1 if discovery.error else 0)
+
+    threading.Thread(target=discovery.run, args=(args.interval,), daemon=True, name='refresh').start()
+    server = ThreadingHTTPServer(args.listen, make_handler(discovery))
+    logger.info(f"Serving http_sd on http://{args.listen[0]}:{args.listen[1]}/targets")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()